@@ -1,15 +1,18 @@
 # -*- coding: utf-8 -*-
 """Main application package."""
-import logging
-from logging.handlers import RotatingFileHandler
-import os
 from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_login import LoginManager
 from flask_moment import Moment
-from flask_whooshee import Whooshee
 from config import ProductionConfig
+from app.assets import Assets
+from app.avatars import Avatars
+from app.catalog import CatalogCache
+from app.engine import SQLAlchemy
+from app.identity import IdentityCache
+from app.log import init_logging
+from app.popularity import PopularityCache
+from app.search import Whooshee
 
 db = SQLAlchemy()
 migrate = Migrate()
@@ -19,6 +22,11 @@ login.login_message = 'Please log in to access this page.'
 login.login_message_category = 'warning'
 moment = Moment()
 whooshee = Whooshee()
+avatars = Avatars()
+assets = Assets()
+identities = IdentityCache()
+catalog = CatalogCache()
+popularity = PopularityCache()
 
 
 def create_app(config_class=ProductionConfig):
@@ -31,6 +39,11 @@ def create_app(config_class=ProductionConfig):
     login.init_app(app)
     moment.init_app(app)
     whooshee.init_app(app)
+    avatars.init_app(app)
+    assets.init_app(app)
+    identities.init_app(app)
+    catalog.init_app(app)
+    popularity.init_app(app)
 
     # Register error, auth and main blueprints
     from app.errors import bp as errors_bp
@@ -42,19 +55,13 @@ def create_app(config_class=ProductionConfig):
     from app.main import bp as main_bp
     app.register_blueprint(main_bp)
 
+    # Register custom commands
+    from app import cli
+    cli.register(app)
+
     # Flask logs
     if not app.debug and not app.testing:
-        if not os.path.exists('logs'):
-            os.mkdir('logs')
-        file_handler = RotatingFileHandler('logs/espcibar.log',
-                                           maxBytes=10240, backupCount=10)
-        file_handler.setFormatter(logging.Formatter(
-            '%(asctime)s %(levelname)s: %(message)s '
-            '[in %(pathname)s:%(lineno)d]'))
-        file_handler.setLevel(logging.INFO)
-        app.logger.addHandler(file_handler)
-
-        app.logger.setLevel(logging.INFO)
+        init_logging(app)
         app.logger.info('ESPCI Bar startup')
 
     return app
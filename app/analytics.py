@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""Long-range consumption statistics, computed with NumPy."""
+import datetime
+from sqlalchemy import func, select, union_all
+from app import db
+from app.archive import ACADEMIC_YEAR_START_MONTH, academic_year_start
+from app.models import User, Item, Transaction, ArchivedTransaction
+
+# Number of rows fetched from the database at a time
+FETCH_BATCH_SIZE = 10000
+
+# Fetched columns and their array types
+COLUMNS = (('date', 'datetime64[s]'), ('grad_class', 'float64'),
+           ('item_id', 'float64'), ('amount', 'float64'),
+           ('is_reverted', 'bool'))
+
+# Statistics of the closed academic years, by year
+_statistics = {}
+
+
+def _select(model, start, end):
+    """Return a select of the analyzed columns of a transaction table."""
+    return select([model.date, User.grad_class, model.item_id,
+                   model.balance_change, model.is_reverted]).\
+        select_from(model.__table__.outerjoin(
+            User.__table__, model.client_id == User.id)).\
+        where(model.date >= start).where(model.date < end)
+
+
+def fetch_columns(start, end, batch_size=FETCH_BATCH_SIZE):
+    """Return the columns of the transactions between two dates as arrays.
+
+    Hot and archived transactions are streamed batch_size rows at a time,
+    and only the columns needed by the statistics are fetched. Missing
+    clients and items are NaN.
+
+    Keyword arguments:
+    start -- the first datetime
+    end -- the last datetime (excluded)
+    batch_size -- the number of rows fetched at a time
+    """
+    import numpy as np
+    query = union_all(_select(Transaction, start, end),
+                      _select(ArchivedTransaction, start, end)).\
+        execution_options(stream_results=True)
+    result = db.session.execute(query)
+    chunks = [[] for _ in COLUMNS]
+    while True:
+        rows = result.fetchmany(batch_size)
+        if not rows:
+            break
+        for chunk, values, (_, dtype) in zip(chunks, zip(*rows), COLUMNS):
+            chunk.append(np.array(values, dtype=dtype))
+    result.close()
+    return {name: np.concatenate(chunk) if chunk else np.empty(0, dtype)
+            for chunk, (name, dtype) in zip(chunks, COLUMNS)}
+
+
+def compute_statistics(columns, alcohol_item_ids=()):
+    """Return the statistics of a set of transaction columns.
+
+    Reverted transactions are left out. Weekdays start on Monday, hours
+    are in UTC.
+
+    Keyword arguments:
+    columns -- the arrays returned by fetch_columns
+    alcohol_item_ids -- the ids of the alcoholic items
+    """
+    import numpy as np
+    dates = columns['date']
+    amounts = columns['amount']
+    valid = ~columns['is_reverted'] & ~np.isnan(amounts)
+    sales = valid & (amounts < 0)
+    top_ups = valid & (amounts > 0)
+
+    # Hour of week heatmap, 1970-01-01 being a Thursday
+    days = dates.astype('datetime64[D]')
+    weekdays = (days.astype(np.int64) + 3) % 7
+    hours = (dates - days).astype('timedelta64[h]').astype(np.int64)
+    hour_of_week = weekdays * 24 + hours
+    heatmap_sales = np.bincount(hour_of_week[sales], minlength=7 * 24)
+    heatmap_revenue = np.bincount(hour_of_week[sales],
+                                  weights=-amounts[sales], minlength=7 * 24)
+
+    # Consumption by grad class
+    grad_classes = columns['grad_class']
+    alcohol = np.isin(columns['item_id'], np.asarray(alcohol_item_ids,
+                                                     dtype=np.float64))
+    class_sales = sales & ~np.isnan(grad_classes)
+    classes, index = np.unique(grad_classes[class_sales].astype(np.int64),
+                               return_inverse=True)
+    class_revenue = np.bincount(index, weights=-amounts[class_sales],
+                                minlength=len(classes))
+    class_nb_sales = np.bincount(index, minlength=len(classes))
+    class_nb_alcohol = np.bincount(index, weights=alcohol[class_sales],
+                                   minlength=len(classes))
+
+    # Revenue and top ups of each month of the academic year
+    months = (dates.astype('datetime64[M]').astype(np.int64) -
+              (ACADEMIC_YEAR_START_MONTH - 1)) % 12
+    monthly_revenue = np.bincount(months[sales], weights=-amounts[sales],
+                                  minlength=12)
+    monthly_top_ups = np.bincount(months[top_ups], weights=amounts[top_ups],
+                                  minlength=12)
+
+    return {
+        'revenue': float(-amounts[sales].sum()),
+        'topped_up': float(amounts[top_ups].sum()),
+        'nb_sales': int(sales.sum()),
+        'heatmap': {'nb_sales': heatmap_sales.reshape(7, 24).tolist(),
+                    'revenue': heatmap_revenue.reshape(7, 24).tolist()},
+        'grad_classes': {
+            str(grad_class): {'revenue': float(revenue),
+                              'nb_sales': int(nb_sales),
+                              'nb_alcoholic_drinks': int(nb_alcohol)}
+            for grad_class, revenue, nb_sales, nb_alcohol in zip(
+                classes, class_revenue, class_nb_sales, class_nb_alcohol)},
+        'monthly_revenue': monthly_revenue.tolist(),
+        'monthly_top_ups': monthly_top_ups.tolist()
+    }
+
+
+def year_statistics(year, today=None):
+    """Return the statistics of an academic year.
+
+    Statistics of closed academic years are computed once per process.
+
+    Keyword arguments:
+    year -- the calendar year the academic year starts in
+    today -- the current date
+    """
+    if year in _statistics:
+        return _statistics[year]
+
+    start = datetime.datetime(year=year, month=ACADEMIC_YEAR_START_MONTH,
+                              day=1)
+    end = datetime.datetime(year=year + 1, month=ACADEMIC_YEAR_START_MONTH,
+                            day=1)
+    alcohol_item_ids = [item_id for item_id, in
+                        db.session.query(Item.id).filter_by(is_alcohol=True)]
+    statistics = compute_statistics(fetch_columns(start, end),
+                                    alcohol_item_ids)
+    if end <= academic_year_start(today):
+        _statistics[year] = statistics
+    return statistics
+
+
+def first_academic_year(today=None):
+    """Return the first academic year with transactions."""
+    first = min([date for date in (
+        db.session.query(func.min(Transaction.date)).scalar(),
+        db.session.query(func.min(ArchivedTransaction.date)).scalar())
+        if date is not None] or [academic_year_start(today)])
+    return academic_year_start(first.date()).year
+
+
+def clear_statistics():
+    """Drop the cached statistics."""
+    _statistics.clear()
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""Archival of past transactions."""
+import datetime
+from sqlalchemy import func, select
+from sqlalchemy.sql.expression import and_
+from app import db
+from app.models import Transaction, ArchivedTransaction, TransactionSummary
+from app.pagination import clear_counts
+
+# Number of transactions moved per commit
+ARCHIVE_BATCH_SIZE = 1000
+
+# Academic years start on September 1st
+ACADEMIC_YEAR_START_MONTH = 9
+
+
+def academic_year_start(today=None):
+    """Return the first day of the current academic year."""
+    today = today or datetime.date.today()
+    year = today.year
+    if today.month < ACADEMIC_YEAR_START_MONTH:
+        year -= 1
+    return datetime.datetime(year=year, month=ACADEMIC_YEAR_START_MONTH,
+                             day=1)
+
+
+def _summarize(rows):
+    """Add a batch of archived transactions to the monthly summaries."""
+    totals = {}
+    for row in rows:
+        key = (row.client_id, row.date.year, row.date.month)
+        nb_transactions, topped_up, paid = totals.get(key, (0, 0.0, 0.0))
+        nb_transactions += 1
+        if not row.is_reverted and row.balance_change:
+            if row.type == 'Top up':
+                topped_up += row.balance_change
+            elif row.type.startswith('Pay'):
+                paid -= row.balance_change
+        totals[key] = (nb_transactions, topped_up, paid)
+
+    for (client_id, year, month), (nb_transactions, topped_up, paid) in \
+            totals.items():
+        summary = TransactionSummary.query.\
+            filter_by(client_id=client_id, year=year, month=month).first()
+        if summary is None:
+            summary = TransactionSummary(client_id=client_id, year=year,
+                                         month=month, nb_transactions=0,
+                                         topped_up=0.0, paid=0.0)
+            db.session.add(summary)
+        summary.nb_transactions += nb_transactions
+        summary.topped_up += topped_up
+        summary.paid += paid
+
+
+def archive_transactions(cutoff, batch_size=ARCHIVE_BATCH_SIZE):
+    """Move the transactions older than cutoff to the archive table.
+
+    Transactions are copied, summarized and deleted batch_size at a time,
+    each batch in its own commit, so the command can be interrupted and
+    run again.
+
+    Keyword arguments:
+    cutoff -- the datetime before which transactions are archived
+    batch_size -- the number of transactions moved per commit
+
+    Return the number of archived transactions.
+    """
+    table = Transaction.__table__
+    columns = [column.name for column in table.columns]
+
+    archived = 0
+    while True:
+        rows = db.session.query(
+            Transaction.id, Transaction.client_id, Transaction.date,
+            Transaction.type, Transaction.balance_change,
+            Transaction.is_reverted).\
+            filter(Transaction.date < cutoff).\
+            order_by(Transaction.id.asc()).limit(batch_size).all()
+        if not rows:
+            break
+
+        # The batch holds the lowest ids older than the cutoff, so an id
+        # range selects exactly its rows without a huge IN clause
+        in_batch = and_(table.c.id.between(rows[0].id, rows[-1].id),
+                        table.c.date < cutoff)
+        db.session.execute(ArchivedTransaction.__table__.insert().
+                           from_select(columns, select(
+                               [table.c[name] for name in columns]).
+                               where(in_batch)))
+        _summarize(rows)
+        db.session.execute(table.delete().where(in_batch))
+        db.session.commit()
+        archived += len(rows)
+
+    clear_counts()
+    return archived
+
+
+def archived_monthly_totals(start, end):
+    """Return the archived (paid, topped_up) totals of each month.
+
+    Keyword arguments:
+    start -- the first (year, month) included
+    end -- the last (year, month) included
+    """
+    month = TransactionSummary.year * 12 + TransactionSummary.month
+    rows = db.session.query(
+        TransactionSummary.year, TransactionSummary.month,
+        func.sum(TransactionSummary.paid),
+        func.sum(TransactionSummary.topped_up)).\
+        filter(month.between(start[0] * 12 + start[1],
+                             end[0] * 12 + end[1])).\
+        group_by(TransactionSummary.year, TransactionSummary.month).all()
+    return {(year, month): (paid, topped_up)
+            for year, month, paid, topped_up in rows}
+
+
+def transactions_balance(user):
+    """Return the balance of a user recomputed from the transactions.
+
+    It should match user.balance, archived transactions being accounted
+    for with their summaries.
+    """
+    hot = db.session.query(func.sum(Transaction.balance_change)).\
+        filter(Transaction.client_id == user.id).\
+        filter(Transaction.is_reverted.isnot(True)).scalar()
+    archived = db.session.query(
+        func.sum(TransactionSummary.topped_up - TransactionSummary.paid)).\
+        filter(TransactionSummary.client_id == user.id).scalar()
+    return (hot or 0.0) + (archived or 0.0)
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""Vendored, fingerprinted and precompressed static assets."""
+import base64
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+from flask import request, send_from_directory, url_for
+
+# Third-party assets, vendored from their CDN
+VENDOR_ASSETS = {
+    'vendor/bootstrap.min.css': {
+        'url': 'https://stackpath.bootstrapcdn.com/bootstrap/4.2.1/css/'
+               'bootstrap.min.css',
+        'integrity': 'sha384-GJzZqFGwb1QTTN6wy59ffF1BuGJpLSa9DkKMp0DgiMDm4iY'
+                     'Mj70gZWKYbI706tWS'},
+    'vendor/jquery.min.js': {
+        'url': 'https://code.jquery.com/jquery-3.3.1.min.js',
+        'integrity': 'sha256-FgpCb/KJQlLNfOu91ta32o/NMZxltwRo8QtmkMRdAu8='},
+    'vendor/popper.min.js': {
+        'url': 'https://cdnjs.cloudflare.com/ajax/libs/popper.js/1.14.6/umd/'
+               'popper.min.js',
+        'integrity': 'sha384-wHAiFfRlMFy6i5SRaxvfOCifBUQy1xHdJ/yoi7FRNXMRBu5'
+                     'WHdZYu1hA6ZOblgut'},
+    'vendor/bootstrap.min.js': {
+        'url': 'https://stackpath.bootstrapcdn.com/bootstrap/4.2.1/js/'
+               'bootstrap.min.js',
+        'integrity': 'sha384-B0UglyR+jN6CkvvICOB2joaf5I4l3gm9GU6Hc1og6Ls7i6U'
+                     '/mkkaduKaBhlAXv9k'},
+    'vendor/Chart.min.js': {
+        'url': 'https://cdnjs.cloudflare.com/ajax/libs/Chart.js/2.7.1/'
+               'Chart.min.js',
+        'integrity': None},
+}
+
+# Assets fingerprinted by the build, relative to the static folder
+ASSETS = tuple(VENDOR_ASSETS) + ('css/style.css', 'js/jsQR.js')
+
+MANIFEST = 'manifest.json'
+
+# Built assets never change, their name changing with their content
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Precompressed variants, by order of preference
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def check_integrity(data, integrity):
+    """Raise ValueError if data doesn't match a subresource integrity hash."""
+    algorithm, _, expected = integrity.partition('-')
+    digest = base64.b64encode(hashlib.new(algorithm, data).digest())
+    if digest.decode('ascii') != expected:
+        raise ValueError('Integrity check failed.')
+
+
+def vendor_assets(static_folder, force=False):
+    """Download the third-party assets to the static folder.
+
+    Assets are checked against their integrity hash before being written.
+
+    Keyword arguments:
+    static_folder -- the static folder of the application
+    force -- download the assets which are already vendored
+
+    Return the names of the downloaded assets.
+    """
+    from urllib.request import urlopen
+    downloaded = []
+    for name, source in sorted(VENDOR_ASSETS.items()):
+        path = os.path.join(static_folder, name)
+        if os.path.exists(path) and not force:
+            continue
+        with urlopen(source['url'], timeout=30) as response:
+            data = response.read()
+        if source['integrity'] is not None:
+            check_integrity(data, source['integrity'])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+        downloaded.append(name)
+    return downloaded
+
+
+def compress(data):
+    """Return the precompressed variants of an asset, by file extension.
+
+    Brotli variants are only built when the brotli package is installed.
+    """
+    variants = {'.gz': gzip.compress(data, 9, mtime=0)}
+    try:
+        import brotli
+    except ImportError:
+        pass
+    else:
+        variants['.br'] = brotli.compress(data, quality=11)
+    return variants
+
+
+def build_assets(static_folder, output_folder, names=ASSETS):
+    """Write fingerprinted and precompressed copies of the static assets.
+
+    Each asset is copied to output_folder with the hash of its content in
+    its name, along with its precompressed variants. Files of previous
+    builds are kept for the pages which still reference them. Assets
+    missing from the static folder are skipped.
+
+    Keyword arguments:
+    static_folder -- the folder of the source assets
+    output_folder -- the folder of the built assets
+    names -- the assets, relative to static_folder
+
+    Return the manifest, mapping asset names to built file names.
+    """
+    manifest = {}
+    for name in names:
+        path = os.path.join(static_folder, name)
+        if not os.path.exists(path):
+            continue
+        with open(path, 'rb') as f:
+            data = f.read()
+        root, extension = os.path.splitext(name)
+        built_name = '{}.{}{}'.format(
+            root, hashlib.sha256(data).hexdigest()[:12], extension)
+
+        built_path = os.path.join(output_folder, built_name)
+        os.makedirs(os.path.dirname(built_path), exist_ok=True)
+        for suffix, content in [('', data)] + \
+                sorted(compress(data).items()):
+            with open(built_path + suffix, 'wb') as f:
+                f.write(content)
+        manifest[name] = built_name
+
+    with open(os.path.join(output_folder, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+class Assets(object):
+    """Urls and handler of the built static assets.
+
+    Built assets are served with far-future caching, in their brotli or
+    gzip variant when the client accepts it. Assets which haven't been
+    built are served by the static route, and third-party assets which
+    haven't been vendored are loaded from their CDN.
+    """
+
+    def __init__(self, app=None):
+        """Create an empty manifest."""
+        self.manifest = {}
+        self.static_folder = None
+        self.folder = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Register the asset route and the asset_url template global."""
+        self.static_folder = app.static_folder
+        self.folder = app.config.get(
+            'ASSETS_FOLDER', os.path.join(app.static_folder, 'dist'))
+        self.load()
+        app.add_url_rule('/assets/<path:filename>', 'assets', self.send)
+        app.add_template_global(self.url, 'asset_url')
+
+    def load(self):
+        """Read the manifest of the last build."""
+        try:
+            with open(os.path.join(self.folder, MANIFEST)) as f:
+                self.manifest = json.load(f)
+        except FileNotFoundError:
+            self.manifest = {}
+
+    def url(self, name):
+        """Return the url of an asset.
+
+        Keyword arguments:
+        name -- the asset path, relative to the static folder
+        """
+        if name in self.manifest:
+            return url_for('assets', filename=self.manifest[name])
+        if name in VENDOR_ASSETS and not os.path.exists(
+                os.path.join(self.static_folder, name)):
+            return VENDOR_ASSETS[name]['url']
+        return url_for('static', filename=name)
+
+    def send(self, filename):
+        """Serve a built asset in the best encoding accepted by the client."""
+        for encoding, extension in ENCODINGS:
+            if request.accept_encodings.quality(encoding) and \
+                    os.path.isfile(os.path.join(self.folder,
+                                                filename + extension)):
+                response = send_from_directory(
+                    self.folder, filename + extension,
+                    mimetype=mimetypes.guess_type(filename)[0])
+                response.headers['Content-Encoding'] = encoding
+                break
+        else:
+            response = send_from_directory(self.folder, filename)
+        response.headers['Cache-Control'] = CACHE_CONTROL
+        response.vary.add('Accept-Encoding')
+        return response
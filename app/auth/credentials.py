@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""Credential sheet generation."""
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import groupby
+from app.parallel import pool_map
+
+# Credential pages are A4 pages at 150 dpi
+PAGE_SIZE = (1240, 1754)
+
+BACKENDS = ('latex', 'pillow')
+
+
+def latex_escape(password):
+    """Return a password formatted for the LaTeX model."""
+    return '\\texttt{' + password.\
+        replace('&', r'\&').\
+        replace('%', r'\%').\
+        replace('$', r'\$').\
+        replace('#', r'\#').\
+        replace('^', r'\\textasciicircum{}') + '}'
+
+
+def pdflatex(tex_path, output_directory):
+    """Compile a LaTeX file, intermediate files being written to a temporary
+    directory which is removed afterwards.
+
+    Return the path of the PDF file in output_directory.
+    """
+    import shutil
+    import subprocess
+    name = os.path.splitext(os.path.basename(tex_path))[0]
+    with tempfile.TemporaryDirectory() as build_directory:
+        subprocess.check_call(['pdflatex', '-interaction=batchmode',
+                               '-output-directory=' + build_directory,
+                               tex_path],
+                              stdout=subprocess.DEVNULL)
+        pdf_path = os.path.join(output_directory, name + '.pdf')
+        shutil.move(os.path.join(build_directory, name + '.pdf'), pdf_path)
+    return pdf_path
+
+
+def _render_latex(task):
+    """Render the credentials of a user with pdflatex."""
+    credential, model, output_directory = task
+    with tempfile.TemporaryDirectory() as source_directory:
+        tex_path = os.path.join(source_directory,
+                                credential['username'] + '.tex')
+        with open(tex_path, 'w') as f:
+            f.write(model % (
+                credential['first_name'] + ' ' + credential['last_name'],
+                credential['grad_class'],
+                credential['username'],
+                latex_escape(credential['password'])))
+        return pdflatex(tex_path, output_directory)
+
+
+def _merge_latex(pdf_paths, merged_path):
+    """Merge PDF files into one with the pdfpages LaTeX package."""
+    with tempfile.TemporaryDirectory() as source_directory:
+        name = os.path.splitext(os.path.basename(merged_path))[0]
+        tex_path = os.path.join(source_directory, name + '.tex')
+        with open(tex_path, 'w') as f:
+            f.write('\\documentclass{article}\n'
+                    '\\usepackage{pdfpages}\n'
+                    '\\begin{document}\n')
+            for pdf_path in pdf_paths:
+                f.write('\\includepdf{' +
+                        os.path.abspath(pdf_path).replace(os.sep, '/') +
+                        '}\n')
+            f.write('\\end{document}\n')
+        return pdflatex(tex_path, os.path.dirname(merged_path))
+
+
+def _load_font(size):
+    """Return a TrueType font if available, the default font otherwise."""
+    from PIL import ImageFont
+    try:
+        return ImageFont.truetype('DejaVuSans.ttf', size)
+    except OSError:
+        return ImageFont.load_default()
+
+
+def _render_page(credential):
+    """Return the credential page of a user as a PIL image."""
+    from PIL import Image, ImageDraw
+    page = Image.new('L', PAGE_SIZE, 255)
+    draw = ImageDraw.Draw(page)
+    title_font = _load_font(64)
+    font = _load_font(40)
+
+    draw.text((150, 200), 'ESPCI Bar', font=title_font, fill=0)
+    lines = [
+        credential['first_name'] + ' ' + credential['last_name'],
+        'Graduating class: {}'.format(credential['grad_class']),
+        'Username: ' + credential['username'],
+        'Password: ' + credential['password'],
+    ]
+    for index, line in enumerate(lines):
+        draw.text((150, 400 + 90 * index), line, font=font, fill=0)
+    return page
+
+
+def _pdf_path(output_directory, credential):
+    """Return the path of a user credential PDF."""
+    return os.path.join(output_directory, str(credential['grad_class']),
+                        credential['username'] + '.pdf')
+
+
+def render_credentials(credentials, output_directory='pdf',
+                       model_path=os.path.join('latex', 'model.tex'),
+                       backend='latex', workers=None, merge=False):
+    """Generate the credential PDFs of a list of users.
+
+    Each user gets a pdf/<grad_class>/<username>.pdf file, and with merge,
+    each grad class also gets a pdf/<grad_class>.pdf file with one page per
+    user.
+
+    Keyword arguments:
+    credentials -- dicts with username, password, first_name, last_name and
+                   grad_class keys
+    output_directory -- the directory where PDF files are written
+    model_path -- the LaTeX model, for the latex backend
+    backend -- 'latex' (pdflatex) or 'pillow' (pure Python)
+    workers -- the number of parallel workers, defaults to the CPU count
+    merge -- also generate one merged PDF per grad class
+
+    Return a dict with the number of generated files, the elapsed time and
+    the throughput in PDFs per second.
+    """
+    if backend not in BACKENDS:
+        raise ValueError('Unknown backend {}.'.format(backend))
+    workers = workers or os.cpu_count() or 1
+    start = time.time()
+
+    def grad_class(credential):
+        return str(credential['grad_class'])
+
+    credentials = sorted(credentials, key=grad_class)
+    for gc in set(grad_class(c) for c in credentials):
+        os.makedirs(os.path.join(output_directory, gc), exist_ok=True)
+
+    pdf_paths = []
+    merged_paths = []
+    if backend == 'latex':
+        with open(model_path, 'r') as f:
+            model = f.read()
+        tasks = [(c, model, os.path.dirname(_pdf_path(output_directory, c)))
+                 for c in credentials]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pdf_paths = list(executor.map(_render_latex, tasks))
+        if merge:
+            for gc, group in groupby(zip(credentials, pdf_paths),
+                                     key=lambda t: grad_class(t[0])):
+                merged_paths.append(_merge_latex(
+                    [p for _, p in group],
+                    os.path.join(output_directory, gc + '.pdf')))
+    else:
+        pages = pool_map(_render_page, credentials, workers)
+        merged_path = None
+        for credential, page in zip(credentials, pages):
+            pdf_path = _pdf_path(output_directory, credential)
+            page.save(pdf_path, 'PDF', resolution=150.0)
+            pdf_paths.append(pdf_path)
+            if merge:
+                path = os.path.join(output_directory,
+                                    grad_class(credential) + '.pdf')
+                page.save(path, 'PDF', resolution=150.0,
+                          append=path == merged_path)
+                if path != merged_path:
+                    merged_paths.append(path)
+                    merged_path = path
+
+    elapsed = time.time() - start
+    return {'pdfs': len(pdf_paths),
+            'merged': merged_paths,
+            'elapsed': elapsed,
+            'pdfs_per_second': len(pdf_paths) / elapsed if elapsed else 0}
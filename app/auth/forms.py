@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 """Forms for the authentication blueprint."""
 from flask_wtf import FlaskForm
+from flask_wtf.file import FileField, FileRequired, FileAllowed
 import datetime
 from wtforms import StringField, PasswordField, BooleanField, SubmitField, \
     IntegerField, DateField, SelectField
@@ -51,3 +52,27 @@ class RegistrationForm(FlaskForm):
         if grad_class.data is not None and grad_class.data < 0:
             raise ValidationError('Please enter a valid graduating class or '
                                   'nothing if non student.')
+
+
+class ImportUsersForm(FlaskForm):
+    """Bulk user import form."""
+
+    csv_file = FileField('CSV file (last_name, first_name, email, birthdate '
+                         'and optionally grad_class, account_type)',
+                         validators=[FileRequired(),
+                                     FileAllowed(['csv'], 'CSV files only.')])
+    grad_class = IntegerField('Default graduating class (empty if non '
+                              'student)', [optional()])
+
+    account_type = SelectField(
+        'Default account type',
+        choices=[('customer', 'Customer'), ('observer', 'Observer'),
+                 ('bartender', 'Bartender'), ('admin', 'Administrator')])
+
+    submit = SubmitField('Import')
+
+    def validate_grad_class(self, grad_class):
+        """Validate grad_class."""
+        if grad_class.data is not None and grad_class.data < 0:
+            raise ValidationError('Please enter a valid graduating class or '
+                                  'nothing if non student.')
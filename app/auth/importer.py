@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+"""Bulk user import from CSV files."""
+import csv
+import datetime
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from flask import current_app
+from werkzeug.security import generate_password_hash
+from app import db, whooshee
+from app.auth.utils import gen_password, gen_username
+from app.models import User, UserImport
+from app.parallel import chunks, pool_map
+from app.qrcodes import new_qrcode_hash
+from app.search import SKIP_INDEXING
+
+# Columns expected in the CSV header, grad_class and account_type being
+# optional
+CSV_FIELDS = ('last_name', 'first_name', 'email', 'birthdate')
+
+# Columns of the credentials CSV written after an import
+CREDENTIALS_FIELDS = ('username', 'password', 'first_name', 'last_name',
+                      'email', 'grad_class')
+
+ACCOUNT_TYPES = ('customer', 'observer', 'bartender', 'admin')
+
+# Number of seconds the credentials of a background import can be
+# downloaded
+CREDENTIALS_TTL = 3600
+
+# Imports started from the web interface run one at a time, outside of the
+# request threads
+_executor = None
+DATE_FORMATS = ('%Y-%m-%d', '%Y/%m/%d', '%d/%m/%Y')
+
+
+class UserImportError(ValueError):
+    """Error raised when a CSV file can't be imported."""
+
+    pass
+
+
+def parse_date(value):
+    """Return a date from a CSV field."""
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(value.strip(),
+                                              date_format).date()
+        except ValueError:
+            continue
+    raise ValueError('invalid date {}'.format(value))
+
+
+def read_users_csv(stream, grad_class=0, account_type='customer'):
+    """Return the users described in a CSV file.
+
+    Keyword arguments:
+    stream -- a text stream of the CSV file
+    grad_class -- the grad class of rows without a grad_class column
+    account_type -- the account type of rows without an account_type column
+    """
+    reader = csv.DictReader(stream)
+    missing = [f for f in CSV_FIELDS if f not in (reader.fieldnames or [])]
+    if missing:
+        raise UserImportError('Missing CSV columns: ' + ', '.join(missing) +
+                              '.')
+
+    rows = []
+    for line, row in enumerate(reader, start=2):
+        try:
+            user = {
+                'last_name': row['last_name'].strip(),
+                'first_name': row['first_name'].strip(),
+                'email': row['email'].strip().lower(),
+                'birthdate': parse_date(row['birthdate']),
+                'grad_class': int(row.get('grad_class') or grad_class),
+                'account_type': (row.get('account_type') or
+                                 account_type).strip()
+            }
+        except (AttributeError, ValueError) as e:
+            raise UserImportError('Line {}: {}.'.format(line, e))
+        if not (user['last_name'] and user['first_name'] and user['email']):
+            raise UserImportError('Line {}: missing name or email.'.
+                                  format(line))
+        if user['account_type'] not in ACCOUNT_TYPES:
+            raise UserImportError('Line {}: unknown account type {}.'.
+                                  format(line, user['account_type']))
+        rows.append(user)
+    return rows
+
+
+def unique_username(username, usernames):
+    """Return username, suffixed with a number if it is already taken."""
+    if username not in usernames:
+        return username
+    suffix = 2
+    while username + str(suffix) in usernames:
+        suffix += 1
+    return username + str(suffix)
+
+
+def _hash_password(password):
+    """Return the password hash."""
+    return generate_password_hash(password)
+
+
+@contextmanager
+def _deferred_indexing():
+    """Skip the search index updates done after each insert of the session.
+
+    Only the current session is affected, users created concurrently by
+    other requests being indexed as usual.
+    """
+    db.session.info[SKIP_INDEXING] = True
+    try:
+        yield
+    finally:
+        db.session.info.pop(SKIP_INDEXING, None)
+
+
+def import_users(rows, batch_size=100, processes=None):
+    """Create users in batches and return their credentials.
+
+    Usernames are generated like in the register page, collisions with
+    existing users and within the file being resolved with a numeric suffix.
+    Rows whose email is already used are skipped. Passwords are hashed in a
+    process pool and users are committed and indexed once per batch.
+
+    Keyword arguments:
+    rows -- the users, as returned by read_users_csv
+    batch_size -- the number of users per commit
+    processes -- the number of worker processes, defaults to the CPU count
+
+    Return a (credentials, skipped) tuple of lists of dicts.
+    """
+    usernames = set(u for (u,) in db.session.query(User.username))
+    emails = set(e for (e,) in db.session.query(User.email))
+
+    credentials = []
+    skipped = []
+    for row in rows:
+        if row['email'] in emails:
+            skipped.append(row)
+            continue
+        emails.add(row['email'])
+        username = unique_username(
+            gen_username(row['first_name'], row['last_name']), usernames)
+        usernames.add(username)
+        credentials.append(dict(row, username=username,
+                                password=gen_password()))
+
+    hashes = pool_map(_hash_password,
+                      (c['password'] for c in credentials), processes)
+    for batch in chunks(zip(credentials, hashes), batch_size):
+        users = []
+        for c, password_hash in batch:
+            users.append(User(first_name=c['first_name'],
+                              last_name=c['last_name'],
+                              birthdate=c['birthdate'],
+                              grad_class=c['grad_class'],
+                              username=c['username'],
+                              email=c['email'],
+                              password_hash=password_hash,
+                              qrcode_hash=new_qrcode_hash(),
+                              is_observer=c['account_type'] == 'observer',
+                              is_customer=c['account_type'] == 'customer',
+                              is_bartender=c['account_type'] == 'bartender',
+                              is_admin=c['account_type'] == 'admin'))
+        with _deferred_indexing():
+            db.session.add_all(users)
+            db.session.flush()
+        whooshee.on_commit([[user, 'insert'] for user in users])
+        db.session.commit()
+
+    return credentials, skipped
+
+
+def write_credentials(credentials, stream):
+    """Write the credentials of imported users as CSV."""
+    writer = csv.DictWriter(stream, CREDENTIALS_FIELDS,
+                            extrasaction='ignore')
+    writer.writeheader()
+    writer.writerows(credentials)
+
+
+def _credentials_path(user_import_id):
+    """Return the path of the credentials file of a background import."""
+    folder = current_app.config.get('USER_IMPORT_FOLDER', 'imports')
+    return os.path.join(folder, '{}.csv'.format(user_import_id))
+
+
+def _save_credentials(user_import_id, credentials):
+    """Write the credentials of an import to a file only the app can read."""
+    path = _credentials_path(user_import_id)
+    os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with open(fd, 'w', newline='') as f:
+        write_credentials(credentials, f)
+
+
+def purge_credentials():
+    """Delete the credentials files older than CREDENTIALS_TTL seconds."""
+    folder = current_app.config.get('USER_IMPORT_FOLDER', 'imports')
+    if not os.path.isdir(folder):
+        return
+    expiry = time.time() - current_app.config.get(
+        'USER_IMPORT_CREDENTIALS_TTL', CREDENTIALS_TTL)
+    for entry in os.scandir(folder):
+        if entry.is_file() and entry.stat().st_mtime < expiry:
+            os.remove(entry.path)
+
+
+def has_credentials(user_import):
+    """Return whether the credentials of an import can be downloaded."""
+    purge_credentials()
+    return os.path.isfile(_credentials_path(user_import.id))
+
+
+def pop_credentials(user_import):
+    """Return the credentials CSV of an import and delete its file.
+
+    Return None if the credentials expired or were already downloaded.
+    """
+    purge_credentials()
+    path = _credentials_path(user_import.id)
+    try:
+        with open(path, newline='') as f:
+            credentials = f.read()
+    except FileNotFoundError:
+        return None
+    os.remove(path)
+    return credentials
+
+
+def _run_import(app, user_import_id, rows):
+    """Import users and store the outcome of a background import."""
+    with app.app_context():
+        user_import = UserImport.query.get(user_import_id)
+        try:
+            credentials, skipped = import_users(rows)
+            _save_credentials(user_import_id, credentials)
+        except Exception as e:
+            db.session.rollback()
+            app.logger.exception('User import %s failed', user_import_id)
+            user_import.status = 'failed'
+            user_import.error = str(e)
+        else:
+            user_import.status = 'done'
+            user_import.nb_imported = len(credentials)
+            user_import.nb_skipped = len(skipped)
+        db.session.commit()
+
+
+def start_import(rows, admin):
+    """Start importing users in the background.
+
+    Keyword arguments:
+    rows -- the users, as returned by read_users_csv
+    admin -- the username of the admin starting the import
+
+    Return the UserImport tracking the import.
+    """
+    global _executor
+    user_import = UserImport(admin=admin)
+    db.session.add(user_import)
+    db.session.commit()
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1)
+    _executor.submit(_run_import, current_app._get_current_object(),
+                     user_import.id, rows)
+    return user_import
+
+
+def wait_imports():
+    """Wait for the background imports to finish."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
@@ -1,54 +1,18 @@
 # -*- coding: utf-8 -*-
 """View functions for the authentication routes."""
-import unidecode
-import secrets
-import os
-import subprocess
-from flask import render_template, redirect, url_for, flash, request
+import io
+from flask import render_template, redirect, url_for, flash, request, \
+    Response, abort
 from werkzeug.urls import url_parse
 from flask_login import login_user, logout_user, current_user, \
     login_required, fresh_login_required
 from app import db, login
 from app.auth import bp
-from app.auth.forms import LoginForm, RegistrationForm
-from app.models import User
-
-
-def gen_password(length=8,
-                 charset="ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
-                 "0123456789!@#$%^&*()"):
-    """Generate user password."""
-    return "".join([secrets.choice(charset) for _ in range(0, length)])
-
-
-def create_pdf(first_name, last_name, grad_class, username, password):
-    """Generate the PDF file with user credientials."""
-    with open(os.path.join('latex', 'model.tex'), 'r') as f:
-        model = f.read()
-
-    with open(os.path.join('latex', str(grad_class), username + '.tex'),
-              'w') as f:
-        f.write(model % (
-             first_name + ' ' + last_name,
-             grad_class,
-             username,
-             '\\texttt{'+password.
-             replace('&', r'\&').
-             replace('%', r'\%').
-             replace('$', r'\$').
-             replace('#', r'\#').
-             replace('^', r'\\textasciicircum{}')+'}',))
-
-    subprocess.check_call(['pdflatex', '-output-directory=' +
-                           os.path.join('pdf', str(grad_class)),
-                           os.path.join('latex', str(grad_class),
-                                        username+'.tex')])
-    subprocess.check_call(['rm', os.path.join('pdf', str(grad_class),
-                                              username+'.aux')])
-    subprocess.check_call(['rm', os.path.join('pdf', str(grad_class),
-                                              username+'.log')])
-    subprocess.check_call(['rm', os.path.join('pdf', str(grad_class),
-                                              username+'.out')])
+from app.auth.forms import LoginForm, RegistrationForm, ImportUsersForm
+from app.auth.importer import UserImportError, has_credentials, \
+    pop_credentials, read_users_csv, start_import
+from app.auth.utils import gen_password, gen_username
+from app.models import User, UserImport
 
 
 @login.needs_refresh_handler
@@ -111,11 +75,7 @@ def register():
         grad_class = form.grad_class.data or 0  # 0 if extern
         first_name = form.first_name.data
         last_name = form.last_name.data
-        username = first_name[0].lower() + \
-            unidecode.unidecode(last_name.
-                                replace(' ', '').
-                                replace("'", '').
-                                lower()).partition('-')[0][:7]
+        username = gen_username(first_name, last_name)
         password = gen_password()
 
         # Set account type
@@ -124,9 +84,6 @@ def register():
         is_bartender = form.account_type.data == 'bartender'
         is_admin = form.account_type.data == 'admin'
 
-        # Generate pdf
-        # create_pdf(cols[1], cols[0], gc, username, password)
-
         # Test if username already exists
         user = User.query.filter_by(username=username).first()
         if user is not None:
@@ -153,3 +110,67 @@ def register():
         return redirect(url_for('main.dashboard'))
     return render_template('auth/register.html.j2', title='Register',
                            form=form)
+
+
+@bp.route('/import_users', methods=['GET', 'POST'])
+@fresh_login_required
+def import_users():
+    """Render the bulk user import page.
+
+    Valid files are imported in the background, the admin being redirected
+    to the page of the import.
+    """
+    if not current_user.is_admin:
+        flash("You don't have the rights to access this page.", 'danger')
+        return redirect(url_for('main.dashboard'))
+
+    form = ImportUsersForm()
+    if form.validate_on_submit():
+        stream = io.StringIO(form.csv_file.data.read().decode('utf-8-sig'))
+        try:
+            rows = read_users_csv(stream,
+                                  grad_class=form.grad_class.data or 0,
+                                  account_type=form.account_type.data)
+        except UserImportError as e:
+            flash(str(e), 'danger')
+            return render_template('auth/import_users.html.j2',
+                                   title='Import users', form=form)
+        user_import = start_import(rows, current_user.username)
+        return redirect(url_for('auth.user_import',
+                                import_id=user_import.id))
+    return render_template('auth/import_users.html.j2', title='Import users',
+                           form=form)
+
+
+@bp.route('/import_users/<int:import_id>', methods=['GET'])
+@fresh_login_required
+def user_import(import_id):
+    """Render the progress and outcome of a bulk user import."""
+    if not current_user.is_admin:
+        flash("You don't have the rights to access this page.", 'danger')
+        return redirect(url_for('main.dashboard'))
+
+    user_import = UserImport.query.get_or_404(import_id)
+    if user_import.admin != current_user.username:
+        abort(404)
+    return render_template('auth/user_import.html.j2', title='Import users',
+                           user_import=user_import,
+                           has_credentials=has_credentials(user_import))
+
+
+@bp.route('/import_users/<int:import_id>/credentials.csv', methods=['GET'])
+@fresh_login_required
+def user_import_credentials(import_id):
+    """Download the credentials of imported users, only once."""
+    if not current_user.is_admin:
+        flash("You don't have the rights to access this page.", 'danger')
+        return redirect(url_for('main.dashboard'))
+
+    user_import = UserImport.query.get_or_404(import_id)
+    if user_import.admin != current_user.username:
+        abort(404)
+    credentials = pop_credentials(user_import)
+    if credentials is None:
+        abort(404)
+    return Response(credentials, mimetype='text/csv', headers={
+        'Content-Disposition': 'attachment; filename=credentials.csv'})
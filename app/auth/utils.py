@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+"""Helpers for the authentication blueprint."""
+import secrets
+
+
+def gen_password(length=8,
+                 charset="ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+                 "0123456789!@#$%^&*()"):
+    """Generate user password."""
+    return "".join([secrets.choice(charset) for _ in range(0, length)])
+
+
+def gen_username(first_name, last_name):
+    """Generate username from the user's first and last names."""
+    import unidecode
+    return first_name[0].lower() + \
+        unidecode.unidecode(last_name.
+                            replace(' ', '').
+                            replace("'", '').
+                            lower()).partition('-')[0][:7]
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""Avatar index and thumbnails."""
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import abort, send_from_directory, url_for
+from app.assets import CACHE_CONTROL
+
+# Avatars are stored as img/avatar/<grad_class>/<username>.jpg
+AVATAR_FOLDER = os.path.join('img', 'avatar')
+PLACEHOLDER = 'img/avatar/avatar_placeholder.png'
+
+# Thumbnails are stored as img/thumbnails/<size>/<content hash>.jpg
+THUMBNAIL_FOLDER = os.path.join('img', 'thumbnails')
+THUMBNAIL_SIZES = {'card': (320, 320), 'profile': (480, 480)}
+
+
+def make_thumbnail(source, destination, size):
+    """Save a resized JPEG copy of an image.
+
+    Keyword arguments:
+    source -- the path of the original image
+    destination -- the path of the thumbnail
+    size -- the maximum (width, height) of the thumbnail
+    """
+    from PIL import Image
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    img = Image.open(source)
+    img = img.convert('RGB')
+    img.thumbnail(size)
+
+    # Write to a temporary file first so that a thumbnail is never served
+    # half written
+    temporary = destination + '.tmp'
+    img.save(temporary, 'JPEG', quality=85, optimize=True)
+    os.replace(temporary, destination)
+
+
+class Avatars(object):
+    """In-memory index of the avatar files.
+
+    The avatar folders are rescanned at most every refresh_interval
+    seconds, and only the files whose modification time or size changed are
+    hashed again. Each avatar is indexed with the hash of its content, which
+    is used to build cache-busting urls served with far-future caching, and
+    its thumbnails are built by a background worker.
+    """
+
+    def __init__(self, app=None):
+        """Create an empty index."""
+        self._index = {}
+        self._last_check = None
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pending = set()
+        self.static_folder = None
+        self.refresh_interval = 10
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Bind the index to the static folder of an application.
+
+        The hashed avatars and thumbnails are served by the avatars route.
+        """
+        self.static_folder = app.static_folder
+        self.refresh_interval = app.config.get('AVATAR_REFRESH_INTERVAL', 10)
+        self._index = {}
+        self._last_check = None
+        app.add_url_rule('/avatars/<path:filename>', 'avatars', self.send)
+
+    def _scan_folder(self, grad_class, folder):
+        """Return the index entries of a grad class folder."""
+        entries = {}
+        for entry in os.scandir(folder):
+            if not (entry.is_file() and entry.name.endswith('.jpg')):
+                continue
+            username = entry.name[:-len('.jpg')]
+            stat = entry.stat()
+            indexed = self._index.get((grad_class, username))
+            if indexed is not None and \
+                    (indexed['mtime'], indexed['size']) == \
+                    (stat.st_mtime, stat.st_size):
+                entries[(grad_class, username)] = indexed
+                continue
+
+            content_hash = hashlib.md5()
+            with open(entry.path, 'rb') as f:
+                content_hash.update(f.read())
+            digest = content_hash.hexdigest()
+            entries[(grad_class, username)] = {
+                'filename': '/'.join(['img', 'avatar', grad_class,
+                                      entry.name]),
+                'path': entry.path,
+                'mtime': stat.st_mtime,
+                'size': stat.st_size,
+                'hash': digest,
+                'thumbnails': set(size for size in THUMBNAIL_SIZES
+                                  if os.path.isfile(
+                                      self._thumbnail_path(digest, size)))
+            }
+        return entries
+
+    def _thumbnail_path(self, digest, size):
+        """Return the path of a thumbnail."""
+        return os.path.join(self.static_folder, THUMBNAIL_FOLDER, size,
+                            digest + '.jpg')
+
+    def refresh(self, force=False):
+        """Rescan the avatar folders for new, changed and deleted files."""
+        now = time.monotonic()
+        if not force and self._last_check is not None and \
+                now - self._last_check < self.refresh_interval:
+            return
+        with self._lock:
+            self._last_check = now
+            root = os.path.join(self.static_folder, AVATAR_FOLDER)
+            if not os.path.isdir(root):
+                return
+
+            index = {}
+            for entry in os.scandir(root):
+                if entry.is_dir() and entry.name.isdigit():
+                    index.update(self._scan_folder(entry.name, entry.path))
+            self._index = index
+
+        for entry in index.values():
+            if len(entry['thumbnails']) < len(THUMBNAIL_SIZES):
+                self._schedule_thumbnails(entry)
+
+    def _schedule_thumbnails(self, entry):
+        """Build the missing thumbnails of an avatar in the background."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1)
+        for size, dimensions in THUMBNAIL_SIZES.items():
+            if size in entry['thumbnails'] or \
+                    (entry['hash'], size) in self._pending:
+                continue
+            self._pending.add((entry['hash'], size))
+            future = self._executor.submit(
+                make_thumbnail, entry['path'],
+                self._thumbnail_path(entry['hash'], size), dimensions)
+            future.add_done_callback(self._thumbnail_callback(entry, size))
+
+    def _thumbnail_callback(self, entry, size):
+        """Return a callback marking a thumbnail as built."""
+        def callback(future):
+            self._pending.discard((entry['hash'], size))
+            if future.exception() is None:
+                entry['thumbnails'].add(size)
+        return callback
+
+    def wait(self):
+        """Wait for the pending thumbnails to be built."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def url(self, grad_class, username, size='profile'):
+        """Return the url of a user avatar.
+
+        Keyword arguments:
+        grad_class -- the user's grad class
+        username -- the user's username
+        size -- 'card', 'profile' or None for the original image
+        """
+        self.refresh()
+        entry = self._index.get((str(grad_class), username))
+        if entry is None:
+            return url_for('static', filename=PLACEHOLDER)
+        if size in entry['thumbnails']:
+            return url_for('avatars', filename='/'.join(
+                ['img', 'thumbnails', size, entry['hash'] + '.jpg']))
+        return url_for('avatars', filename=entry['filename'], v=entry['hash'])
+
+    def send(self, filename):
+        """Serve a hashed avatar or thumbnail, cached forever."""
+        if not filename.startswith(('img/avatar/', 'img/thumbnails/')):
+            abort(404)
+        response = send_from_directory(self.static_folder, filename)
+        response.headers['Cache-Control'] = CACHE_CONTROL
+        return response
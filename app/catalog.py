@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""Cache of the item catalog."""
+import threading
+import time
+
+
+class CatalogItem(object):
+    """Read-only copy of an item, safe to share between requests."""
+
+    FIELDS = ('id', 'name', 'price', 'volume', 'is_alcohol',
+              'is_quantifiable', 'quantity', 'low_stock_threshold',
+              'is_low_stock', 'is_favorite')
+
+    def __init__(self, item):
+        """Copy the fields of an item."""
+        for field in self.FIELDS:
+            setattr(self, field, getattr(item, field))
+
+    def __repr__(self):
+        """Print item's name when printing a catalog item object."""
+        return '<CatalogItem {}>'.format(self.name)
+
+
+class Catalog(object):
+    """Snapshot of the items at a given catalog version."""
+
+    def __init__(self, version, items, quick_access_item_id):
+        """Index a list of items sorted by name.
+
+        Keyword arguments:
+        version -- the catalog version of the snapshot
+        items -- the catalog items, sorted by name
+        quick_access_item_id -- the id of the quick access item
+        """
+        self.version = version
+        self.items = items
+        self.favorites = [item for item in items if item.is_favorite]
+        self.by_id = {item.id: item for item in items}
+        self.by_name = {item.name: item for item in items}
+        self.quick_access_item = self.by_id.get(quick_access_item_id)
+
+
+class CatalogCache(object):
+    """Process-local snapshot of the item catalog.
+
+    Changes to items, restocks and the quick access item bump a version
+    stored in the database, in the same commit. Each process compares its
+    snapshot with that version at most every CATALOG_CHECK_INTERVAL
+    seconds and rebuilds it when it changed. Sales don't bump the version,
+    so that they don't all wait on its row: the quantities of an unchanged
+    snapshot are refreshed with each check instead.
+    """
+
+    def __init__(self, app=None):
+        """Create an empty cache."""
+        self._catalog = None
+        self._checked = None
+        self._lock = threading.Lock()
+        self.check_interval = 1
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Read the cache configuration of an application."""
+        self.check_interval = app.config.get('CATALOG_CHECK_INTERVAL', 1)
+        self.clear()
+
+    def _version(self):
+        """Return the catalog version stored in the database."""
+        from app import db
+        from app.models import CatalogVersion
+        version = db.session.query(CatalogVersion.version).\
+            filter_by(id=1).scalar()
+        return version or 0
+
+    def _build(self, version):
+        """Return a new snapshot of the catalog."""
+        from app.models import Item, GlobalSetting
+        items = [CatalogItem(item) for item in
+                 Item.query.order_by(Item.name.asc()).all()]
+        quick_access_item_id = GlobalSetting.query.\
+            filter_by(key='QUICK_ACCESS_ITEM_ID').first()
+        return Catalog(version, items, quick_access_item_id.value
+                       if quick_access_item_id else None)
+
+    def _refresh_stock(self, catalog):
+        """Copy the live quantities and low stock flags into a snapshot."""
+        from app import db
+        from app.models import Item
+        rows = db.session.query(Item.id, Item.quantity, Item.is_low_stock).\
+            filter(Item.is_quantifiable.is_(True))
+        for item_id, quantity, is_low_stock in rows:
+            item = catalog.by_id.get(item_id)
+            if item is not None:
+                item.quantity = quantity
+                item.is_low_stock = is_low_stock
+
+    def get(self):
+        """Return the current catalog snapshot."""
+        now = time.monotonic()
+        catalog = self._catalog
+        if catalog is not None and now - self._checked < self.check_interval:
+            return catalog
+
+        version = self._version()
+        if catalog is None or catalog.version != version:
+            catalog = self._build(version)
+        else:
+            self._refresh_stock(catalog)
+        with self._lock:
+            self._catalog = catalog
+            self._checked = now
+        return catalog
+
+    def bump(self):
+        """Increment the catalog version, the caller commits.
+
+        Call this with any change to the items or the quick access item.
+        """
+        from app import db
+        from app.models import CatalogVersion
+        updated = db.session.query(CatalogVersion).filter_by(id=1).\
+            update({CatalogVersion.version: CatalogVersion.version + 1},
+                   synchronize_session=False)
+        if not updated:
+            db.session.add(CatalogVersion(id=1, version=1))
+        self.clear()
+
+    def clear(self):
+        """Drop the local snapshot."""
+        with self._lock:
+            self._catalog = None
+            self._checked = None
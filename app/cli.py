@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+"""Command line interface."""
+import csv
+import time
+import click
+from app import assets, avatars
+from app.archive import academic_year_start, archive_transactions
+from app.assets import build_assets, vendor_assets
+from app.auth.credentials import BACKENDS, render_credentials
+from app.auth.importer import UserImportError, import_users, \
+    read_users_csv, write_credentials
+from app.engine import benchmark_sqlite, sqlite_pragmas
+from app.export import FORMATS, KINDS, export_query, stream_export
+from app.popularity import rebuild_sales, window_starts
+from app.reports import backfill_night_reports, last_closed_night
+from app.qrcodes import grad_class_badges, regenerate_qrcodes, \
+    stream_badges_pdf, stream_badges_zip
+
+
+def register(app):
+    """Register the custom commands of the application."""
+    @app.cli.group('avatars')
+    def avatar_commands():
+        """Avatar commands."""
+        pass
+
+    @avatar_commands.command()
+    def thumbnails():
+        """Build the missing avatar thumbnails."""
+        avatars.refresh(force=True)
+        avatars.wait()
+        click.echo('Thumbnails are up to date.')
+
+    @app.cli.group()
+    def qrcodes():
+        """QR code commands."""
+        pass
+
+    @qrcodes.command()
+    @click.argument('grad_class', type=int)
+    @click.argument('output', type=click.File('wb'))
+    @click.option('--format', 'output_format', default='zip',
+                  type=click.Choice(['zip', 'pdf']),
+                  help='ZIP archive of PNG files or printable PDF sheet.')
+    @click.option('--regenerate', is_flag=True,
+                  help='Set new QR codes before generating the badges.')
+    @click.option('--processes', type=int, default=None,
+                  help='Number of worker processes (default: CPU count).')
+    def badges(grad_class, output, output_format, regenerate, processes):
+        """Generate the QR code badges of a grad class."""
+        if regenerate:
+            count = regenerate_qrcodes(grad_class)
+            click.echo('Regenerated {} QR codes.'.format(count))
+
+        badges = grad_class_badges(grad_class)
+        if output_format == 'pdf':
+            chunks = stream_badges_pdf(badges, processes)
+        else:
+            chunks = stream_badges_zip(badges, processes)
+        for chunk in chunks:
+            output.write(chunk)
+        click.echo('Generated {} badges.'.format(len(badges)))
+
+    @app.cli.group()
+    def users():
+        """User commands."""
+        pass
+
+    @users.command('import')
+    @click.argument('csv_file', type=click.File('r', encoding='utf-8-sig'))
+    @click.argument('output', type=click.File('w'))
+    @click.option('--grad-class', type=int, default=0,
+                  help='Grad class of rows without a grad_class column.')
+    @click.option('--account-type', default='customer',
+                  type=click.Choice(['customer', 'observer', 'bartender',
+                                     'admin']),
+                  help='Account type of rows without an account_type '
+                  'column.')
+    @click.option('--batch-size', type=int, default=100,
+                  help='Number of users per commit.')
+    @click.option('--processes', type=int, default=None,
+                  help='Number of worker processes (default: CPU count).')
+    def import_csv(csv_file, output, grad_class, account_type, batch_size,
+                   processes):
+        """Import users from a CSV file and write their credentials."""
+        start = time.time()
+        try:
+            rows = read_users_csv(csv_file, grad_class, account_type)
+        except UserImportError as e:
+            raise click.ClickException(str(e))
+        credentials, skipped = import_users(rows, batch_size, processes)
+        write_credentials(credentials, output)
+
+        for row in skipped:
+            click.echo('Skipped {} {}: email {} already used.'.format(
+                row['first_name'], row['last_name'], row['email']))
+        click.echo('Imported {} users in {:.1f}s.'.format(
+            len(credentials), time.time() - start))
+
+    @users.command()
+    @click.argument('credentials_file',
+                    type=click.File('r', encoding='utf-8-sig'))
+    @click.option('--output-dir', default='pdf',
+                  type=click.Path(file_okay=False),
+                  help='Directory of the generated PDF files.')
+    @click.option('--model', default='latex/model.tex',
+                  type=click.Path(dir_okay=False),
+                  help='LaTeX model, for the latex backend.')
+    @click.option('--backend', default='latex', type=click.Choice(BACKENDS),
+                  help='pdflatex or pure Python rendering.')
+    @click.option('--workers', type=int, default=None,
+                  help='Number of parallel workers (default: CPU count).')
+    @click.option('--merge', is_flag=True,
+                  help='Also generate one merged PDF per grad class.')
+    def credentials(credentials_file, output_dir, model, backend, workers,
+                    merge):
+        """Generate credential PDFs from a credentials CSV file."""
+        rows = list(csv.DictReader(credentials_file))
+        stats = render_credentials(rows, output_dir, model, backend, workers,
+                                   merge)
+        for path in stats['merged']:
+            click.echo('Merged ' + path)
+        click.echo('Generated {} PDFs in {:.1f}s ({:.1f} PDFs/s).'.format(
+            stats['pdfs'], stats['elapsed'], stats['pdfs_per_second']))
+
+    @app.cli.group()
+    def transactions():
+        """Transaction commands."""
+        pass
+
+    @transactions.command()
+    @click.argument('output', type=click.File('w'))
+    @click.option('--format', 'output_format', default='csv',
+                  type=click.Choice(FORMATS), help='Output format.')
+    @click.option('--start', type=click.DateTime(['%Y-%m-%d']), default=None,
+                  help='First day of the export.')
+    @click.option('--end', type=click.DateTime(['%Y-%m-%d']), default=None,
+                  help='Last day of the export (inclusive).')
+    @click.option('--barman', default=None, help="Barman's username.")
+    @click.option('--client', default=None, help="Client's username.")
+    @click.option('--item', default=None, help='Item name.')
+    @click.option('--kind', default=None, type=click.Choice(sorted(KINDS)),
+                  help='Transaction kind.')
+    @click.option('--reverted/--not-reverted', default=None,
+                  help='Only export (non) reverted transactions.')
+    @click.option('--archived', is_flag=True,
+                  help='Export the archived transactions.')
+    def export(output, output_format, start, end, barman, client, item,
+               kind, reverted, archived):
+        """Export the transaction log as CSV or NDJSON."""
+        query = export_query(start=start.date() if start else None,
+                             end=end.date() if end else None,
+                             barman=barman, client=client, item=item,
+                             kind=kind, reverted=reverted, archived=archived)
+        for chunk in stream_export(query, output_format):
+            output.write(chunk)
+
+    @transactions.command()
+    @click.option('--before', type=click.DateTime(['%Y-%m-%d']),
+                  default=None,
+                  help='Archive the transactions before this day (default: '
+                  'start of the current academic year).')
+    @click.option('--batch-size', type=int, default=1000,
+                  help='Number of transactions moved per commit.')
+    def archive(before, batch_size):
+        """Move past transactions to the archive table."""
+        cutoff = before or academic_year_start()
+        start = time.time()
+        count = archive_transactions(cutoff, batch_size)
+        click.echo('Archived {} transactions older than {} in {:.1f}s.'.
+                   format(count, cutoff.date(), time.time() - start))
+
+    @app.cli.group()
+    def items():
+        """Item commands."""
+        pass
+
+    @items.command()
+    @click.option('--since', type=click.DateTime(['%Y-%m-%d']), default=None,
+                  help='First bar day to rebuild (default: start of the '
+                  'term window).')
+    def sales(since):
+        """Rebuild the daily item sales counters from the transactions."""
+        since = since.date() if since else window_starts()['term']
+        count = rebuild_sales(since)
+        click.echo('Rebuilt {} daily sales counters since {}.'.
+                   format(count, since))
+
+    @app.cli.group()
+    def reports():
+        """End-of-night report commands."""
+        pass
+
+    @reports.command()
+    @click.option('--start', type=click.DateTime(['%Y-%m-%d']), default=None,
+                  help='First night (default: start of the current '
+                  'academic year).')
+    @click.option('--end', type=click.DateTime(['%Y-%m-%d']), default=None,
+                  help='Last night (default: last closed night).')
+    def backfill(start, end):
+        """Store the missing reports of past nights."""
+        start = (start or academic_year_start()).date()
+        end = end.date() if end else last_closed_night()
+        count = backfill_night_reports(start, end)
+        click.echo('Stored {} night reports from {} to {}.'.
+                   format(count, start, end))
+
+    @app.cli.group()
+    def engine():
+        """Database engine commands."""
+        pass
+
+    @engine.command()
+    @click.option('--readers', type=int, default=4,
+                  help='Number of reading threads.')
+    @click.option('--writers', type=int, default=2,
+                  help='Number of writing threads.')
+    @click.option('--duration', type=float, default=5.0,
+                  help='Duration of each run in seconds.')
+    def benchmark(readers, writers, duration):
+        """Compare SQLite concurrency with and without the tuned pragmas."""
+        for name, pragmas in (('Rollback journal', ()),
+                              ('Tuned', sqlite_pragmas(app.config))):
+            stats = benchmark_sqlite(pragmas, readers, writers, duration)
+            click.echo('{}: {:.0f} reads/s, {:.0f} writes/s, {} errors.'.
+                       format(name, stats['reads_per_second'],
+                              stats['writes_per_second'], stats['errors']))
+
+    @app.cli.group('assets')
+    def asset_commands():
+        """Static asset commands."""
+        pass
+
+    @asset_commands.command()
+    @click.option('--force', is_flag=True,
+                  help='Download the assets which are already vendored.')
+    def vendor(force):
+        """Download the third-party assets from their CDN."""
+        try:
+            downloaded = vendor_assets(app.static_folder, force)
+        except (OSError, ValueError) as e:
+            raise click.ClickException(str(e))
+        click.echo('Vendored {} assets.'.format(len(downloaded)))
+
+    @asset_commands.command()
+    def build():
+        """Fingerprint and precompress the static assets."""
+        manifest = build_assets(app.static_folder, assets.folder)
+        assets.load()
+        for name, built_name in sorted(manifest.items()):
+            click.echo('{} -> {}'.format(name, built_name))
+        click.echo('Built {} assets.'.format(len(manifest)))
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""Database engine tuning for each backend and read replica routing."""
+import os
+import tempfile
+import threading
+import time
+import weakref
+from flask import current_app, has_request_context, request, session
+from flask_sqlalchemy import SQLAlchemy as BaseSQLAlchemy, SignallingSession
+from sqlalchemy import create_engine, event, orm
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.sql.expression import SelectBase
+
+# Bind key of the read replica in SQLALCHEMY_BINDS
+REPLICA_BIND = 'replica'
+
+
+def sqlite_pragmas(config):
+    """Return the pragmas set on each new SQLite connection.
+
+    Write-ahead logging lets readers and the writer work concurrently, and
+    synchronous=NORMAL is durable enough with it. Waiting busy_timeout
+    milliseconds for locks avoids most 'database is locked' errors.
+    """
+    return (('journal_mode', config.get('SQLITE_JOURNAL_MODE', 'WAL')),
+            ('synchronous', config.get('SQLITE_SYNCHRONOUS', 'NORMAL')),
+            ('busy_timeout', config.get('SQLITE_BUSY_TIMEOUT', 5000)),
+            ('cache_size', config.get('SQLITE_CACHE_SIZE', -16000)))
+
+
+def set_sqlite_pragmas(engine, pragmas):
+    """Set pragmas on each new connection of a SQLite engine."""
+    def connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas:
+            cursor.execute('PRAGMA {}={}'.format(name, value))
+        cursor.close()
+    event.listen(engine, 'connect', connect)
+
+
+def read_only(f):
+    """Mark a view as read-only, its queries being sent to the replica."""
+    f.read_only = True
+    return f
+
+
+def is_read_only_request():
+    """Return whether the current request may read from the replica.
+
+    Requests of users who wrote less than REPLICA_STICKINESS seconds ago
+    stay on the primary so that they read their own writes.
+    """
+    if not has_request_context():
+        return False
+    view = current_app.view_functions.get(request.endpoint)
+    return getattr(view, 'read_only', False) and \
+        session.get('_primary_until', 0) < time.time()
+
+
+class RoutingSession(SignallingSession):
+    """Session sending the reads of read-only requests to the replica.
+
+    Once the session has written anything, or outside of read-only
+    requests, every statement goes to the primary database.
+    """
+
+    def get_bind(self, mapper=None, clause=None):
+        """Return the replica engine for reads, the primary otherwise."""
+        if isinstance(clause, SelectBase) and not self._flushing and \
+                not self.info.get('wrote') and \
+                REPLICA_BIND in (self.app.config['SQLALCHEMY_BINDS'] or ()) \
+                and is_read_only_request():
+            return self.app.extensions['sqlalchemy'].db.\
+                get_engine(self.app, bind=REPLICA_BIND)
+        return super(RoutingSession, self).get_bind(mapper, clause)
+
+
+def mark_written(db_session):
+    """Keep a session, and its user for a while, on the primary."""
+    db_session.info['wrote'] = True
+    if has_request_context():
+        session['_primary_until'] = time.time() + \
+            current_app.config.get('REPLICA_STICKINESS', 10)
+
+
+event.listen(RoutingSession, 'after_flush',
+             lambda db_session, flush_context: mark_written(db_session))
+event.listen(RoutingSession, 'after_bulk_update',
+             lambda context: mark_written(context.session))
+event.listen(RoutingSession, 'after_bulk_delete',
+             lambda context: mark_written(context.session))
+
+
+class SQLAlchemy(BaseSQLAlchemy):
+    """Flask-SQLAlchemy extension with tuned engines.
+
+    MySQL connections are pooled, pinged before use and recycled before
+    the server drops them. SQLite connections get the pragmas returned by
+    sqlite_pragmas. Sessions route the reads of read-only views to the
+    optional replica bind.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """Create the extension without any tuned engine."""
+        super(SQLAlchemy, self).__init__(*args, **kwargs)
+        self._tuned_engines = weakref.WeakSet()
+        self._tuning_lock = threading.Lock()
+
+    def create_session(self, options):
+        """Return a factory of routing sessions."""
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def apply_driver_hacks(self, app, info, options):
+        """Add the MySQL pool options to the engine options."""
+        super(SQLAlchemy, self).apply_driver_hacks(app, info, options)
+        if info.drivername.startswith('mysql'):
+            options['pool_size'] = app.config.get('MYSQL_POOL_SIZE', 10)
+            options['max_overflow'] = app.config.get('MYSQL_MAX_OVERFLOW', 10)
+            options['pool_recycle'] = app.config.get('MYSQL_POOL_RECYCLE',
+                                                     280)
+            options['pool_pre_ping'] = True
+
+    def get_engine(self, app=None, bind=None):
+        """Return an engine, setting the SQLite pragmas on new engines.
+
+        Engines are created on first use rather than by the application
+        factory, so applications without a database URI can be created.
+        """
+        engine = super(SQLAlchemy, self).get_engine(app, bind)
+        if engine.dialect.name == 'sqlite':
+            with self._tuning_lock:
+                if engine not in self._tuned_engines:
+                    set_sqlite_pragmas(engine, sqlite_pragmas(
+                        self.get_app(app).config))
+                    self._tuned_engines.add(engine)
+        return engine
+
+
+def benchmark_sqlite(pragmas=(), readers=4, writers=2, duration=5.0):
+    """Return the throughput of concurrent readers and writers on SQLite.
+
+    Readers count the rows of a table while writers insert rows, each
+    thread with its own connection to a temporary database file.
+
+    Keyword arguments:
+    pragmas -- the pragmas set on each connection
+    readers -- the number of reading threads
+    writers -- the number of writing threads
+    duration -- the duration of the benchmark in seconds
+
+    Return the reads and writes per second, and the number of failed
+    operations.
+    """
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'benchmark.db')
+    engine = create_engine('sqlite:///' + path)
+    set_sqlite_pragmas(engine, pragmas)
+    engine.execute('CREATE TABLE benchmark (id INTEGER PRIMARY KEY, '
+                   'value TEXT)')
+
+    counts = {'reads': 0, 'writes': 0, 'errors': 0}
+    lock = threading.Lock()
+    stop = time.monotonic() + duration
+
+    def work(statement):
+        kind = 'writes' if statement.startswith('INSERT') else 'reads'
+        done = errors = 0
+        with engine.connect() as connection:
+            while time.monotonic() < stop:
+                try:
+                    with connection.begin():
+                        connection.execute(statement)
+                    done += 1
+                except OperationalError:
+                    errors += 1
+        with lock:
+            counts[kind] += done
+            counts['errors'] += errors
+
+    threads = [threading.Thread(target=work, args=(
+        "INSERT INTO benchmark (value) VALUES ('benchmark')",))
+        for _ in range(writers)] + \
+        [threading.Thread(target=work, args=(
+            'SELECT count(*) FROM benchmark',)) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+    for name in os.listdir(directory):
+        os.remove(os.path.join(directory, name))
+    os.rmdir(directory)
+
+    return {'reads_per_second': counts['reads'] / duration,
+            'writes_per_second': counts['writes'] / duration,
+            'errors': counts['errors']}
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""Transaction log filtering and export."""
+import csv
+import datetime
+import io
+import json
+from sqlalchemy import false
+from app import db
+from app.models import User, Item, Transaction, ArchivedTransaction
+
+# Columns of the exported rows
+EXPORT_FIELDS = ('id', 'date', 'barman', 'client', 'item', 'type',
+                 'balance_change', 'is_reverted')
+
+# Transaction kinds, matched against the transaction type
+KINDS = {
+    'top_up': 'Top up',
+    'pay': 'Pay %',
+    'revert': 'Revert %'
+}
+
+FORMATS = ('csv', 'ndjson')
+
+# Number of rows fetched from the database at a time
+EXPORT_BATCH_SIZE = 1000
+
+
+def parse_day(value):
+    """Return a date from a YYYY-MM-DD string, or None if empty."""
+    if not value:
+        return None
+    return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def filter_transactions(query, model=Transaction, start=None, end=None,
+                        barman=None, client=None, item=None, kind=None,
+                        reverted=None):
+    """Return a transaction query restricted to the given filters.
+
+    Client and item names are resolved to ids first, so that every filter
+    is answered by an index on the transaction table.
+
+    Keyword arguments:
+    query -- the query to filter
+    model -- Transaction or ArchivedTransaction
+    start -- the first day of the transactions
+    end -- the last day of the transactions (inclusive)
+    barman -- the barman's username
+    client -- the client's username
+    item -- the item name
+    kind -- 'top_up', 'pay' or 'revert'
+    reverted -- True or False to only keep (non) reverted transactions
+    """
+    if kind and kind not in KINDS:
+        raise ValueError('Unknown transaction kind {}.'.format(kind))
+    if start is not None:
+        query = query.filter(model.date >= start)
+    if end is not None:
+        query = query.filter(model.date < end + datetime.timedelta(days=1))
+    if barman:
+        query = query.filter(model.barman == barman)
+    if client:
+        user = User.query.filter_by(username=client).first()
+        if user is None:
+            return query.filter(false())
+        query = query.filter(model.client_id == user.id)
+    if item:
+        item = Item.query.filter_by(name=item).first()
+        if item is None:
+            return query.filter(false())
+        query = query.filter(model.item_id == item.id)
+    if kind:
+        query = query.filter(model.type.like(KINDS[kind]))
+    if reverted is not None:
+        if reverted:
+            query = query.filter(model.is_reverted.is_(True))
+        else:
+            query = query.filter(model.is_reverted.isnot(True))
+    return query
+
+
+def export_query(archived=False, **filters):
+    """Return a query of the exported transaction rows, oldest first.
+
+    Keyword arguments:
+    archived -- export the archived transactions instead
+    filters -- the filter_transactions keyword arguments
+    """
+    model = ArchivedTransaction if archived else Transaction
+    query = db.session.query(
+        model.id, model.date, model.barman, User.username, Item.name,
+        model.type, model.balance_change, model.is_reverted).\
+        outerjoin(User, model.client_id == User.id).\
+        outerjoin(Item, model.item_id == Item.id)
+    query = filter_transactions(query, model, **filters)
+    return query.order_by(model.id.asc())
+
+
+def export_rows(query, batch_size=EXPORT_BATCH_SIZE):
+    """Yield the rows of an export query as dicts.
+
+    Rows are fetched batch_size at a time from a server-side cursor, so the
+    memory used doesn't depend on the number of exported transactions.
+    """
+    for row in query.yield_per(batch_size):
+        yield dict(zip(EXPORT_FIELDS, row))
+
+
+def stream_csv(rows, batch_size=EXPORT_BATCH_SIZE):
+    """Yield CSV chunks of batch_size rows, starting with the header."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, EXPORT_FIELDS)
+    writer.writeheader()
+    for index, row in enumerate(rows, start=1):
+        row['date'] = row['date'].isoformat()
+        writer.writerow(row)
+        if index % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def stream_ndjson(rows, batch_size=EXPORT_BATCH_SIZE):
+    """Yield newline-delimited JSON chunks of batch_size rows."""
+    lines = []
+    for row in rows:
+        row['date'] = row['date'].isoformat()
+        lines.append(json.dumps(row) + '\n')
+        if len(lines) == batch_size:
+            yield ''.join(lines)
+            lines = []
+    yield ''.join(lines)
+
+
+def stream_export(query, output_format='csv', batch_size=EXPORT_BATCH_SIZE):
+    """Yield the chunks of an export in the given format."""
+    if output_format not in FORMATS:
+        raise ValueError('Unknown export format {}.'.format(output_format))
+    rows = export_rows(query, batch_size)
+    if output_format == 'ndjson':
+        return stream_ndjson(rows, batch_size)
+    return stream_csv(rows, batch_size)
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""Consumption and balance aggregates per grad class."""
+import datetime
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import case, func, select, union_all
+from app import db
+from app.models import User, Transaction, ArchivedTransaction
+
+# Number of seconds the totals of a closed period are kept
+TOTALS_CACHE_TTL = 3600
+
+# Number of cached periods, the least recently used being evicted first
+TOTALS_CACHE_SIZE = 64
+
+# Transaction totals of the closed periods, by (start, end)
+_totals = OrderedDict()
+_totals_lock = threading.Lock()
+
+
+def _select(model, start, end):
+    """Return a select of the client transactions of a period."""
+    query = select([model.client_id, model.type, model.balance_change]).\
+        where(model.client_id.isnot(None)).\
+        where(model.is_reverted.isnot(True))
+    if start is not None:
+        query = query.where(model.date >= start)
+    if end is not None:
+        query = query.where(model.date < end + datetime.timedelta(days=1))
+    return query
+
+
+def transaction_totals(start=None, end=None, today=None,
+                       ttl=TOTALS_CACHE_TTL, maxsize=TOTALS_CACHE_SIZE):
+    """Return the revenue, top-ups and active clients of each grad class.
+
+    Hot and archived transactions are joined to their client's grad class
+    and summed in a single grouped query. Totals of periods ending before
+    today are cached for ttl seconds. Periods come from request arguments,
+    so at most maxsize of them are kept.
+
+    Keyword arguments:
+    start -- the first day of the period
+    end -- the last day of the period (inclusive)
+    today -- the current date
+    ttl -- the number of seconds the totals are kept
+    maxsize -- the number of cached periods
+    """
+    key = (start, end)
+    now = time.monotonic()
+    with _totals_lock:
+        cached = _totals.get(key)
+        if cached is not None and cached[0] > now:
+            _totals.move_to_end(key)
+            return cached[1]
+
+    period = union_all(_select(Transaction, start, end),
+                       _select(ArchivedTransaction, start, end)).\
+        alias('period')
+    is_pay = period.c.type.like('Pay%')
+    rows = db.session.query(
+        User.grad_class,
+        func.sum(case([(is_pay, -period.c.balance_change)], else_=0)),
+        func.sum(case([(period.c.type == 'Top up',
+                        period.c.balance_change)], else_=0)),
+        func.count(func.distinct(period.c.client_id))).\
+        select_from(period).join(User, period.c.client_id == User.id).\
+        group_by(User.grad_class).all()
+    totals = {grad_class: {'revenue': revenue or 0.0,
+                           'topped_up': topped_up or 0.0,
+                           'nb_active_clients': nb_active_clients}
+              for grad_class, revenue, topped_up, nb_active_clients in rows}
+
+    if end is not None and end < (today or datetime.date.today()):
+        with _totals_lock:
+            _totals[key] = (now + ttl, totals)
+            _totals.move_to_end(key)
+            while len(_totals) > maxsize:
+                _totals.popitem(last=False)
+    return totals
+
+
+def balance_totals():
+    """Return the number of users and outstanding balance of each class."""
+    rows = db.session.query(User.grad_class, func.count(User.id),
+                            func.sum(User.balance)).\
+        group_by(User.grad_class).all()
+    return {grad_class: {'nb_users': nb_users, 'balance': balance or 0.0}
+            for grad_class, nb_users, balance in rows}
+
+
+def grad_class_totals(start=None, end=None):
+    """Return the totals of each grad class, sorted by grad class.
+
+    Keyword arguments:
+    start -- the first day of the period
+    end -- the last day of the period (inclusive)
+    """
+    transactions = transaction_totals(start, end)
+    balances = balance_totals()
+    empty = {'revenue': 0.0, 'topped_up': 0.0, 'nb_active_clients': 0}
+    return [dict(grad_class=grad_class,
+                 **transactions.get(grad_class, empty),
+                 **balances.get(grad_class, {'nb_users': 0,
+                                             'balance': 0.0}))
+            for grad_class in sorted(set(transactions) | set(balances))]
+
+
+def discard_totals(day):
+    """Drop the cached totals of the periods including a day."""
+    with _totals_lock:
+        for start, end in list(_totals):
+            if (start is None or start <= day) and day <= end:
+                del _totals[start, end]
+
+
+def clear_totals():
+    """Drop the cached totals."""
+    with _totals_lock:
+        _totals.clear()
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""Cache of the logged in users' identities."""
+import threading
+import time
+from flask_login import UserMixin
+
+
+class Identity(UserMixin):
+    """Identity and role flags of a logged in user.
+
+    This is what Flask-Login exposes as current_user after the login request,
+    so it only holds what is needed for authorization.
+    """
+
+    FIELDS = ('id', 'username', 'first_name', 'last_name', 'is_observer',
+              'is_customer', 'is_bartender', 'is_admin')
+
+    def __init__(self, user):
+        """Copy the identity fields of a user."""
+        for field in self.FIELDS:
+            setattr(self, field, getattr(user, field))
+
+    def __repr__(self):
+        """Print identity's username when printing an identity object."""
+        return '<Identity {}>'.format(self.username)
+
+
+class IdentityCache(object):
+    """Process-local cache of identities, with a time to live.
+
+    Role changes and deletions bump a version stored in the database, in
+    the same commit. Each process compares its cache with that version at
+    most every IDENTITY_CHECK_INTERVAL seconds and empties it when it
+    changed, so that no process keeps a stale identity for longer.
+    """
+
+    def __init__(self, app=None):
+        """Create an empty cache."""
+        self._identities = {}
+        self._version = None
+        self._checked = None
+        self._lock = threading.Lock()
+        self.ttl = 60
+        self.maxsize = 1024
+        self.check_interval = 1
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Read the cache configuration of an application."""
+        self.ttl = app.config.get('IDENTITY_CACHE_TTL', 60)
+        self.maxsize = app.config.get('IDENTITY_CACHE_SIZE', 1024)
+        self.check_interval = app.config.get('IDENTITY_CHECK_INTERVAL', 1)
+        self.clear()
+
+    def _check_version(self):
+        """Empty the cache if the identity version changed."""
+        now = time.monotonic()
+        if self._checked is not None and \
+                now - self._checked < self.check_interval:
+            return
+        from app import db
+        from app.models import IdentityVersion
+        version = db.session.query(IdentityVersion.version).\
+            filter_by(id=1).scalar() or 0
+        with self._lock:
+            if version != self._version:
+                self._identities = {}
+                self._version = version
+            self._checked = now
+
+    def get(self, user_id):
+        """Return the cached identity of a user, or None."""
+        self._check_version()
+        cached = self._identities.get(user_id)
+        if cached is None:
+            return None
+        expires, identity = cached
+        if expires < time.monotonic():
+            with self._lock:
+                self._identities.pop(user_id, None)
+            return None
+        return identity
+
+    def set(self, user):
+        """Cache and return the identity of a user.
+
+        Identities being cached for the same time, the oldest ones are
+        evicted first when the cache is full.
+        """
+        self._check_version()
+        identity = Identity(user)
+        with self._lock:
+            self._identities.pop(user.id, None)
+            while len(self._identities) >= self.maxsize:
+                del self._identities[next(iter(self._identities))]
+            self._identities[user.id] = (time.monotonic() + self.ttl,
+                                         identity)
+        return identity
+
+    def invalidate(self, user_id):
+        """Drop the identity of a user in every process, the caller commits.
+
+        Call this with any change to the role flags of a user, or when
+        deleting a user.
+        """
+        from app import db
+        from app.models import IdentityVersion
+        updated = db.session.query(IdentityVersion).filter_by(id=1).\
+            update({IdentityVersion.version: IdentityVersion.version + 1},
+                   synchronize_session=False)
+        if not updated:
+            db.session.add(IdentityVersion(id=1, version=1))
+        with self._lock:
+            self._identities.pop(user_id, None)
+
+    def clear(self):
+        """Remove all identities from the cache."""
+        with self._lock:
+            self._identities = {}
+            self._version = None
+            self._checked = None
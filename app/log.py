@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""Queued application logs."""
+import atexit
+import datetime
+import json
+import logging
+import os
+import queue
+import time
+import uuid
+from logging.handlers import QueueHandler, QueueListener, \
+    RotatingFileHandler, TimedRotatingFileHandler
+from flask import current_app, g, has_request_context, request
+
+LOG_FILE = 'espcibar.log'
+
+TEXT_FORMAT = '%(asctime)s %(levelname)s: %(message)s ' \
+    '[in %(pathname)s:%(lineno)d]'
+
+# Request fields added to the JSON lines when present
+REQUEST_FIELDS = ('request_id', 'method', 'path', 'status', 'duration_ms')
+
+
+class JsonFormatter(logging.Formatter):
+    """Format log records as JSON lines."""
+
+    def format(self, record):
+        """Return a log record as a one line JSON object."""
+        entry = {
+            'time': datetime.datetime.fromtimestamp(
+                record.created, datetime.timezone.utc).isoformat(),
+            'level': record.levelname,
+            'message': record.getMessage(),
+            'module': record.module,
+            'line': record.lineno
+        }
+        for field in REQUEST_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+class RequestFilter(logging.Filter):
+    """Add the id of the current request to log records.
+
+    Records are formatted by the queue listener thread, outside of the
+    request context, so the id is read when the record is emitted.
+    """
+
+    def filter(self, record):
+        """Set the request_id attribute of a record."""
+        if has_request_context() and not hasattr(record, 'request_id'):
+            record.request_id = g.get('request_id')
+        return True
+
+
+def make_file_handler(config, path):
+    """Return a file handler rotated by size or by time.
+
+    Keyword arguments:
+    config -- the application configuration
+    path -- the path of the log file
+    """
+    rotation = config.get('LOG_ROTATION', 'size')
+    backup_count = config.get('LOG_BACKUP_COUNT', 10)
+    if rotation == 'size':
+        return RotatingFileHandler(
+            path, maxBytes=config.get('LOG_MAX_BYTES', 10 * 1024 * 1024),
+            backupCount=backup_count, encoding='utf-8')
+    if rotation == 'time':
+        return TimedRotatingFileHandler(
+            path, when=config.get('LOG_WHEN', 'midnight'),
+            interval=config.get('LOG_INTERVAL', 1),
+            backupCount=backup_count, encoding='utf-8')
+    raise ValueError('Unknown log rotation {}.'.format(rotation))
+
+
+def start_request():
+    """Give the current request an id and record its start time."""
+    g.request_id = request.headers.get('X-Request-Id', '')[:64] or \
+        uuid.uuid4().hex
+    g.request_start = time.perf_counter()
+
+
+def log_request(response):
+    """Log the method, path, status and latency of the current request."""
+    if 'request_start' not in g:
+        return response
+    duration = round((time.perf_counter() - g.request_start) * 1000, 1)
+    current_app.logger.info('%s %s %s %.1f ms', request.method, request.path,
+                            response.status_code, duration,
+                            extra={'method': request.method,
+                                   'path': request.path,
+                                   'status': response.status_code,
+                                   'duration_ms': duration})
+    response.headers['X-Request-Id'] = g.request_id
+    return response
+
+
+def init_logging(app):
+    """Send the logs of an application to a rotated file through a queue.
+
+    Records are put on a queue by the request threads and written to the
+    file by a listener thread, so requests never wait on file I/O.
+
+    Return the queue listener.
+    """
+    folder = app.config.get('LOG_FOLDER', 'logs')
+    os.makedirs(folder, exist_ok=True)
+    level = app.config.get('LOG_LEVEL', 'INFO')
+
+    file_handler = make_file_handler(app.config,
+                                     os.path.join(folder, LOG_FILE))
+    if app.config.get('LOG_FORMAT', 'text') == 'json':
+        file_handler.setFormatter(JsonFormatter())
+    else:
+        file_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+    file_handler.setLevel(level)
+
+    log_queue = queue.Queue(-1)
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.addFilter(RequestFilter())
+    listener = QueueListener(log_queue, file_handler,
+                             respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    app.logger.addHandler(queue_handler)
+    app.logger.setLevel(level)
+
+    # Log each request with its id and latency
+    if app.config.get('LOG_REQUESTS', True):
+        app.before_request(start_request)
+        app.after_request(log_request)
+    return listener
@@ -3,9 +3,10 @@
 import safe
 from flask import request
 from flask_wtf import FlaskForm
-from wtforms import StringField, SubmitField, PasswordField, FloatField, \
-                    IntegerField, BooleanField, DateField, FieldList, \
-                    SelectField
+from wtforms import Form, StringField, SubmitField, PasswordField, \
+                    FloatField, IntegerField, BooleanField, DateField, \
+                    FieldList, FormField, HiddenField, SelectField
+from wtforms.fields.html5 import DateField as DateInputField
 from wtforms.validators import ValidationError, DataRequired, Email, EqualTo, \
                                optional
 from app.models import User, Item
@@ -60,7 +61,12 @@ class EditItemForm(FlaskForm):
     name = StringField('Name', validators=[DataRequired()])
     quantity = IntegerField('Quantity (empty if not quantifiable)',
                             [optional()])
+    low_stock_threshold = IntegerField('Low stock threshold (optional)',
+                                       [optional()])
     price = FloatField('Price', validators=[DataRequired()])
+    volume = FloatField('Serving volume in liters (alcohol only, 0.25 if '
+                        'empty)',
+                        [optional()])
     is_alcohol = BooleanField('Alcohol')
     is_quantifiable = BooleanField('Quantifiable')
     is_favorite = BooleanField('Favorite')
@@ -89,6 +95,11 @@ class EditItemForm(FlaskForm):
         if price.data < 0:
             raise ValidationError('Please enter a positive price.')
 
+    def validate_volume(self, volume):
+        """Check that volume is a positive number."""
+        if volume.data is not None and volume.data < 0:
+            raise ValidationError('Please enter a positive volume.')
+
 
 class AddItemForm(FlaskForm):
     """Item adding form."""
@@ -96,7 +107,12 @@ class AddItemForm(FlaskForm):
     name = StringField('Name', validators=[DataRequired()])
     quantity = IntegerField('Quantity (empty if not quantifiable)',
                             [optional()])
+    low_stock_threshold = IntegerField('Low stock threshold (optional)',
+                                       [optional()])
     price = FloatField('Price', validators=[DataRequired()])
+    volume = FloatField('Serving volume in liters (alcohol only, 0.25 if '
+                        'empty)',
+                        [optional()])
     is_alcohol = BooleanField('Alcohol')
     is_quantifiable = BooleanField('Quantifiable')
     is_favorite = BooleanField('Favorite')
@@ -120,6 +136,31 @@ class AddItemForm(FlaskForm):
         if price.data < 0:
             raise ValidationError('Please enter a positive price.')
 
+    def validate_volume(self, volume):
+        """Check that volume is a positive number."""
+        if volume.data is not None and volume.data < 0:
+            raise ValidationError('Please enter a positive volume.')
+
+
+class RestockEntryForm(Form):
+    """Quantity change of one item in the restock form."""
+
+    item_id = HiddenField('Item')
+    delta = IntegerField('Delta', [optional()])
+
+
+class RestockForm(FlaskForm):
+    """Bulk restock form."""
+
+    entries = FieldList(FormField(RestockEntryForm))
+
+    submit = SubmitField('Restock')
+
+    def deltas(self):
+        """Return the quantity changes by item id."""
+        return {int(entry.item_id.data): entry.delta.data
+                for entry in self.entries if entry.delta.data}
+
 
 class SearchForm(FlaskForm):
     """User search form."""
@@ -138,6 +179,73 @@ class SearchForm(FlaskForm):
         super(SearchForm, self).__init__(*args, **kwargs)
 
 
+class TransactionFilterForm(FlaskForm):
+    """Transaction filtering form."""
+
+    class Meta:
+        """Filter form doesn't need CSRF."""
+
+        csrf = False
+
+    barman = StringField('Bartender')
+    client = StringField('Client')
+    item = StringField('Item')
+    kind = SelectField('Kind', choices=[('', 'Any kind'),
+                                        ('top_up', 'Top up'),
+                                        ('pay', 'Pay'),
+                                        ('revert', 'Revert')],
+                       default='')
+    reverted = SelectField('Reverted', choices=[('', 'Reverted or not'),
+                                                ('yes', 'Reverted'),
+                                                ('no', 'Not reverted')],
+                           default='')
+    start = DateInputField('From', validators=[optional()])
+    end = DateInputField('To', validators=[optional()])
+
+    def __init__(self, *args, **kwargs):
+        """Store GET arguments."""
+        if 'formdata' not in kwargs:
+            kwargs['formdata'] = request.args
+        super(TransactionFilterForm, self).__init__(*args, **kwargs)
+
+    def filters(self):
+        """Return the filter_transactions keyword arguments."""
+        reverted = {'yes': True, 'no': False}.get(self.reverted.data)
+        return dict(barman=self.barman.data, client=self.client.data,
+                    item=self.item.data, kind=self.kind.data,
+                    reverted=reverted,
+                    start=None if self.start.errors else self.start.data,
+                    end=None if self.end.errors else self.end.data)
+
+    def args(self):
+        """Return the non empty GET arguments of the form."""
+        return {field.name: request.args[field.name] for field in self
+                if request.args.get(field.name)}
+
+
+class PeriodForm(FlaskForm):
+    """Period selection form."""
+
+    class Meta:
+        """Period form doesn't need CSRF."""
+
+        csrf = False
+
+    start = DateInputField('From', validators=[optional()])
+    end = DateInputField('To', validators=[optional()])
+
+    def __init__(self, *args, **kwargs):
+        """Store GET arguments."""
+        if 'formdata' not in kwargs:
+            kwargs['formdata'] = request.args
+        super(PeriodForm, self).__init__(*args, **kwargs)
+
+    def period(self):
+        """Return the first and last days of the period."""
+        return (None if self.start.errors else self.start.data,
+                None if self.end.errors else self.end.data)
+
+
 class GlobalSettingsForm(FlaskForm):
     """Global settings form."""
 
@@ -3,14 +3,32 @@
 import datetime
 from calendar import monthrange
 from flask import render_template, flash, redirect, url_for, request, g, \
-    jsonify, current_app
+    jsonify, current_app, abort, make_response, Response, stream_with_context
 from flask_login import current_user, login_required, fresh_login_required
+from flask_sqlalchemy import Pagination
 from sqlalchemy import extract
+from sqlalchemy.orm import joinedload
 from sqlalchemy.sql.expression import and_
-from app import db
+from app import db, identities, catalog, popularity
+from app.analytics import first_academic_year, year_statistics
+from app.archive import academic_year_start, archived_monthly_totals
+from app.engine import read_only
+from app.export import export_query, filter_transactions, parse_day, \
+    stream_export
+from app.grad_classes import clear_totals, discard_totals, \
+    grad_class_totals
 from app.main.forms import EditProfileForm, EditItemForm, AddItemForm, \
-    SearchForm, GlobalSettingsForm
-from app.models import User, Item, Transaction, GlobalSetting
+    SearchForm, GlobalSettingsForm, TransactionFilterForm, RestockForm, \
+    PeriodForm
+from app.models import User, Item, Transaction, ArchivedTransaction, \
+    GlobalSetting, StockMovement
+from app.pagination import KeysetPagination, cached_count
+from app.popularity import BAR_DAY_START_HOUR, bar_day, record_sale
+from app.qrcodes import render_qrcode, qrcode_version, grad_class_badges, \
+    stream_badges_pdf, stream_badges_zip
+from app.reports import alcohol_volume, discard_night_report, \
+    get_night_report, last_closed_night
+from app.stock import move_stock, restock, update_low_stock
 from app.main import bp
 
 
@@ -22,6 +40,25 @@ def before_request():
             g.search_form = SearchForm()
 
 
+def get_products():
+    """Return the inventory, favorites and quick access item to sell.
+
+    Products are ordered by name, or by popularity when PRODUCTS_ORDER is
+    set to a window. In that case, when no quick access item is set, the
+    most popular item is used instead.
+    """
+    items = catalog.get()
+    inventory = popularity.rank(items.items,
+                                key=('inventory', items.version))
+    favorites = popularity.rank(items.favorites,
+                                key=('favorites', items.version))
+    quick_access_item = items.quick_access_item
+    if quick_access_item is None and popularity.order != 'name' and \
+            inventory:
+        quick_access_item = inventory[0]
+    return inventory, favorites, quick_access_item
+
+
 def month_year_iter(start_month, start_year, end_month, end_year):
     """Return month iterator."""
     ym_start = 12*start_year + start_month - 1
@@ -33,6 +70,7 @@ def month_year_iter(start_month, start_year, end_month, end_year):
 
 @bp.route('/get_yearly_transactions', methods=['GET'])
 @login_required
+@read_only
 def get_yearly_transactions():
     """Return transaction from last 12 months."""
     if not (current_user.is_admin or current_user.is_bartender or
@@ -51,7 +89,10 @@ def get_yearly_transactions():
         previous_year = current_year - 1
     previous_month = (current_month-12) % 12
 
-    # Get money spent and topped up last 12 months
+    # Get money spent and topped up last 12 months, archived transactions
+    # being counted from their monthly summaries
+    archived = archived_monthly_totals((previous_year, previous_month + 1),
+                                       (current_year, current_month))
     paid_per_month = []
     topped_per_month = []
     for (y, m) in month_year_iter(previous_month+1, previous_year,
@@ -68,10 +109,11 @@ def get_yearly_transactions():
                      extract('year', Transaction.date) == y)).\
             filter(Transaction.type.like('Top up')).\
             filter_by(is_reverted=False).all()
-        paid_per_month.append(0)
+        archived_paid, archived_topped = archived.get((y, m), (0, 0))
+        paid_per_month.append(archived_paid)
         for t in transactions_paid_y:
             paid_per_month[-1] -= t.balance_change
-        topped_per_month.append(0)
+        topped_per_month.append(archived_topped)
         for t in transactions_topped_y:
             topped_per_month[-1] += t.balance_change
 
@@ -85,8 +127,35 @@ def get_yearly_transactions():
                     'months_labels': months_labels})
 
 
+@bp.route('/get_analytics', methods=['GET'])
+@login_required
+@read_only
+def get_analytics():
+    """Return long-range consumption statistics of an academic year."""
+    if not (current_user.is_admin or current_user.is_bartender or
+            current_user.is_observer):
+        return redirect(url_for('main.user', username=current_user.username))
+
+    # Get the academic year, the current one by default
+    current_year = academic_year_start().year
+    year = request.args.get('year', current_year, type=int)
+    if year > current_year:
+        abort(404)
+
+    # Get the statistics of every academic year, closed years being cached
+    years = {y: year_statistics(y) for y in
+             range(min(year, first_academic_year()), current_year + 1)}
+    trends = [{'year': y, 'revenue': years[y]['revenue'],
+               'topped_up': years[y]['topped_up'],
+               'nb_sales': years[y]['nb_sales']} for y in sorted(years)]
+
+    return jsonify({'year': year, 'statistics': years[year],
+                    'trends': trends})
+
+
 @bp.route('/get_daily_statistics', methods=['GET'])
 @login_required
+@read_only
 def get_daily_statistics():
     """Return daily statistics."""
     # Get current day start
@@ -107,11 +176,7 @@ def get_daily_statistics():
         count()
 
     # Daily alcohol consumption
-    alcohol_qty = Transaction.query.\
-        filter(Transaction.date > current_day_start).\
-        filter(Transaction.type.like('Pay%')).\
-        filter(Transaction.item.has(is_alcohol=True)).\
-        filter_by(is_reverted=False).count() * 0.25
+    alcohol_qty = alcohol_volume(current_day_start)
 
     # Daily revenue
     daily_transactions = Transaction.query.\
@@ -125,9 +190,75 @@ def get_daily_statistics():
                     'daily_revenue': daily_revenue})
 
 
+@bp.route('/grad_classes', methods=['GET'])
+@login_required
+@read_only
+def grad_classes():
+    """Render the grad class totals page."""
+    if not current_user.is_admin:
+        flash("You don't have the rights to access this page.", 'danger')
+        return redirect(url_for('main.dashboard'))
+
+    form = PeriodForm()
+    form.validate()
+    start, end = form.period()
+
+    return render_template('grad_classes.html.j2', title='Grad classes',
+                           form=form, totals=grad_class_totals(start, end))
+
+
+@bp.route('/get_grad_classes', methods=['GET'])
+@login_required
+@read_only
+def get_grad_classes():
+    """Return the grad class totals of a period."""
+    if not current_user.is_admin:
+        return redirect(url_for('main.user', username=current_user.username))
+
+    form = PeriodForm()
+    if not form.validate():
+        abort(400)
+    start, end = form.period()
+
+    return jsonify({'start': start.isoformat() if start else None,
+                    'end': end.isoformat() if end else None,
+                    'grad_classes': grad_class_totals(start, end)})
+
+
+@bp.route('/night_report', methods=['GET'])
+@login_required
+def night_report():
+    """Render the end-of-night report of a bar day."""
+    if not (current_user.is_admin or current_user.is_bartender or
+            current_user.is_observer):
+        flash("You don't have the rights to access this page.", 'danger')
+        return redirect(url_for('main.dashboard'))
+
+    # Get the night, the last closed one by default
+    try:
+        day = parse_day(request.args.get('day', None, type=str)) or \
+            last_closed_night()
+    except ValueError:
+        abort(404)
+
+    report, closed = get_night_report(day)
+
+    # Items are listed from the best seller, hours in the order of the night
+    items = sorted(report['items'].items(),
+                   key=lambda item: (-item[1]['nb_sales'], item[0]))
+    hours = sorted(report['hours'].items(),
+                   key=lambda hour: (int(hour[0]) - BAR_DAY_START_HOUR) % 24)
+
+    return render_template('night_report.html.j2', title='Night report',
+                           day=day, report=report, closed=closed,
+                           items=items, hours=hours,
+                           one_day=datetime.timedelta(days=1))
+
+
 @bp.route('/', methods=['GET'])
 @bp.route('/dashboard', methods=['GET'])
 @login_required
+@read_only
 def dashboard():
     """Render the index page.
 
@@ -159,11 +290,7 @@ def dashboard():
         count()
 
     # Daily alcohol consumption
-    alcohol_qty = Transaction.query.\
-        filter(Transaction.date > current_day_start).\
-        filter(Transaction.type.like('Pay%')).\
-        filter(Transaction.item.has(is_alcohol=True)).\
-        filter_by(is_reverted=False).count() * 0.25
+    alcohol_qty = alcohol_volume(current_day_start)
 
     # Daily revenue
     daily_transactions = Transaction.query.\
@@ -217,41 +344,35 @@ def search():
     if query == '':
         return redirect(url_for('main.dashboard'))
 
-    # Get inventory
-    inventory = Item.query.order_by(Item.name.asc()).all()
-
-    # Get favorite items
-    favorite_inventory = Item.query.filter_by(is_favorite=True).\
-        order_by(Item.name.asc()).all()
-
-    # Get quick access item
-    quick_access_item_id = GlobalSetting.query.\
-        filter_by(key='QUICK_ACCESS_ITEM_ID').first()
-    quick_access_item = Item.query.\
-        filter_by(id=quick_access_item_id.value).first()
-
-    # Get users corresponding to the query
+    # Get users corresponding to the query. The index is searched once and
+    # the total and the current page are both taken from this result set.
     query_text = g.search_form.q.data
-    final_query = User.query.whooshee_search(query_text)
-    total = final_query.count()
+    final_query = User.query.whooshee_search(query_text,
+                                             order_by_relevance=0)
 
     # Sort users alphabetically
     if sort == 'asc':
-        users = final_query.\
-            order_by(User.last_name.asc()).\
-            paginate(page, current_app.config['USERS_PER_PAGE'], True)
+        results = final_query.order_by(User.last_name.asc()).all()
     else:
-        users = final_query.\
-            order_by(User.last_name.desc()).\
-            paginate(page, current_app.config['USERS_PER_PAGE'], True)
+        results = final_query.order_by(User.last_name.desc()).all()
+    total = len(results)
 
     # If only one user, redirect to his profile
     if total == 1:
-        return redirect(url_for('main.user', username=users.items[0].username))
+        return redirect(url_for('main.user', username=results[0].username))
+
+    per_page = current_app.config['USERS_PER_PAGE']
+    items = results[(page - 1) * per_page:page * per_page]
+    if page < 1 or (not items and page != 1):
+        abort(404)
+    users = Pagination(None, page, per_page, total, items)
+
+    # Get inventory, favorite items and quick access item
+    inventory, favorites, quick_access_item = get_products()
 
     return render_template('search.html.j2', title='Search', users=users,
                            sort=sort, inventory=inventory, total=total,
-                           favorite_inventory=favorite_inventory,
+                           favorite_inventory=favorites,
                            quick_access_item=quick_access_item)
 
 
@@ -267,16 +388,12 @@ def get_user_products():
     user = User.query.filter_by(username=request.args['username']).\
         first_or_404()
 
-    # Get inventory
-    inventory = Item.query.order_by(Item.name.asc()).all()
-
-    # Get favorite items
-    favorite_inventory = Item.query.filter_by(is_favorite=True).\
-        order_by(Item.name.asc()).all()
+    # Get inventory and favorite items
+    inventory, favorites, _ = get_products()
 
     pay_template = render_template('_user_products.html.j2', user=user,
                                    inventory=inventory,
-                                   favorite_inventory=favorite_inventory)
+                                   favorite_inventory=favorites)
 
     return jsonify({'html': pay_template})
 
@@ -294,8 +411,9 @@ def user(username):
         flash("You don't have the rights to access this page.", 'danger')
         return redirect(url_for('main.dashboard'))
 
-    # Get transactions page
-    page = request.args.get('page', 1, type=int)
+    # Get transactions page cursors
+    after = request.args.get('after', None, type=int)
+    before = request.args.get('before', None, type=int)
 
     # Get user
     user = User.query.filter_by(username=username).first_or_404()
@@ -305,26 +423,18 @@ def user(username):
         ((today.month, today.day) < (user.birthdate.month, user.birthdate.day))
 
     # Get user transactions
-    transactions = user.transactions.order_by(Transaction.id.desc()).\
-        paginate(page, 5, True)
-
-    # Get inventory
-    inventory = Item.query.order_by(Item.name.asc()).all()
-
-    # Get favorite items
-    favorite_inventory = Item.query.filter_by(is_favorite=True).\
-        order_by(Item.name.asc()).all()
+    transactions = KeysetPagination(
+        user.transactions, Transaction.id, 5, after=after, before=before,
+        total=cached_count(('user_transactions', user.id),
+                           user.transactions))
 
-    # Get quick access item
-    quick_access_item_id = GlobalSetting.query.\
-        filter_by(key='QUICK_ACCESS_ITEM_ID').first()
-    quick_access_item = Item.query.\
-        filter_by(id=quick_access_item_id.value).first()
+    # Get inventory, favorite items and quick access item
+    inventory, favorites, quick_access_item = get_products()
 
     return render_template('user.html.j2', title=username + ' profile',
                            age=age, user=user,
                            inventory=inventory,
-                           favorite_inventory=favorite_inventory,
+                           favorite_inventory=favorites,
                            quick_access_item=quick_access_item,
                            transactions=transactions)
 
@@ -358,6 +468,7 @@ def edit_profile(username):
 
         if (form.password.data != ''):
             user.set_password(form.password.data)
+        identities.invalidate(user.id)
         db.session.commit()
         flash('Your changes have been saved.', 'primary')
         return redirect(url_for('main.user', username=user.username))
@@ -411,14 +522,17 @@ def delete_user():
     username = request.args.get('username', None, type=str)
 
     user = User.query.filter_by(username=username).first_or_404()
+    identities.invalidate(user.id)
     db.session.delete(user)
     db.session.commit()
+    clear_totals()
     flash('The user ' + username + ' has been deleted.', 'primary')
     return redirect(url_for('main.dashboard'))
 
 
 @bp.route('/transactions')
 @login_required
+@read_only
 def transactions():
     """Render the transactions page."""
     if not (current_user.is_admin or current_user.is_bartender):
@@ -426,19 +540,71 @@ def transactions():
         return redirect(url_for('main.dashboard'))
 
     # Get arguments
-    page = request.args.get('page', 1, type=int)
     sort = request.args.get('sort', 'desc', type=str)
-
-    # Sort transactions alphabetically
-    if sort == 'asc':
-        transactions = Transaction.query.order_by(Transaction.id.asc()).\
-            paginate(page, current_app.config['ITEMS_PER_PAGE'], True)
-    else:
-        transactions = Transaction.query.order_by(Transaction.id.desc()).\
-            paginate(page, current_app.config['ITEMS_PER_PAGE'], True)
+    after = request.args.get('after', None, type=int)
+    before = request.args.get('before', None, type=int)
+
+    # Only admins can read the archived transactions
+    archive = current_user.is_admin and \
+        request.args.get('archive', 0, type=int) == 1
+    model = ArchivedTransaction if archive else Transaction
+
+    # Filter transactions, invalid fields being ignored
+    form = TransactionFilterForm()
+    form.validate()
+    filters = form.args()
+    if archive:
+        filters['archive'] = 1
+    query = filter_transactions(model.query, model, **form.filters())
+
+    # Sort transactions by id, loading their clients in the same query
+    transactions = KeysetPagination(
+        query.options(joinedload(model.client)), model.id,
+        current_app.config['ITEMS_PER_PAGE'], after=after, before=before,
+        descending=sort != 'asc',
+        total=cached_count(tuple(sorted(filters.items())), query))
 
     return render_template('transactions.html.j2', title='Transactions',
-                           transactions=transactions, sort=sort)
+                           transactions=transactions, sort=sort,
+                           archive=archive, form=form, filters=filters)
+
+
+@bp.route('/export_transactions')
+@login_required
+@read_only
+def export_transactions():
+    """Stream the transaction log as CSV or NDJSON."""
+    if not current_user.is_admin:
+        flash("You don't have the rights to access this page.", 'danger')
+        return redirect(url_for('main.dashboard'))
+
+    # Get arguments
+    output_format = request.args.get('format', 'csv', type=str)
+    reverted = {'yes': True, 'no': False}.\
+        get(request.args.get('reverted', None, type=str))
+    try:
+        query = export_query(
+            start=parse_day(request.args.get('start', None, type=str)),
+            end=parse_day(request.args.get('end', None, type=str)),
+            barman=request.args.get('barman', None, type=str),
+            client=request.args.get('client', None, type=str),
+            item=request.args.get('item', None, type=str),
+            kind=request.args.get('kind', None, type=str),
+            reverted=reverted,
+            archived=request.args.get('archive', 0, type=int) == 1)
+        chunks = stream_export(query, output_format)
+    except ValueError as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('main.transactions'))
+
+    if output_format == 'ndjson':
+        mimetype = 'application/x-ndjson'
+    else:
+        mimetype = 'text/csv'
+    response = Response(stream_with_context(chunks), mimetype=mimetype)
+    response.headers['Content-Disposition'] = \
+        'attachment; filename=transactions.{}'.format(output_format)
+    return response
 
 
 @bp.route('/revert_transaction')
@@ -469,13 +635,21 @@ def revert_transaction():
         if transaction.item and transaction.item.is_alcohol:
             transaction.client.last_drink = None
 
-    # Revert item quantity
+    # Revert item sales and quantity
+    if transaction.item_id is not None:
+        record_sale(transaction.item_id, transaction.date, -1)
     if transaction.item and transaction.item.is_quantifiable:
-        transaction.item.quantity += 1
+        move_stock(transaction.item, 1, 'revert', current_user.username,
+                   transaction)
 
     # Transaction is now reverted: it won't ever be 'unreverted'
     transaction.is_reverted = True
 
+    # The report of its night and the totals of its periods, if already
+    # stored, are out of date
+    discard_night_report(bar_day(transaction.date))
+    discard_totals(transaction.date.date())
+
     transaction = Transaction(client_id=None,
                               barman=current_user.username,
                               date=datetime.datetime.utcnow(),
@@ -502,23 +676,61 @@ def inventory():
     page = request.args.get('page', 1, type=int)
     sort = request.args.get('sort', 'asc', type=str)
 
-    # Get quick access item
-    quick_access_item_id = GlobalSetting.query.\
-        filter_by(key='QUICK_ACCESS_ITEM_ID').first()
-    quick_access_item = Item.query.\
-        filter_by(id=quick_access_item_id.value).first()
+    # Get items and quick access item
+    items = catalog.get()
 
     # Sort items alphabetically
     if sort == 'asc':
-        inventory = Item.query.order_by(Item.name.asc()).\
-            paginate(page, current_app.config['ITEMS_PER_PAGE'], True)
+        sorted_items = items.items
     else:
-        inventory = Item.query.order_by(Item.name.desc()).\
-            paginate(page, current_app.config['ITEMS_PER_PAGE'], True)
+        sorted_items = items.items[::-1]
+
+    # Paginate items
+    per_page = current_app.config['ITEMS_PER_PAGE']
+    page_items = sorted_items[(page - 1) * per_page:page * per_page]
+    if page < 1 or (not page_items and page != 1):
+        abort(404)
+    inventory = Pagination(None, page, per_page, len(sorted_items),
+                           page_items)
 
     return render_template('inventory.html.j2', title='Inventory',
                            inventory=inventory, sort=sort,
-                           quick_access_item=quick_access_item)
+                           quick_access_item=items.quick_access_item)
+
+
+@bp.route('/restock', methods=['GET', 'POST'])
+@login_required
+def restock_items():
+    """Render the bulk restock page."""
+    if not (current_user.is_admin or current_user.is_bartender):
+        flash("You don't have the rights to access this page.", 'danger')
+        return redirect(url_for('main.dashboard'))
+
+    items = Item.query.filter_by(is_quantifiable=True).\
+        order_by(Item.name.asc()).all()
+    form = RestockForm()
+    if form.validate_on_submit():
+        try:
+            low_stock = restock(form.deltas(), current_user.username)
+        except ValueError as e:
+            flash(str(e), 'danger')
+            return redirect(url_for('main.restock_items'))
+        flash('Stock successfully updated.', 'primary')
+        for item in low_stock:
+            flash('Only {} {} left.'.format(item.quantity, item.name),
+                  'warning')
+        return redirect(url_for('main.restock_items'))
+    elif request.method == 'GET':
+        for item in items:
+            form.entries.append_entry({'item_id': item.id})
+
+    # Get the last stock movements
+    movements = StockMovement.query.options(joinedload(StockMovement.item)).\
+        order_by(StockMovement.id.desc()).limit(20).all()
+
+    return render_template('restock.html.j2', title='Restock', form=form,
+                           items={item.id: item for item in items},
+                           movements=movements)
 
 
 @bp.route('/set_quick_access_item')
@@ -541,6 +753,7 @@ def set_quick_access_item():
 
     # Update the quick access item id
     quick_access_item_id.value = item.id
+    catalog.bump()
     db.session.commit()
 
     return redirect(request.referrer)
@@ -559,11 +772,21 @@ def add_item():
         quantity = form.quantity.data
         if quantity is None:
             quantity = 0
-        item = Item(name=form.name.data, quantity=quantity,
-                    price=form.price.data, is_alcohol=form.is_alcohol.data,
+        item = Item(name=form.name.data, quantity=0,
+                    low_stock_threshold=form.low_stock_threshold.data,
+                    price=form.price.data, volume=form.volume.data,
+                    is_alcohol=form.is_alcohol.data,
                     is_quantifiable=form.is_quantifiable.data,
                     is_favorite=form.is_favorite.data)
         db.session.add(item)
+        db.session.flush()
+
+        # Record the initial stock in the stock ledger
+        if item.is_quantifiable and quantity:
+            move_stock(item, quantity, 'restock', current_user.username)
+        else:
+            update_low_stock(item)
+        catalog.bump()
         db.session.commit()
         flash('The item '+item.name+' was successfully added.', 'primary')
         return redirect(url_for('main.inventory'))
@@ -589,12 +812,20 @@ def edit_item(item_name):
         if quantity is None:
             quantity = 0
         item.name = form.name.data
-        if item.is_quantifiable:
-            item.quantity = quantity
         item.price = form.price.data
+        item.volume = form.volume.data
         item.is_alcohol = form.is_alcohol.data
         item.is_quantifiable = form.is_quantifiable.data
         item.is_favorite = form.is_favorite.data
+        item.low_stock_threshold = form.low_stock_threshold.data
+
+        # Quantity changes are recorded in the stock ledger
+        if item.is_quantifiable and quantity != (item.quantity or 0):
+            move_stock(item, quantity - (item.quantity or 0), 'adjustment',
+                       current_user.username)
+        else:
+            update_low_stock(item)
+        catalog.bump()
         db.session.commit()
         flash('Your changes have been saved.', 'primary')
         return redirect(url_for('main.inventory'))
@@ -602,7 +833,9 @@ def edit_item(item_name):
         form.name.data = item.name
         if item.is_quantifiable:
             form.quantity.data = item.quantity
+        form.low_stock_threshold.data = item.low_stock_threshold
         form.price.data = item.price
+        form.volume.data = item.volume
         form.is_alcohol.data = item.is_alcohol
         form.is_quantifiable.data = item.is_quantifiable
         form.is_favorite.data = item.is_favorite
@@ -622,6 +855,7 @@ def delete_item():
 
     item = Item.query.filter_by(name=item_name).first_or_404()
     db.session.delete(item)
+    catalog.bump()
     db.session.commit()
     flash('The item ' + item_name + ' has been deleted.', 'primary')
     return redirect(request.referrer)
@@ -669,10 +903,10 @@ def pay():
         return redirect(url_for('main.dashboard'))
 
     username = request.args.get('username', 'none', type=str)
-    item_name = request.args.get('item_name', 'none', type=str)
+    item_id = request.args.get('item_id', -1, type=int)
 
     user = User.query.filter_by(username=username).first_or_404()
-    item = Item.query.filter_by(name=item_name).first_or_404()
+    item = Item.query.get_or_404(item_id)
 
     if not user.deposit:
         flash(user.username+" hasn't given a deposit.", 'warning')
@@ -688,8 +922,6 @@ def pay():
         return redirect(request.referrer)
 
     user.balance -= item.price
-    if item.is_quantifiable:
-        item.quantity -= 1
     if item.is_alcohol:
         user.last_drink = datetime.datetime.utcnow()
 
@@ -699,8 +931,14 @@ def pay():
                               type='Pay ' + item.name,
                               balance_change=-item.price)
     db.session.add(transaction)
+    record_sale(item.id, transaction.date)
+    low_stock = item.is_quantifiable and \
+        move_stock(item, -1, 'sale', current_user.username, transaction)
     db.session.commit()
 
+    if low_stock:
+        flash('Only {} {} left.'.format(item.quantity, item.name), 'warning')
+
     flash(user.first_name + ' ' + user.last_name + ' successfully bought ' +
           item.name +
           ' (Balance: {:.2f}'.format(user.balance)+'€). ' +
@@ -737,6 +975,34 @@ def get_user_from_qr():
     return redirect(url_for('main.user', username=user.username))
 
 
+@bp.route('/get_scanned_user')
+@login_required
+def get_scanned_user():
+    """Return the summary of the user corresponding to the QR code."""
+    if not (current_user.is_admin or current_user.is_bartender):
+        flash("You don't have the rights to access this page.", 'danger')
+        return redirect(url_for('main.dashboard'))
+
+    # Get arguments
+    qrcode_hash = request.args.get('qrcode_hash', 'None', type=str)
+
+    # Retrieve corresponding user
+    user = User.query.filter_by(qrcode_hash=qrcode_hash).first()
+    if user is None:
+        return jsonify({'error': 'Unknown QR code.'}), 404
+
+    return jsonify({'id': user.id,
+                    'username': user.username,
+                    'first_name': user.first_name,
+                    'last_name': user.last_name,
+                    'nickname': user.nickname,
+                    'balance': user.balance,
+                    'deposit': bool(user.deposit),
+                    'avatar': user.avatar('card'),
+                    'url': url_for('main.user', username=user.username),
+                    'eligibility': user.eligibility()})
+
+
 @bp.route('/qrcode/<username>')
 @login_required
 def qrcode(username):
@@ -755,6 +1021,60 @@ def qrcode(username):
     return render_template('qrcode.html.j2', title='QR code', user=user)
 
 
+@bp.route('/qr/<username>.png')
+@login_required
+def qr(username):
+    """Return the user QR code image.
+
+    The image is rendered from the QR code hash and cached in memory. Its url
+    carries a version derived from the hash, so it can be cached forever.
+
+    Keyword arguments:
+    username -- the user's username
+    """
+    if not (current_user.username == username or current_user.is_admin or
+            current_user.is_bartender):
+        abort(403)
+
+    user = User.query.filter_by(username=username).first_or_404()
+
+    response = make_response(render_qrcode(user.qrcode_hash))
+    response.mimetype = 'image/png'
+    response.set_etag(qrcode_version(user.qrcode_hash))
+    response.headers['Cache-Control'] = \
+        'private, max-age=31536000, immutable'
+    return response.make_conditional(request)
+
+
+@bp.route('/qrcodes/<int:grad_class>')
+@login_required
+def qrcodes(grad_class):
+    """Download the QR code badges of a grad class.
+
+    Keyword arguments:
+    grad_class -- the grad class
+    """
+    if not current_user.is_admin:
+        flash("You don't have the rights to access this page.", 'danger')
+        return redirect(url_for('main.dashboard'))
+
+    output_format = request.args.get('format', 'zip', type=str)
+
+    badges = grad_class_badges(grad_class)
+    if output_format == 'pdf':
+        chunks = stream_badges_pdf(badges)
+        mimetype = 'application/pdf'
+    else:
+        output_format = 'zip'
+        chunks = stream_badges_zip(badges)
+        mimetype = 'application/zip'
+
+    response = Response(chunks, mimetype=mimetype)
+    response.headers['Content-Disposition'] = \
+        'attachment; filename=qrcodes_{}.{}'.format(grad_class, output_format)
+    return response
+
+
 @bp.route('/global_settings', methods=['GET', 'POST'])
 @login_required
 def global_settings():
@@ -768,6 +1088,7 @@ def global_settings():
         settings = GlobalSetting.query.all()
         for index, s in enumerate(settings):
             s.value = form.value.data[index]
+        catalog.bump()
         db.session.commit()
         flash('Global settings successfully updated.', 'primary')
         return redirect(url_for('main.global_settings'))
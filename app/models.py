@@ -1,14 +1,23 @@
 # -*- coding: utf-8 -*-
 """Flask app models."""
-import os.path
 import datetime
 from flask import url_for
 from flask_login import UserMixin
 from sqlalchemy.sql.expression import and_
 from werkzeug.security import generate_password_hash, check_password_hash
-import hashlib
-import qrcode
-from app import db, login, whooshee
+from app import db, login, whooshee, avatars, identities
+from app.qrcodes import new_qrcode_hash, qrcode_version
+
+
+def get_current_day_start():
+    """Return the start of the current bar day, at 6 am."""
+    today = datetime.datetime.today()
+    yesterday = today - datetime.timedelta(days=1)
+    if today.hour < 6:
+        return datetime.datetime(year=yesterday.year, month=yesterday.month,
+                                 day=yesterday.day, hour=6)
+    return datetime.datetime(year=today.year, month=today.month,
+                             day=today.day, hour=6)
 
 
 @whooshee.register_model('username', 'first_name', 'last_name', 'nickname')
@@ -22,7 +31,8 @@ class User(UserMixin, db.Model):
                          nullable=False)
     email = db.Column(db.String(120), index=True, unique=True, nullable=False)
     password_hash = db.Column(db.String(128), nullable=False)
-    qrcode_hash = db.Column(db.String(128), nullable=False)
+    qrcode_hash = db.Column(db.String(128), index=True, unique=True,
+                            nullable=False)
 
     # Account type
     is_observer = db.Column(db.Boolean, default=False, nullable=False)
@@ -55,53 +65,55 @@ class User(UserMixin, db.Model):
 
     def set_qrcode(self):
         """Set user QR code hash."""
-        self.qrcode_hash = \
-            generate_password_hash(str(datetime.datetime.utcnow()))
-
-        # Create QR code object
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_H,
-            box_size=10,
-            border=0,
-        )
-        qr.add_data(self.qrcode_hash)
-        qr.make(fit=True)
-
-        # md5 encode qrcode_hash to get jpg filename
-        qrcode_name = hashlib.md5()
-        qrcode_name.update(self.qrcode_hash.encode('utf-8'))
-
-        # Create QR code image and save it to static folder
-        img = qr.make_image()
-        img = img.resize((160, 160))
-        img.save('app/static/img/qr/'+qrcode_name.hexdigest()+'.jpg')
+        self.qrcode_hash = new_qrcode_hash()
 
     def check_password(self, password):
         """Check password against stored hash."""
         return check_password_hash(self.password_hash, password)
 
-    def avatar(self):
-        """Return url for avatar file."""
-        avatar_path = 'img/avatar/'+str(self.grad_class)+'/'+self.username
-        if os.path.isfile(os.path.join('app', 'static', avatar_path+'.jpg')):
-            avatar_filename = url_for('static', filename=avatar_path+'.jpg')
-            return avatar_filename
-        else:
-            return url_for('static',
-                           filename='img/avatar/avatar_placeholder.png')
+    def avatar(self, size='profile'):
+        """Return url for avatar file.
+
+        Keyword arguments:
+        size -- 'card', 'profile' or None for the original image
+        """
+        return avatars.url(self.grad_class, self.username, size)
 
     def qr(self):
-        """Return url for qr code file."""
-        # md5 encode qrcode_hash to get jpg filename
-        qrcode_name = hashlib.md5()
-        qrcode_name.update(self.qrcode_hash.encode('utf-8'))
-        qr_path = os.path.join('img', 'qr',
-                               qrcode_name.hexdigest()+'.jpg')
-        if os.path.isfile(os.path.join('app', 'static', qr_path)):
-            qr_filename = url_for('static', filename=qr_path)
-            return qr_filename
-        return None
+        """Return url for qr code image."""
+        return url_for('main.qr', username=self.username,
+                       v=qrcode_version(self.qrcode_hash))
+
+    def get_age(self):
+        """Return the user's age."""
+        today = datetime.date.today()
+        return today.year - self.birthdate.year - \
+            ((today.month, today.day) <
+                (self.birthdate.month, self.birthdate.day))
+
+    def get_nb_alcoholic_drinks(self):
+        """Return the number of alcoholic drinks bought since 6 am."""
+        return self.transactions.\
+            filter_by(is_reverted=False).\
+            filter(and_(Transaction.item.has(is_alcohol=True),
+                        Transaction.date > get_current_day_start())).count()
+
+    def eligibility(self):
+        """Return a summary of the user's right to buy drinks."""
+        minimum_legal_age = GlobalSetting.get('MINIMUM_LEGAL_AGE')
+        max_alcoholic_drinks_per_day = \
+            GlobalSetting.get('MAX_DAILY_ALCOHOLIC_DRINKS_PER_USER')
+        age = self.get_age()
+        nb_alcoholic_drinks = self.get_nb_alcoholic_drinks()
+
+        return {'deposit': bool(self.deposit),
+                'age': age,
+                'is_of_age': age >= minimum_legal_age,
+                'nb_alcoholic_drinks': nb_alcoholic_drinks,
+                'max_alcoholic_drinks': max_alcoholic_drinks_per_day,
+                'can_drink_alcohol': bool(self.deposit) and
+                age >= minimum_legal_age and
+                nb_alcoholic_drinks < max_alcoholic_drinks_per_day}
 
     def can_buy(self, item):
         """Return the user's right to buy the item."""
@@ -113,37 +125,14 @@ class User(UserMixin, db.Model):
         if (item.is_quantifiable and item.quantity <= 0):
             return 'No {} left.'.format(item.name)
 
-        # Get current day start
-        today = datetime.datetime.today()
-        yesterday = today - datetime.timedelta(days=1)
-        if today.hour < 6:
-            current_day_start = datetime.\
-                datetime(year=yesterday.year, month=yesterday.month,
-                         day=yesterday.day, hour=6)
-        else:
-            current_day_start = datetime.\
-                datetime(year=today.year, month=today.month,
-                         day=today.day, hour=6)
-
         # Get global app settings
-        minimum_legal_age = \
-            int(GlobalSetting.query.
-                filter_by(key='MINIMUM_LEGAL_AGE').first().value)
+        minimum_legal_age = GlobalSetting.get('MINIMUM_LEGAL_AGE')
         max_alcoholic_drinks_per_day = \
-            int(GlobalSetting.query.
-                filter_by(key='MAX_DAILY_ALCOHOLIC_DRINKS_PER_USER').
-                first().value)
-
-        # Get user age
-        age = today.year - self.birthdate.year - \
-            ((today.month, today.day) <
-                (self.birthdate.month, self.birthdate.day))
+            GlobalSetting.get('MAX_DAILY_ALCOHOLIC_DRINKS_PER_USER')
 
-        # Get user daily alcoholic drinks
-        nb_alcoholic_drinks = self.transactions.\
-            filter_by(is_reverted=False).\
-            filter(and_(Transaction.item.has(is_alcohol=True),
-                        Transaction.date > current_day_start)).count()
+        # Get user age and daily alcoholic drinks
+        age = self.get_age()
+        nb_alcoholic_drinks = self.get_nb_alcoholic_drinks()
         if item.is_alcohol and age < minimum_legal_age:
             return "{} {} isn't old enough, the minimum legal age being {}.".\
                 format(self.first_name, self.last_name,
@@ -162,8 +151,18 @@ class User(UserMixin, db.Model):
 
 @login.user_loader
 def load_user(id):
-    """Return user from id."""
-    return User.query.get(int(id))
+    """Return user identity from id.
+
+    The identity is cached for IDENTITY_CACHE_TTL seconds, so most requests
+    don't query the user table.
+    """
+    identity = identities.get(int(id))
+    if identity is None:
+        user = User.query.get(int(id))
+        if user is None:
+            return None
+        identity = identities.set(user)
+    return identity
 
 
 class Item(db.Model):
@@ -177,19 +176,84 @@ class Item(db.Model):
 
     price = db.Column(db.Float, nullable=False)
 
+    # Serving volume in liters, counted in the alcohol consumption
+    volume = db.Column(db.Float, default=None)
+
     is_quantifiable = db.Column(db.Boolean)
     quantity = db.Column(db.Integer, default=0)
 
+    # True when the quantity is at or below the threshold, updated with each
+    # stock movement
+    low_stock_threshold = db.Column(db.Integer, default=None)
+    is_low_stock = db.Column(db.Boolean, index=True, default=False,
+                             nullable=False)
+
     is_favorite = db.Column(db.Boolean, default=False)
 
     transactions = db.relationship('Transaction', backref='item',
                                    lazy='dynamic')
+    stock_movements = db.relationship('StockMovement', backref='item',
+                                      lazy='dynamic',
+                                      cascade='all, delete-orphan')
+    sales = db.relationship('ItemSales', backref='item', lazy='dynamic',
+                            cascade='all, delete-orphan')
 
     def __repr__(self):
         """Print item's name when printing an item object."""
         return '<Item {}>'.format(self.name)
 
 
+class ItemSales(db.Model):
+    """Number of sales of an item during a bar day.
+
+    Incremented with each sale and decremented when a sale is reverted.
+    """
+
+    id = db.Column(db.Integer, primary_key=True)
+    item_id = db.Column(db.Integer, db.ForeignKey('item.id'), nullable=False)
+    day = db.Column(db.Date, index=True, nullable=False)
+    nb_sales = db.Column(db.Integer, default=0, nullable=False)
+
+    __table_args__ = (db.UniqueConstraint('item_id', 'day'),)
+
+    def __repr__(self):
+        """Print sales' day when printing an item sales object."""
+        return '<ItemSales {}>'.format(self.day)
+
+
+class StockMovement(db.Model):
+    """Change of the quantity of a quantifiable item."""
+
+    id = db.Column(db.Integer, primary_key=True)
+
+    item_id = db.Column(db.Integer,
+                        db.ForeignKey('item.id', ondelete='CASCADE'),
+                        index=True, nullable=False)
+    date = db.Column(db.DateTime, index=True, default=datetime.datetime.utcnow,
+                     nullable=False)
+
+    # The barman who made the movement
+    barman = db.Column(db.String(64), nullable=False)
+
+    # kind can be 'restock', 'sale', 'revert' or 'adjustment'
+    kind = db.Column(db.String(16), nullable=False)
+    delta = db.Column(db.Integer, nullable=False)
+
+    # Quantity of the item after the movement
+    quantity = db.Column(db.Integer, nullable=False)
+
+    # Not NULL if kind is 'sale' or 'revert', until the transaction is
+    # archived
+    transaction_id = db.Column(db.Integer,
+                               db.ForeignKey('transaction.id',
+                                             ondelete='SET NULL'))
+    transaction = db.relationship('Transaction')
+
+    def __repr__(self):
+        """Print movement's delta when printing a movement object."""
+        return '<StockMovement {:+d}>'.format(self.delta)
+
+
 class Transaction(db.Model):
     """Transaction model."""
 
@@ -203,7 +267,7 @@ class Transaction(db.Model):
                      nullable=False)
 
     # The barman who made the transaction
-    barman = db.Column(db.String(64), index=True, nullable=False)
+    barman = db.Column(db.String(64), nullable=False)
 
     # Not NULL if type is 'Pay <Item>' or 'Top up'
     client_id = db.Column(db.Integer, db.ForeignKey('user.id'))
@@ -215,11 +279,132 @@ class Transaction(db.Model):
     type = db.Column(db.String(64), index=True, nullable=False)
     balance_change = db.Column(db.Float)
 
+    # Filtered transaction pages are ordered by id, so filters are indexed
+    # along with it
+    __table_args__ = (
+        db.Index('ix_transaction_barman_id', 'barman', 'id'),
+        db.Index('ix_transaction_client_id_id', 'client_id', 'id'),
+        db.Index('ix_transaction_item_id_id', 'item_id', 'id'),
+    )
+
     def __repr__(self):
         """Print transaction's date when printing a transaction object."""
         return '<Transaction {}>'.format(self.date)
 
 
+class ArchivedTransaction(db.Model):
+    """Transaction moved out of the transaction table by the archive command.
+
+    Rows keep the id they had in the transaction table.
+    """
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    is_reverted = db.Column(db.Boolean, default=False)
+    date = db.Column(db.DateTime, index=True, nullable=False)
+    barman = db.Column(db.String(64), nullable=False)
+    client_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
+    item_id = db.Column(db.Integer, db.ForeignKey('item.id'))
+    type = db.Column(db.String(64), nullable=False)
+    balance_change = db.Column(db.Float)
+
+    client = db.relationship('User')
+    item = db.relationship('Item')
+
+    def __repr__(self):
+        """Print transaction's date when printing a transaction object."""
+        return '<ArchivedTransaction {}>'.format(self.date)
+
+
+class TransactionSummary(db.Model):
+    """Monthly totals of the archived transactions of a client.
+
+    Reverted transactions are left out of the totals. Transactions without
+    a client (reverts) are summarized with a NULL client_id.
+    """
+
+    id = db.Column(db.Integer, primary_key=True)
+    client_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
+    year = db.Column(db.Integer, nullable=False)
+    month = db.Column(db.Integer, nullable=False)
+
+    nb_transactions = db.Column(db.Integer, default=0, nullable=False)
+    topped_up = db.Column(db.Float, default=0.0, nullable=False)
+    paid = db.Column(db.Float, default=0.0, nullable=False)
+
+    __table_args__ = (db.UniqueConstraint('client_id', 'year', 'month'),)
+
+    def __repr__(self):
+        """Print summary's month when printing a summary object."""
+        return '<TransactionSummary {}/{}>'.format(self.month, self.year)
+
+
+class NightReport(db.Model):
+    """Totals of a closed night, stored once and never updated.
+
+    Headline totals have their own columns, the per-barman, per-item and
+    per-hour totals are kept in details along with them.
+    """
+
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, index=True, unique=True, nullable=False)
+    created = db.Column(db.DateTime, default=datetime.datetime.utcnow,
+                        nullable=False)
+
+    revenue = db.Column(db.Float, nullable=False)
+    topped_up = db.Column(db.Float, nullable=False)
+    nb_reverts = db.Column(db.Integer, nullable=False)
+    alcohol_qty = db.Column(db.Float, nullable=False)
+    nb_clients = db.Column(db.Integer, nullable=False)
+    details = db.Column(db.JSON, nullable=False)
+
+    def __repr__(self):
+        """Print report's day when printing a night report object."""
+        return '<NightReport {}>'.format(self.day)
+
+
+class UserImport(db.Model):
+    """Bulk user import run in the background.
+
+    The credentials CSV is kept out of the database, in a file deleted once
+    the admin who started the import downloads it, or when it expires.
+    """
+
+    id = db.Column(db.Integer, primary_key=True)
+    created = db.Column(db.DateTime, default=datetime.datetime.utcnow,
+                        nullable=False)
+    admin = db.Column(db.String(64), nullable=False)
+    status = db.Column(db.String(16), default='running', nullable=False)
+    nb_imported = db.Column(db.Integer, default=0, nullable=False)
+    nb_skipped = db.Column(db.Integer, default=0, nullable=False)
+    error = db.Column(db.Text)
+
+    def __repr__(self):
+        """Print import's id when printing a user import object."""
+        return '<UserImport {}>'.format(self.id)
+
+
+class CatalogVersion(db.Model):
+    """Version of the item catalog, bumped with each catalog change."""
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, default=0, nullable=False)
+
+    def __repr__(self):
+        """Print version when printing a catalog version object."""
+        return '<CatalogVersion {}>'.format(self.version)
+
+
+class IdentityVersion(db.Model):
+    """Version of the user identities, bumped with each role change."""
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, default=0, nullable=False)
+
+    def __repr__(self):
+        """Print version when printing an identity version object."""
+        return '<IdentityVersion {}>'.format(self.version)
+
+
 class GlobalSetting(db.Model):
     """App global settings model."""
 
@@ -232,3 +417,12 @@ class GlobalSetting(db.Model):
     def __repr__(self):
         """Print setting's key when printing a global setting object."""
         return '<Setting {}>'.format(self.key)
+
+    @staticmethod
+    def get(key):
+        """Return the integer value of a global setting.
+
+        Keyword arguments:
+        key -- the setting's key
+        """
+        return int(GlobalSetting.query.filter_by(key=key).first().value)
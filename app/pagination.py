@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""Keyset pagination."""
+import threading
+import time
+from collections import OrderedDict
+
+# Number of seconds a cached total is kept
+COUNT_CACHE_TTL = 60
+
+# Number of cached totals, the least recently used being evicted first
+COUNT_CACHE_SIZE = 256
+
+_counts = OrderedDict()
+_counts_lock = threading.Lock()
+
+
+def cached_count(key, query, ttl=COUNT_CACHE_TTL, maxsize=COUNT_CACHE_SIZE):
+    """Return the number of rows of a query, cached for ttl seconds.
+
+    Keys come from request arguments, so at most maxsize totals are kept.
+
+    Keyword arguments:
+    key -- a hashable identifying the query
+    query -- the query to count
+    ttl -- the number of seconds the count is kept
+    maxsize -- the number of cached totals
+    """
+    now = time.monotonic()
+    with _counts_lock:
+        cached = _counts.get(key)
+        if cached is not None and cached[0] > now:
+            _counts.move_to_end(key)
+            return cached[1]
+    count = query.order_by(None).count()
+    with _counts_lock:
+        _counts[key] = (now + ttl, count)
+        _counts.move_to_end(key)
+        while len(_counts) > maxsize:
+            _counts.popitem(last=False)
+    return count
+
+
+def clear_counts():
+    """Clear the cached totals."""
+    with _counts_lock:
+        _counts.clear()
+
+
+class KeysetPagination(object):
+    """Page of a query ordered by a unique column.
+
+    Instead of an OFFSET, pages are delimited by the value of the column for
+    the last (or first) row of the previous (or next) page, so every page
+    costs one indexed range scan however deep it is.
+    """
+
+    def __init__(self, query, column, per_page, after=None, before=None,
+                 descending=True, total=None):
+        """Fetch a page.
+
+        Keyword arguments:
+        query -- the query to paginate
+        column -- the unique column the rows are ordered by
+        per_page -- the number of rows per page
+        after -- the column value after which the page starts
+        before -- the column value before which the page ends
+        descending -- whether the rows are in descending order
+        total -- the (possibly estimated) total number of rows
+        """
+        self.per_page = per_page
+        self.total = total
+        self.descending = descending
+
+        forward = column.desc() if descending else column.asc()
+        backward = column.asc() if descending else column.desc()
+
+        if before is not None:
+            # Fetch the previous page backwards and restore its order
+            condition = column > before if descending else column < before
+            rows = query.filter(condition).order_by(backward).\
+                limit(per_page + 1).all()
+            self.has_prev = len(rows) > per_page
+            self.items = list(reversed(rows[:per_page]))
+            self.has_next = True
+        else:
+            if after is not None:
+                condition = column < after if descending else column > after
+                query = query.filter(condition)
+            rows = query.order_by(forward).limit(per_page + 1).all()
+            self.has_next = len(rows) > per_page
+            self.items = rows[:per_page]
+            self.has_prev = after is not None
+
+        key = column.key
+        self.next_cursor = getattr(self.items[-1], key) \
+            if self.has_next and self.items else None
+        self.prev_cursor = getattr(self.items[0], key) \
+            if self.has_prev and self.items else None
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""Process pool helpers."""
+import os
+
+
+def chunks(iterable, size):
+    """Yield successive lists of at most size elements."""
+    chunk = []
+    for element in iterable:
+        chunk.append(element)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def pool_map(function, iterable, processes=None):
+    """Map a function over an iterable in a process pool.
+
+    Results are yielded in order, and only a few batches of work are in flight
+    at any time so that memory stays flat for long iterables.
+
+    Keyword arguments:
+    function -- a picklable function of one argument
+    iterable -- the arguments
+    processes -- the number of worker processes, defaults to the CPU count
+    """
+    from multiprocessing import Pool
+    processes = processes or os.cpu_count() or 1
+    with Pool(processes) as pool:
+        for batch in chunks(iterable, 4 * processes):
+            for result in pool.map(function, batch):
+                yield result
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""Popularity of the items over rolling sales windows."""
+import datetime
+import threading
+import time
+from sqlalchemy import Date, case, cast, func
+
+# A bar day starts at 6 am
+BAR_DAY_START_HOUR = 6
+
+# Rolling windows, from the narrowest to the widest
+WINDOWS = ('tonight', 'week', 'term')
+
+
+def bar_day(date):
+    """Return the bar day of a datetime."""
+    return (date - datetime.timedelta(hours=BAR_DAY_START_HOUR)).date()
+
+
+def window_starts(today=None):
+    """Return the first bar day of each window.
+
+    Keyword arguments:
+    today -- the current bar day
+    """
+    from app.archive import academic_year_start
+    today = today or bar_day(datetime.datetime.utcnow())
+    return {'tonight': today,
+            'week': today - datetime.timedelta(days=6),
+            'term': min(academic_year_start(today).date(),
+                        today - datetime.timedelta(days=6))}
+
+
+def record_sale(item_id, date, delta=1):
+    """Add delta to the sales counter of an item, the caller commits.
+
+    Counters are upserted so that concurrent first sales of a bar day
+    don't both insert a row. Reverts only decrement an existing counter.
+
+    Keyword arguments:
+    item_id -- the id of the sold item
+    date -- the date of the sale transaction
+    delta -- 1 for a sale, -1 for a reverted sale
+    """
+    from app import db
+    from app.models import ItemSales
+    table = ItemSales.__table__
+    day = bar_day(date)
+    nb_sales = table.c.nb_sales + delta
+    if delta > 0 and db.engine.dialect.name == 'mysql':
+        from sqlalchemy.dialects.mysql import insert
+        db.session.execute(insert(table).
+                           values(item_id=item_id, day=day, nb_sales=delta).
+                           on_duplicate_key_update(nb_sales=nb_sales))
+        return
+    if delta > 0:
+        db.session.execute(table.insert().prefix_with('OR IGNORE').
+                           values(item_id=item_id, day=day, nb_sales=0))
+    db.session.execute(table.update().
+                       where(table.c.item_id == item_id).
+                       where(table.c.day == day).
+                       values(nb_sales=nb_sales))
+
+
+def rebuild_sales(since):
+    """Recompute the sales counters from the transactions.
+
+    The counters are computed with a single grouped query over the
+    transactions since the given day, and replace the existing ones.
+
+    Keyword arguments:
+    since -- the first bar day to rebuild
+
+    Return the number of counters written.
+    """
+    from app import db
+    from app.models import ItemSales, Transaction
+    if db.engine.dialect.name == 'sqlite':
+        day = func.date(Transaction.date,
+                        '-{} hours'.format(BAR_DAY_START_HOUR))
+    else:
+        day = cast(Transaction.date -
+                   datetime.timedelta(hours=BAR_DAY_START_HOUR), Date)
+    start = datetime.datetime.combine(since, datetime.time()) + \
+        datetime.timedelta(hours=BAR_DAY_START_HOUR)
+    rows = db.session.query(Transaction.item_id, day,
+                            func.count(Transaction.id)).\
+        filter(Transaction.item_id.isnot(None)).\
+        filter(Transaction.is_reverted.isnot(True)).\
+        filter(Transaction.date >= start).\
+        group_by(Transaction.item_id, day).all()
+
+    db.session.query(ItemSales).filter(ItemSales.day >= since).\
+        delete(synchronize_session=False)
+    for item_id, day, nb_sales in rows:
+        if isinstance(day, str):
+            day = datetime.datetime.strptime(day, '%Y-%m-%d').date()
+        db.session.add(ItemSales(item_id=item_id, day=day,
+                                 nb_sales=nb_sales))
+    db.session.commit()
+    return len(rows)
+
+
+class PopularityCache(object):
+    """Process-local sales counts of the items over the rolling windows.
+
+    The counts of all windows are read from the daily sales counters with
+    one grouped query, at most every POPULARITY_TTL seconds. Rankings are
+    kept until the counts or the catalog change.
+    """
+
+    def __init__(self, app=None):
+        """Create an empty cache."""
+        self._counts = None
+        self._loaded = None
+        self._rankings = {}
+        self._lock = threading.Lock()
+        self.ttl = 60
+        self.order = 'name'
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Read the cache configuration of an application."""
+        self.ttl = app.config.get('POPULARITY_TTL', 60)
+        self.order = app.config.get('PRODUCTS_ORDER', 'name')
+        if self.order not in WINDOWS + ('name',):
+            raise ValueError('Unknown products order {}.'.format(self.order))
+        self.clear()
+
+    def _load(self):
+        """Return the sales counts of each item in each window."""
+        from app import db
+        from app.models import ItemSales
+        starts = window_starts()
+        rows = db.session.query(
+            ItemSales.item_id,
+            *[func.sum(case([(ItemSales.day >= starts[window],
+                              ItemSales.nb_sales)], else_=0))
+              for window in WINDOWS]).\
+            filter(ItemSales.day >= starts['term']).\
+            group_by(ItemSales.item_id).all()
+        return {row[0]: dict(zip(WINDOWS, row[1:])) for row in rows}
+
+    def counts(self):
+        """Return the sales counts of each window by item id."""
+        now = time.monotonic()
+        counts = self._counts
+        if counts is not None and now - self._loaded < self.ttl:
+            return counts
+
+        counts = self._load()
+        with self._lock:
+            self._counts = counts
+            self._loaded = now
+            self._rankings = {}
+        return counts
+
+    def count(self, item_id, window='tonight'):
+        """Return the sales count of an item in a window."""
+        return self.counts().get(item_id, {}).get(window, 0)
+
+    def rank(self, items, window=None, key=None):
+        """Return items sorted by decreasing popularity.
+
+        Ties are broken with the wider windows, then by name.
+
+        Keyword arguments:
+        items -- the items to sort
+        window -- 'tonight', 'week', 'term' or 'name' (default: the
+                  PRODUCTS_ORDER setting, 'name' if unset)
+        key -- a hashable key identifying the items, to reuse the ranking
+        """
+        window = window or self.order
+        if window == 'name':
+            return items
+        counts = self.counts()
+        if key is not None and (key, window) in self._rankings:
+            return self._rankings[(key, window)]
+
+        windows = WINDOWS[WINDOWS.index(window):]
+        ranking = sorted(items, key=lambda item: (
+            [-counts.get(item.id, {}).get(w, 0) for w in windows],
+            item.name))
+        if key is not None:
+            with self._lock:
+                self._rankings[(key, window)] = ranking
+        return ranking
+
+    def clear(self):
+        """Drop the cached counts and rankings."""
+        with self._lock:
+            self._counts = None
+            self._loaded = None
+            self._rankings = {}
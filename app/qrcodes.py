@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""QR code rendering."""
+import hashlib
+import io
+import os
+import secrets
+import tempfile
+from functools import lru_cache
+from app.parallel import chunks, pool_map
+
+# Maximum number of rendered QR codes kept in memory
+QRCODE_CACHE_SIZE = 512
+
+# Side of the rendered QR code image, in pixels
+QRCODE_SIZE = 160
+
+# Badge sheet layout: A4 pages at 150 dpi, 3 columns and 4 rows of badges
+SHEET_SIZE = (1240, 1754)
+SHEET_COLUMNS = 3
+SHEET_ROWS = 4
+BADGE_QRCODE_SIZE = 300
+BADGES_PER_PAGE = SHEET_COLUMNS * SHEET_ROWS
+
+
+def new_qrcode_hash():
+    """Return a new random QR code hash."""
+    return secrets.token_urlsafe(32)
+
+
+def qrcode_version(qrcode_hash):
+    """Return a short version tag derived from a QR code hash."""
+    version = hashlib.md5()
+    version.update(qrcode_hash.encode('utf-8'))
+    return version.hexdigest()
+
+
+def make_qrcode_image(qrcode_hash, size=QRCODE_SIZE):
+    """Return the QR code of a hash as a PIL image.
+
+    Keyword arguments:
+    qrcode_hash -- the user's QR code hash
+    size -- the side of the image, in pixels
+    """
+    import qrcode
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_H,
+        box_size=10,
+        border=0,
+    )
+    qr.add_data(qrcode_hash)
+    qr.make(fit=True)
+
+    img = qr.make_image()
+    return img.resize((size, size))
+
+
+@lru_cache(maxsize=QRCODE_CACHE_SIZE)
+def render_qrcode(qrcode_hash):
+    """Return the PNG image of a QR code hash, as bytes.
+
+    Keyword arguments:
+    qrcode_hash -- the user's QR code hash
+    """
+    buffer = io.BytesIO()
+    make_qrcode_image(qrcode_hash).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def _render_badge(badge):
+    """Return the username and the PNG QR code of a badge."""
+    username, qrcode_hash, name = badge
+    return username, render_qrcode(qrcode_hash)
+
+
+def _render_page(badges):
+    """Return a printable page for a list of badges."""
+    from PIL import Image, ImageDraw
+    page = Image.new('L', SHEET_SIZE, 255)
+    draw = ImageDraw.Draw(page)
+    cell_width = SHEET_SIZE[0] // SHEET_COLUMNS
+    cell_height = SHEET_SIZE[1] // SHEET_ROWS
+    for index, (username, qrcode_hash, name) in enumerate(badges):
+        row, column = divmod(index, SHEET_COLUMNS)
+        x = column * cell_width + (cell_width - BADGE_QRCODE_SIZE) // 2
+        y = row * cell_height + (cell_height - BADGE_QRCODE_SIZE) // 3
+        page.paste(make_qrcode_image(qrcode_hash, BADGE_QRCODE_SIZE), (x, y))
+        draw.text((x, y + BADGE_QRCODE_SIZE + 15), name, fill=0)
+        draw.text((x, y + BADGE_QRCODE_SIZE + 30), username, fill=0)
+    return page
+
+
+def grad_class_badges(grad_class):
+    """Return the (username, qrcode_hash, name) badges of a grad class."""
+    from app.models import User
+    users = User.query.filter_by(grad_class=grad_class).\
+        order_by(User.last_name.asc(), User.first_name.asc()).\
+        with_entities(User.username, User.qrcode_hash, User.first_name,
+                      User.last_name).all()
+    return [(u.username, u.qrcode_hash, u.first_name + ' ' + u.last_name)
+            for u in users]
+
+
+def regenerate_qrcodes(grad_class):
+    """Set new QR code hashes for every member of a grad class.
+
+    Return the number of updated users.
+    """
+    from app import db
+    from app.models import User
+    users = User.query.filter_by(grad_class=grad_class).all()
+    for user in users:
+        user.set_qrcode()
+    db.session.commit()
+    return len(users)
+
+
+class _StreamBuffer(object):
+    """Write-only file object whose content is popped by chunks."""
+
+    def __init__(self):
+        """Create an empty buffer."""
+        self.chunks = []
+
+    def write(self, data):
+        """Append data to the buffer."""
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        """Do nothing, data is kept until popped."""
+        pass
+
+    def pop(self):
+        """Return and clear the buffer content."""
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_badges_zip(badges, processes=None):
+    """Yield a ZIP archive of badge QR codes by chunks of bytes.
+
+    Keyword arguments:
+    badges -- an iterable of (username, qrcode_hash, name) tuples
+    processes -- the number of worker processes, defaults to the CPU count
+    """
+    import zipfile
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as archive:
+        for username, png in pool_map(_render_badge, badges, processes):
+            archive.writestr(username + '.png', png)
+            yield buffer.pop()
+    yield buffer.pop()
+
+
+def stream_badges_pdf(badges, processes=None, chunk_size=65536):
+    """Yield a printable multi-page PDF of badges by chunks of bytes.
+
+    Pages are appended one by one to a temporary file, which is streamed and
+    then deleted.
+
+    Keyword arguments:
+    badges -- an iterable of (username, qrcode_hash, name) tuples
+    processes -- the number of worker processes, defaults to the CPU count
+    chunk_size -- the size of the yielded chunks, in bytes
+    """
+    from PIL import Image
+    fd, path = tempfile.mkstemp(suffix='.pdf')
+    os.close(fd)
+    try:
+        pages = pool_map(_render_page, chunks(badges, BADGES_PER_PAGE),
+                         processes)
+        first_page = True
+        for page in pages:
+            page.save(path, 'PDF', resolution=150.0, append=not first_page)
+            first_page = False
+        if first_page:
+            Image.new('L', SHEET_SIZE, 255).save(path, 'PDF',
+                                                 resolution=150.0)
+
+        with open(path, 'rb') as f:
+            chunk = f.read(chunk_size)
+            while chunk:
+                yield chunk
+                chunk = f.read(chunk_size)
+    finally:
+        os.remove(path)
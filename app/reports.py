@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""End-of-night reports."""
+import datetime
+from sqlalchemy import case, extract, func, select, union_all
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import Item, Transaction, ArchivedTransaction, NightReport
+from app.popularity import BAR_DAY_START_HOUR, bar_day
+
+# Liters counted for the alcoholic items without a serving volume
+DEFAULT_VOLUME = 0.25
+
+
+def night_bounds(day):
+    """Return the first and last datetimes (excluded) of a bar day."""
+    start = datetime.datetime.combine(day, datetime.time()) + \
+        datetime.timedelta(hours=BAR_DAY_START_HOUR)
+    return start, start + datetime.timedelta(days=1)
+
+
+def last_closed_night(now=None):
+    """Return the bar day of the last closed night."""
+    now = now or datetime.datetime.utcnow()
+    return bar_day(now) - datetime.timedelta(days=1)
+
+
+def alcohol_volume(start, end=None):
+    """Return the liters of alcohol sold since start, or until end."""
+    query = db.session.query(
+        func.sum(func.coalesce(Item.volume, DEFAULT_VOLUME))).\
+        select_from(Transaction).\
+        join(Item, Transaction.item_id == Item.id).\
+        filter(Transaction.date > start).\
+        filter(Transaction.type.like('Pay%')).\
+        filter(Transaction.is_reverted.is_(False)).\
+        filter(Item.is_alcohol.is_(True))
+    if end is not None:
+        query = query.filter(Transaction.date < end)
+    return query.scalar() or 0.0
+
+
+def _night_transactions(start, end):
+    """Return the hot and archived transactions of a night as a subquery."""
+    def night(model):
+        return select([model.barman, model.client_id, model.item_id,
+                       model.date, model.type, model.balance_change,
+                       model.is_reverted]).\
+            where(model.date >= start).where(model.date < end)
+    return union_all(night(Transaction), night(ArchivedTransaction)).\
+        alias('night')
+
+
+def compute_night_report(day):
+    """Return the totals of a night, computed with two grouped queries.
+
+    Reverted transactions are left out of the totals, and counted apart.
+
+    Keyword arguments:
+    day -- the bar day of the night
+    """
+    night = _night_transactions(*night_bounds(day))
+    kind = case([(night.c.type.like('Pay%'), 'pay'),
+                 (night.c.type == 'Top up', 'top_up')], else_='revert')
+    hour = extract('hour', night.c.date)
+    rows = db.session.query(
+        night.c.barman, Item.name, Item.is_alcohol, Item.volume, hour, kind,
+        night.c.is_reverted, func.count(), func.sum(night.c.balance_change)).\
+        select_from(night).outerjoin(Item, night.c.item_id == Item.id).\
+        group_by(night.c.barman, Item.name, Item.is_alcohol, Item.volume,
+                 hour, kind, night.c.is_reverted).all()
+    nb_clients = db.session.query(
+        func.count(func.distinct(night.c.client_id))).\
+        filter(night.c.client_id.isnot(None)).\
+        filter(night.c.is_reverted.isnot(True)).scalar()
+
+    report = {'revenue': 0.0, 'topped_up': 0.0, 'nb_sales': 0,
+              'nb_top_ups': 0, 'nb_reverts': 0, 'reverted': 0.0,
+              'alcohol_qty': 0.0, 'nb_clients': nb_clients or 0,
+              'barmen': {}, 'items': {}, 'hours': {}}
+    for barman, item_name, is_alcohol, volume, hour, kind, is_reverted, \
+            count, amount in rows:
+        amount = abs(amount or 0.0)
+        barman_totals = report['barmen'].setdefault(
+            barman, {'revenue': 0.0, 'topped_up': 0.0, 'nb_sales': 0,
+                     'nb_reverts': 0})
+        hour_totals = report['hours'].setdefault(
+            str(hour), {'revenue': 0.0, 'topped_up': 0.0, 'nb_sales': 0})
+
+        if kind == 'revert':
+            report['nb_reverts'] += count
+            barman_totals['nb_reverts'] += count
+        elif is_reverted:
+            report['reverted'] += amount
+        elif kind == 'top_up':
+            for totals in (report, barman_totals, hour_totals):
+                totals['topped_up'] += amount
+            report['nb_top_ups'] += count
+        else:
+            for totals in (report, barman_totals, hour_totals):
+                totals['revenue'] += amount
+                totals['nb_sales'] += count
+            item_totals = report['items'].setdefault(
+                item_name, {'revenue': 0.0, 'nb_sales': 0})
+            item_totals['revenue'] += amount
+            item_totals['nb_sales'] += count
+            if is_alcohol:
+                report['alcohol_qty'] += count * (
+                    DEFAULT_VOLUME if volume is None else volume)
+    return report
+
+
+def save_night_report(day, report):
+    """Persist the report of a closed night.
+
+    Return the stored report, which may have been saved concurrently.
+    """
+    night_report = NightReport(
+        day=day, revenue=report['revenue'], topped_up=report['topped_up'],
+        nb_reverts=report['nb_reverts'], alcohol_qty=report['alcohol_qty'],
+        nb_clients=report['nb_clients'], details=report)
+    db.session.add(night_report)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        night_report = NightReport.query.filter_by(day=day).one()
+    return night_report
+
+
+def discard_night_report(day):
+    """Delete the stored report of a night, to be computed again.
+
+    Called when a transaction of a closed night changes, the caller
+    committing the session.
+    """
+    NightReport.query.filter_by(day=day).delete()
+
+
+def get_night_report(day, now=None):
+    """Return the report of a night.
+
+    Closed nights are computed once and served from their stored snapshot
+    afterwards. The current night is computed on each call.
+
+    Keyword arguments:
+    day -- the bar day of the night
+    now -- the current datetime
+
+    Return the report and whether the night is closed.
+    """
+    stored = NightReport.query.filter_by(day=day).first()
+    if stored is not None:
+        return stored.details, True
+
+    report = compute_night_report(day)
+    if night_bounds(day)[1] > (now or datetime.datetime.utcnow()):
+        return report, False
+    return save_night_report(day, report).details, True
+
+
+def backfill_night_reports(start, end):
+    """Store the missing reports of the closed nights between two bar days.
+
+    Nights without any transaction are skipped.
+
+    Keyword arguments:
+    start -- the first bar day
+    end -- the last bar day (inclusive)
+
+    Return the number of stored reports.
+    """
+    end = min(end, last_closed_night())
+    stored = {day for day, in db.session.query(NightReport.day).
+              filter(NightReport.day.between(start, end))}
+    count = 0
+    day = start
+    while day <= end:
+        if day not in stored:
+            report = compute_night_report(day)
+            if report['barmen']:
+                save_night_report(day, report)
+                count += 1
+        day += datetime.timedelta(days=1)
+    return count
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""Full-text search index."""
+from flask_whooshee import Whooshee as BaseWhooshee
+from sqlalchemy.orm import object_session
+
+# Key of the session info set to skip the index updates of its flushes
+SKIP_INDEXING = 'skip_indexing'
+
+
+def is_indexed(target):
+    """Return whether the changes of a model instance update the index."""
+    session = object_session(target)
+    return session is None or not session.info.get(SKIP_INDEXING)
+
+
+class Whooshee(BaseWhooshee):
+    """Whooshee extension whose sessions can skip the index updates.
+
+    Changes flushed by a session with info[SKIP_INDEXING] set aren't
+    indexed one by one, the caller indexing them at once with on_commit.
+    Other sessions, like those of concurrent requests, are still indexed.
+    """
+
+    def after_insert(self, mapper, connection, target):
+        """Index an inserted instance."""
+        if is_indexed(target):
+            super(Whooshee, self).after_insert(mapper, connection, target)
+
+    def after_delete(self, mapper, connection, target):
+        """Remove a deleted instance from the index."""
+        if is_indexed(target):
+            super(Whooshee, self).after_delete(mapper, connection, target)
+
+    def after_update(self, mapper, connection, target):
+        """Index an updated instance."""
+        if is_indexed(target):
+            super(Whooshee, self).after_update(mapper, connection, target)
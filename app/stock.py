@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""Stock movements of quantifiable items."""
+from sqlalchemy import func
+from sqlalchemy.orm.attributes import set_committed_value
+from app import db, catalog
+from app.models import Item, StockMovement
+
+MOVEMENT_KINDS = ('restock', 'sale', 'revert', 'adjustment')
+
+
+def update_low_stock(item):
+    """Update the low stock flag of an item.
+
+    Return True if the item just went low on stock.
+    """
+    was_low_stock = item.is_low_stock
+    item.is_low_stock = bool(item.is_quantifiable and
+                             item.low_stock_threshold is not None and
+                             item.quantity <= item.low_stock_threshold)
+    return item.is_low_stock and not was_low_stock
+
+
+def move_stock(item, delta, kind, barman, transaction=None):
+    """Change the quantity of an item and record the movement.
+
+    The quantity is incremented in the database rather than overwritten, so
+    that concurrent sales and restocks are never lost. Only this item's low
+    stock flag is evaluated. Restocks and adjustments bump the catalog
+    version, sales and reverts don't since the catalog refreshes its
+    quantities whenever it checks its version. The caller commits.
+
+    Keyword arguments:
+    item -- the item
+    delta -- the quantity change
+    kind -- 'restock', 'sale', 'revert' or 'adjustment'
+    barman -- the username of the barman
+    transaction -- the transaction of a sale or a revert
+
+    Return True if the item just went low on stock.
+    """
+    if kind not in MOVEMENT_KINDS:
+        raise ValueError('Unknown stock movement {}.'.format(kind))
+
+    db.session.query(Item).filter_by(id=item.id).\
+        update({Item.quantity: func.coalesce(Item.quantity, 0) + delta},
+               synchronize_session=False)
+    quantity = db.session.query(Item.quantity).filter_by(id=item.id).scalar()
+    set_committed_value(item, 'quantity', quantity)
+
+    db.session.add(StockMovement(item_id=item.id, barman=barman, kind=kind,
+                                 delta=delta, quantity=quantity,
+                                 transaction=transaction))
+    if kind not in ('sale', 'revert'):
+        catalog.bump()
+    return update_low_stock(item)
+
+
+def restock(deltas, barman):
+    """Apply many stock changes in a single database transaction.
+
+    Keyword arguments:
+    deltas -- a dict of quantity changes by item id
+    barman -- the username of the barman
+
+    Return the items that went low on stock.
+    """
+    deltas = {item_id: delta for item_id, delta in deltas.items() if delta}
+    items = Item.query.filter(Item.id.in_(deltas)).all() if deltas else []
+    if len(items) != len(deltas) or \
+            not all(item.is_quantifiable for item in items):
+        raise ValueError('Only quantifiable items can be restocked.')
+
+    low_stock = []
+    try:
+        for item in sorted(items, key=lambda item: item.id):
+            if move_stock(item, deltas[item.id], 'restock', barman):
+                low_stock.append(item)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return low_stock
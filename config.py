@@ -40,6 +40,10 @@ class ProductionConfig(Config):
     DEBUG = False
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL')
 
+    # Optional read replica, used by the read-only views
+    if os.environ.get('DATABASE_REPLICA_URL'):
+        SQLALCHEMY_BINDS = {'replica': os.environ.get('DATABASE_REPLICA_URL')}
+
 
 class DevelopmentConfig(Config):
     """Development configuration."""
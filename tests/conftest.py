@@ -3,9 +3,13 @@
 import pytest
 import re
 from flask import url_for
+from sqlalchemy import event
 from app import create_app
 from app import db as _db
+from app.analytics import clear_statistics
+from app.grad_classes import clear_totals
 from app.models import User, Item, GlobalSetting
+from app.pagination import clear_counts
 from config import TestingConfig
 
 
@@ -44,6 +48,9 @@ def app():
     yield _app
 
     ctx.pop()
+    clear_counts()
+    clear_statistics()
+    clear_totals()
 
 
 @pytest.fixture
@@ -66,6 +73,27 @@ def db(app):
     _db.drop_all()
 
 
+@pytest.fixture
+def count_statements(db):
+    """Return a function counting the SQL statements run by a function."""
+    def count(function, statements=None):
+        if statements is None:
+            statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            function()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute',
+                         before_cursor_execute)
+        return len(statements)
+
+    return count
+
+
 @pytest.fixture
 def user(db):
     """Return a user creation function for the tests."""
@@ -120,7 +148,7 @@ def auth(client):
     def auth_user(username, password):
         rv = client.get(url_for('auth.login'))
         m = re.search(b'(<input id="csrf_token" name="csrf_token" '
-                      b'type="hidden" value=")([-A-Za-z.0-9]+)', rv.data)
+                      b'type="hidden" value=")([-A-Za-z.0-9_]+)', rv.data)
 
         return client.post(url_for('auth.login'), data=dict(
             username=username,
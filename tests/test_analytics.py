@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""Test the consumption statistics."""
+import datetime
+import numpy as np
+import pytest
+from flask import url_for
+from app.analytics import fetch_columns, year_statistics
+from app.models import ArchivedTransaction, Transaction
+
+
+@pytest.fixture
+def transactions(db, item, user):
+    """Add transactions of two academic years."""
+    beer = item(name='beer', is_alcohol=True)
+    soda = item(name='soda')
+    alice = user(username='alice')
+    alice.grad_class = 135
+    bob = user(username='bob')
+    bob.grad_class = 136
+    db.session.add_all([beer, soda, alice, bob])
+    db.session.commit()
+
+    # Thursday, October 4th 2018 at 21:30
+    thursday = datetime.datetime(2018, 10, 4, 21, 30)
+    db.session.add_all([
+        Transaction(client_id=alice.id, barman='barman', date=thursday,
+                    type='Top up', balance_change=20),
+        Transaction(client_id=alice.id, item_id=beer.id, barman='barman',
+                    date=thursday, type='Pay beer', balance_change=-2),
+        Transaction(client_id=bob.id, item_id=soda.id, barman='barman',
+                    date=thursday, type='Pay soda', balance_change=-1),
+        Transaction(client_id=bob.id, item_id=beer.id, barman='barman',
+                    date=thursday, type='Pay beer', balance_change=-2,
+                    is_reverted=True),
+        Transaction(barman='barman', date=thursday, type='Revert #4'),
+        ArchivedTransaction(id=100, client_id=alice.id, item_id=beer.id,
+                            barman='barman',
+                            date=datetime.datetime(2019, 8, 31, 23),
+                            type='Pay beer', balance_change=-2),
+        Transaction(client_id=bob.id, item_id=soda.id, barman='barman',
+                    date=datetime.datetime(2019, 9, 1), type='Pay soda',
+                    balance_change=-1)])
+    db.session.commit()
+
+
+@pytest.mark.usefixtures('transactions')
+def test_fetch_columns(db):
+    """Columns are fetched in batches from both transaction tables."""
+    columns = fetch_columns(datetime.datetime(2018, 9, 1),
+                            datetime.datetime(2019, 9, 1), batch_size=2)
+    assert len(columns['date']) == 6
+    amounts = columns['amount']
+    assert sorted(amounts[~np.isnan(amounts)]) == [-2, -2, -2, -1, 20]
+    grad_classes = columns['grad_class']
+    assert sorted(grad_classes[~np.isnan(grad_classes)]) == \
+        [135, 135, 135, 136, 136]
+    assert columns['is_reverted'].sum() == 1
+
+
+@pytest.mark.usefixtures('transactions')
+def test_year_statistics(db):
+    """Statistics leave out reverted transactions and reverts."""
+    statistics = year_statistics(2018)
+    assert (statistics['revenue'], statistics['topped_up'],
+            statistics['nb_sales']) == (5, 20, 3)
+    assert statistics['heatmap']['nb_sales'][3][21] == 2
+    assert statistics['heatmap']['revenue'][5][23] == 2
+    assert statistics['grad_classes'] == {
+        '135': {'revenue': 4, 'nb_sales': 2, 'nb_alcoholic_drinks': 2},
+        '136': {'revenue': 1, 'nb_sales': 1, 'nb_alcoholic_drinks': 0}}
+    assert statistics['monthly_revenue'][1] == 3
+    assert statistics['monthly_revenue'][11] == 2
+    assert statistics['monthly_top_ups'][1] == 20
+
+    # Closed academic years are cached
+    Transaction.query.delete()
+    db.session.commit()
+    assert year_statistics(2018) is statistics
+
+
+@pytest.mark.usefixtures('client', 'db', 'auth', 'transactions')
+def test_get_analytics(client, db, user, auth):
+    """Observers get the statistics and trends as JSON."""
+    db.session.add(user(username='observer', account_type='observer'))
+    db.session.commit()
+    auth('observer', 'observer')
+
+    rv = client.get(url_for('main.get_analytics', year=2018))
+    data = rv.get_json()
+    assert data['statistics']['nb_sales'] == 3
+    assert [(t['year'], t['nb_sales']) for t in data['trends']][:2] == \
+        [(2018, 3), (2019, 1)]
+    assert client.get(url_for('main.get_analytics', year=3000)).\
+        status_code == 404
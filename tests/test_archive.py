@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""Test transaction archival."""
+import datetime
+import pytest
+from flask import url_for
+from app.archive import academic_year_start, archive_transactions, \
+    archived_monthly_totals, transactions_balance
+from app.models import Transaction, ArchivedTransaction, TransactionSummary
+
+
+def test_academic_year_start():
+    """Academic years start on September 1st."""
+    assert academic_year_start(datetime.date(2018, 10, 3)) == \
+        datetime.datetime(2018, 9, 1)
+    assert academic_year_start(datetime.date(2019, 3, 3)) == \
+        datetime.datetime(2018, 9, 1)
+
+
+@pytest.fixture
+def history(db, user, item):
+    """Return a customer with a year of transactions."""
+    customer = user(username='customer')
+    beer = item(name='beer', is_alcohol=True)
+    db.session.add_all([customer, beer])
+    for month in range(1, 13):
+        date = datetime.datetime(2018, month, 10)
+        db.session.add_all([
+            Transaction(barman='barman', type='Top up', client=customer,
+                        balance_change=10, date=date),
+            Transaction(barman='barman', type='Pay beer', client=customer,
+                        item=beer, balance_change=-2, date=date),
+            Transaction(barman='barman', type='Pay beer', client=customer,
+                        item=beer, balance_change=-2, date=date,
+                        is_reverted=True),
+            Transaction(barman='barman', type='Revert #0', date=date)
+        ])
+    customer.balance = 12 * 8
+    db.session.commit()
+    return customer
+
+
+def test_archive_transactions(db, history):
+    """Old transactions are moved in batches and summarized per month."""
+    assert archive_transactions(datetime.datetime(2018, 9, 1),
+                                batch_size=5) == 32
+    assert Transaction.query.count() == 16
+    assert ArchivedTransaction.query.count() == 32
+    assert Transaction.query.filter(
+        Transaction.date < datetime.datetime(2018, 9, 1)).count() == 0
+
+    summary = TransactionSummary.query.\
+        filter_by(client_id=history.id, year=2018, month=3).one()
+    assert summary.nb_transactions == 3
+    assert summary.topped_up == 10
+    assert summary.paid == 2
+    assert TransactionSummary.query.filter_by(client_id=None).count() == 8
+
+    # Archiving again resumes where the previous run stopped
+    assert archive_transactions(datetime.datetime(2018, 9, 1)) == 0
+    assert archive_transactions(datetime.datetime(2018, 9, 11)) == 4
+    summary = TransactionSummary.query.\
+        filter_by(client_id=history.id, year=2018, month=9).one()
+    assert summary.topped_up == 10
+
+
+def test_archived_totals(db, history):
+    """Monthly totals and balances account for archived transactions."""
+    assert transactions_balance(history) == history.balance
+    archive_transactions(datetime.datetime(2018, 7, 1))
+    assert transactions_balance(history) == history.balance
+
+    totals = archived_monthly_totals((2018, 5), (2018, 8))
+    assert totals == {(2018, 5): (2, 10), (2018, 6): (2, 10)}
+
+
+@pytest.mark.usefixtures('client', 'db', 'auth')
+def test_archive_view(client, db, user, auth, history):
+    """Admins can browse the archived transactions."""
+    db.session.add(user(username='bartender', account_type='bartender'))
+    db.session.add(user(username='admin', account_type='admin'))
+    db.session.commit()
+    archive_transactions(datetime.datetime(2018, 7, 1))
+
+    auth('bartender', 'bartender')
+    rv = client.get(url_for('main.transactions', archive=1))
+    assert b'Transactions <span class="badge badge-light">24</span>' in \
+        rv.data
+    client.get(url_for('auth.logout'))
+
+    auth('admin', 'admin')
+    rv = client.get(url_for('main.transactions', archive=1))
+    assert b'Archived transactions <span class="badge badge-light">24' \
+        b'</span>' in rv.data
+    rv = client.get(url_for('main.export_transactions', archive=1))
+    assert len(rv.data.decode().splitlines()) == 25
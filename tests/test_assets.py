@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""Test the fingerprinted static assets."""
+import base64
+import gzip
+import hashlib
+import json
+import pytest
+from app import assets
+from app.assets import MANIFEST, VENDOR_ASSETS, build_assets, \
+    check_integrity
+
+STYLE = b'body { color: black; }\n' * 100
+
+
+@pytest.fixture
+def built(app, tmp_path):
+    """Return the manifest of assets built to a temporary folder."""
+    source = tmp_path / 'static'
+    (source / 'css').mkdir(parents=True)
+    (source / 'css' / 'style.css').write_bytes(STYLE)
+    assets.folder = str(tmp_path / 'dist')
+    manifest = build_assets(str(source), assets.folder)
+    assets.load()
+    return manifest
+
+
+def test_build_assets(built, tmp_path):
+    """Built assets are named after their content and precompressed."""
+    digest = hashlib.sha256(STYLE).hexdigest()[:12]
+    assert built == {'css/style.css': 'css/style.{}.css'.format(digest)}
+
+    path = tmp_path / 'dist' / built['css/style.css']
+    assert path.read_bytes() == STYLE
+    assert gzip.decompress(path.with_name(path.name + '.gz').
+                           read_bytes()) == STYLE
+    assert json.loads((tmp_path / 'dist' / MANIFEST).read_text()) == built
+
+
+def test_asset_urls(built):
+    """Assets are linked to their build, their CDN or the static folder."""
+    assert assets.url('css/style.css') == \
+        '/assets/' + built['css/style.css']
+    assert assets.url('vendor/jquery.min.js') == \
+        VENDOR_ASSETS['vendor/jquery.min.js']['url']
+    assert assets.url('js/jsQR.js') == '/static/js/jsQR.js'
+
+
+def test_serve_asset(client, built):
+    """Built assets are cached forever and served compressed if accepted."""
+    url = assets.url('css/style.css')
+    rv = client.get(url, headers={'Accept-Encoding': 'gzip, deflate'})
+    assert rv.headers['Content-Encoding'] == 'gzip'
+    assert rv.headers['Content-Type'].startswith('text/css')
+    assert 'immutable' in rv.headers['Cache-Control']
+    assert 'Accept-Encoding' in rv.headers['Vary']
+    assert gzip.decompress(rv.data) == STYLE
+
+    rv = client.get(url, headers={'Accept-Encoding': 'identity'})
+    assert 'Content-Encoding' not in rv.headers
+    assert rv.data == STYLE
+    assert client.get('/assets/css/missing.css').status_code == 404
+
+
+def test_check_integrity():
+    """Vendored assets must match their integrity hash."""
+    integrity = 'sha384-' + base64.b64encode(
+        hashlib.sha384(b'asset').digest()).decode()
+    check_integrity(b'asset', integrity)
+    with pytest.raises(ValueError):
+        check_integrity(b'tampered', integrity)
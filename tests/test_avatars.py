@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""Test avatars."""
+import os
+import pytest
+from flask import Flask, current_app
+from PIL import Image
+from app.avatars import Avatars
+
+
+@pytest.fixture
+def avatars(tmpdir):
+    """Yield an avatar index over a temporary static folder."""
+    app = Flask(__name__, static_folder=str(tmpdir),
+                static_url_path='/static')
+    app.config['AVATAR_REFRESH_INTERVAL'] = 0
+    os.makedirs(str(tmpdir.join('img', 'avatar', '137')))
+
+    with app.test_request_context():
+        yield Avatars(app)
+
+
+def save_avatar(avatars, grad_class, username, color):
+    """Save an avatar in the static folder."""
+    path = os.path.join(avatars.static_folder, 'img', 'avatar',
+                        str(grad_class), username + '.jpg')
+    Image.new('RGB', (1000, 800), color).save(path)
+    return path
+
+
+def test_placeholder(avatars):
+    """Users without avatar get the placeholder."""
+    assert avatars.url(137, 'foo') == \
+        '/static/img/avatar/avatar_placeholder.png'
+
+
+def test_thumbnails(avatars):
+    """Avatars are indexed and thumbnails are built in the background."""
+    save_avatar(avatars, 137, 'foo', 'red')
+
+    url = avatars.url(137, 'foo', 'card')
+    assert url.startswith('/avatars/img/avatar/137/foo.jpg?v=')
+
+    avatars.wait()
+    url = avatars.url(137, 'foo', 'card')
+    assert url.startswith('/avatars/img/thumbnails/card/')
+
+    thumbnail = Image.open(os.path.join(avatars.static_folder,
+                                        url[len('/avatars/'):]))
+    assert thumbnail.size == (320, 256)
+
+
+def test_refresh(avatars):
+    """New avatars are picked up when the folder changes."""
+    assert avatars.url(137, 'bar', None) == \
+        '/static/img/avatar/avatar_placeholder.png'
+
+    path = save_avatar(avatars, 137, 'bar', 'blue')
+    url = avatars.url(137, 'bar', None)
+    assert url.startswith('/avatars/img/avatar/137/bar.jpg?v=')
+
+    # Avatars overwritten in place get a new hash
+    folder_mtime = os.stat(os.path.dirname(path)).st_mtime
+    save_avatar(avatars, 137, 'bar', 'green')
+    os.utime(path, (0, os.stat(path).st_mtime + 1))
+    os.utime(os.path.dirname(path), (0, folder_mtime))
+    assert avatars.url(137, 'bar', None) != url
+
+
+def test_send_avatar(avatars):
+    """Hashed avatars are cached forever."""
+    save_avatar(avatars, 137, 'foo', 'red')
+    client = current_app.test_client()
+    rv = client.get(avatars.url(137, 'foo', None))
+    assert rv.status_code == 200
+    assert 'immutable' in rv.headers['Cache-Control']
+    rv.close()
+    assert client.get('/avatars/css/style.css').status_code == 404
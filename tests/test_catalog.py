@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""Test the item catalog cache."""
+import pytest
+from flask import url_for
+from app import catalog
+from app.catalog import CatalogCache
+from app.models import CatalogVersion, Item
+from app.stock import move_stock
+
+
+@pytest.fixture
+def items(db, item):
+    """Return three items, the second one being a favorite."""
+    items = [item(name='wine'), item(name='beer'), item(name='cider')]
+    items[1].is_favorite = True
+    db.session.add_all(items)
+    db.session.commit()
+    return items
+
+
+def test_catalog(db, items):
+    """The catalog indexes the items sorted by name."""
+    snapshot = catalog.get()
+    assert [item.name for item in snapshot.items] == \
+        ['beer', 'cider', 'wine']
+    assert [item.name for item in snapshot.favorites] == ['beer']
+    assert snapshot.by_name['wine'].id == items[0].id
+    assert snapshot.by_id[items[2].id].name == 'cider'
+    assert snapshot.quick_access_item.id == 1
+
+
+def test_catalog_version(db, items, count_statements):
+    """Snapshots are only rebuilt when the catalog version changes."""
+    cache = CatalogCache()
+    cache.check_interval = 0
+    snapshot = cache.get()
+    assert count_statements(cache.get) == 2
+    assert cache.get() is snapshot
+
+    # Another process changes an item
+    items[0].price = 3
+    catalog.bump()
+    db.session.commit()
+    assert cache.get() is not snapshot
+    assert cache.get().by_name['wine'].price == 3
+
+    # Within the check interval, the version isn't even read
+    cache.check_interval = 60
+    assert count_statements(cache.get) == 0
+
+
+def test_sale_keeps_snapshot(db, items):
+    """Sales refresh the quantities without rebuilding the snapshot."""
+    wine = items[0]
+    wine.is_quantifiable = True
+    wine.quantity = 5
+    catalog.bump()
+    db.session.commit()
+    cache = CatalogCache()
+    cache.check_interval = 0
+    snapshot = cache.get()
+    version = CatalogVersion.query.get(1).version
+
+    move_stock(wine, -1, 'sale', 'bartender')
+    db.session.commit()
+    assert CatalogVersion.query.get(1).version == version
+    assert cache.get() is snapshot
+    assert snapshot.by_name['wine'].quantity == 4
+
+
+@pytest.mark.usefixtures('client', 'db', 'auth')
+def test_inventory_pages(client, db, user, auth, items):
+    """Inventory pages are read from the catalog."""
+    db.session.add(user(username='bartender', account_type='bartender'))
+    db.session.commit()
+    auth('bartender', 'bartender')
+
+    rv = client.get(url_for('main.inventory', sort='desc'))
+    assert rv.status_code == 200
+    assert rv.data.index(b'wine') < rv.data.index(b'beer')
+    rv = client.get(url_for('main.inventory', page=2))
+    assert rv.status_code == 404
+
+    rv = client.get(url_for('main.edit_item', item_name='wine'))
+    csrf_token = rv.data.split(b'name="csrf_token" type="hidden" value="')[1].\
+        split(b'"')[0].decode()
+    client.post(url_for('main.edit_item', item_name='wine'), data={
+        'csrf_token': csrf_token, 'name': 'red wine', 'price': 2,
+        'quantity': 0})
+    rv = client.get(url_for('main.inventory'))
+    assert b'red wine' in rv.data
+    assert Item.query.filter_by(name='red wine').count() == 1
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+"""Test credential PDF generation."""
+import os
+from PIL.PdfParser import PdfParser
+from app.auth.credentials import latex_escape, render_credentials
+
+CREDENTIALS = [
+    {'username': 'jdupont', 'password': 'a&b%c$d#', 'first_name': 'Jean',
+     'last_name': 'Dupont', 'grad_class': 137},
+    {'username': 'mcurie', 'password': 'e^f', 'first_name': 'Marie',
+     'last_name': 'Curie', 'grad_class': 137},
+    {'username': 'pcurie', 'password': 'secret', 'first_name': 'Pierre',
+     'last_name': 'Curie', 'grad_class': 138},
+]
+
+
+def test_latex_escape():
+    """Special LaTeX characters of passwords are escaped."""
+    assert latex_escape('a&b%c$d#') == r'\texttt{a\&b\%c\$d\#}'
+
+
+def test_render_credentials_pillow(tmpdir):
+    """The pure Python backend renders one PDF per user and per class."""
+    stats = render_credentials(CREDENTIALS, str(tmpdir), backend='pillow',
+                               workers=2, merge=True)
+
+    assert stats['pdfs'] == 3
+    assert stats['pdfs_per_second'] > 0
+    assert sorted(os.listdir(str(tmpdir))) == ['137', '137.pdf', '138',
+                                               '138.pdf']
+    assert sorted(os.listdir(str(tmpdir.join('137')))) == \
+        ['jdupont.pdf', 'mcurie.pdf']
+    assert len(PdfParser(str(tmpdir.join('137.pdf'))).pages) == 2
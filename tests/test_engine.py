@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""Test the database engine tuning."""
+import datetime
+import sqlite3
+import pytest
+from flask import url_for
+from sqlalchemy.engine.url import make_url
+from app.engine import REPLICA_BIND, benchmark_sqlite, sqlite_pragmas
+from app.models import NightReport, Transaction
+from app.reports import night_bounds
+
+
+@pytest.fixture
+def replica(app, db, tmp_path):
+    """Return the engine of a replica in a second SQLite file."""
+    app.config['SQLALCHEMY_BINDS'] = {
+        REPLICA_BIND: 'sqlite:///' + str(tmp_path / 'replica.db')}
+    engine = db.get_engine(app, bind=REPLICA_BIND)
+    db.Model.metadata.create_all(engine)
+    return engine
+
+
+def replicate(db, engine):
+    """Copy the rows of the primary database to a replica."""
+    for table in reversed(db.Model.metadata.sorted_tables):
+        engine.execute(table.delete())
+    for table in db.Model.metadata.sorted_tables:
+        rows = [dict(row) for row in db.session.execute(table.select())]
+        if rows:
+            engine.execute(table.insert(), rows)
+
+
+def test_sqlite_pragmas(db):
+    """SQLite connections use write-ahead logging."""
+    assert db.session.execute('PRAGMA journal_mode').scalar() == 'wal'
+    assert db.session.execute('PRAGMA synchronous').scalar() == 1
+    assert db.session.execute('PRAGMA busy_timeout').scalar() == 5000
+
+
+def test_concurrent_write(app, db):
+    """Writes commit while a read transaction is open."""
+    path = make_url(app.config['SQLALCHEMY_DATABASE_URI']).database
+    reader = db.engine.raw_connection()
+    writer = sqlite3.connect(path, timeout=0)
+    try:
+        cursor = reader.cursor()
+        cursor.execute('BEGIN')
+        cursor.execute('SELECT count(*) FROM item')
+        writer.execute("INSERT INTO catalog_version (id, version) "
+                       "VALUES (1, 1)")
+        writer.commit()
+        cursor.execute('SELECT count(*) FROM catalog_version')
+        assert cursor.fetchone()[0] == 0
+        reader.rollback()
+    finally:
+        writer.close()
+        reader.close()
+
+
+def test_mysql_pool_options(app, db):
+    """MySQL connections are pinged and recycled."""
+    options = {}
+    db.apply_driver_hacks(app, make_url('mysql+pymysql://user@localhost/bar'),
+                          options)
+    assert options['pool_pre_ping'] is True
+    assert options['pool_recycle'] < 8 * 3600
+    assert options['pool_size'] == 10
+
+
+def test_benchmark_sqlite(app):
+    """The benchmark counts the reads and writes of each thread."""
+    stats = benchmark_sqlite(sqlite_pragmas(app.config), readers=1,
+                             writers=1, duration=0.2)
+    assert stats['reads_per_second'] > 0
+    assert stats['writes_per_second'] > 0
+
+
+@pytest.mark.usefixtures('client', 'db', 'auth')
+def test_replica_routing(client, db, user, item, auth, replica):
+    """Read-only views read from the replica unless the user just wrote."""
+    db.session.add(user(username='admin', account_type='admin'))
+    customer = user(username='customer')
+    customer.deposit = True
+    customer.balance = 10
+    soda = item(name='soda', quantity=10)
+    db.session.add_all([customer, soda])
+    db.session.commit()
+    auth('admin', 'admin')
+    replicate(db, replica)
+
+    def daily_revenue():
+        # Each request gets a new session, as outside of the tests
+        db.session.remove()
+        return client.get(url_for('main.get_daily_statistics')).\
+            get_json()['daily_revenue']
+
+    # The sale is written to the primary, which the seller then reads
+    client.get(url_for('main.pay', username='customer', item_id=soda.id),
+               headers={'Referer': url_for('main.dashboard')})
+    assert daily_revenue() == 1
+
+    # Other reads go to the replica, which hasn't caught up yet
+    with client.session_transaction() as session:
+        session['_primary_until'] = 0
+    assert daily_revenue() == 0
+    replicate(db, replica)
+    assert daily_revenue() == 1
+
+
+@pytest.mark.usefixtures('client', 'db', 'auth')
+def test_night_report_routing(client, db, user, auth, replica):
+    """Night reports are stored from the primary, never from the replica."""
+    db.session.add(user(username='admin', account_type='admin'))
+    db.session.commit()
+    auth('admin', 'admin')
+    replicate(db, replica)
+
+    day = datetime.date(2019, 3, 1)
+    db.session.add(Transaction(barman='admin', date=night_bounds(day)[0],
+                               type='Top up', balance_change=10))
+    db.session.commit()
+    db.session.remove()
+    with client.session_transaction() as session:
+        session['_primary_until'] = 0
+
+    client.get(url_for('main.night_report', day=day.isoformat()))
+    assert NightReport.query.filter_by(day=day).one().topped_up == 10
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""Test transaction log export."""
+import csv
+import datetime
+import io
+import json
+import pytest
+from flask import url_for
+from app.export import export_query, filter_transactions, stream_export
+from app.models import Transaction
+
+
+@pytest.fixture
+def history(db, user, item):
+    """Return a small transaction history."""
+    customer = user(username='customer')
+    beer = item(name='beer', is_alcohol=True)
+    db.session.add_all([customer, beer])
+    db.session.add_all([
+        Transaction(barman='barman1', type='Top up', client=customer,
+                    balance_change=10, date=datetime.datetime(2018, 1, 1)),
+        Transaction(barman='barman2', type='Pay beer', client=customer,
+                    item=beer, balance_change=-1,
+                    date=datetime.datetime(2018, 1, 2, 23, 30)),
+        Transaction(barman='barman1', type='Revert #2', client=customer,
+                    item=beer, balance_change=1,
+                    date=datetime.datetime(2018, 1, 3))
+    ])
+    db.session.commit()
+
+
+def export_csv(**filters):
+    """Return the exported rows as dicts."""
+    data = ''.join(stream_export(export_query(**filters), 'csv',
+                                 batch_size=2))
+    return list(csv.DictReader(io.StringIO(data)))
+
+
+def test_export_csv(history):
+    """Every transaction is exported with its client and item names."""
+    rows = export_csv()
+    assert [r['id'] for r in rows] == ['1', '2', '3']
+    assert rows[1]['client'] == 'customer'
+    assert rows[1]['item'] == 'beer'
+    assert rows[1]['date'] == '2018-01-02T23:30:00'
+    assert rows[0]['item'] == ''
+
+
+def test_export_filters(history):
+    """Rows can be filtered by date, barman, client, item and kind."""
+    assert [r['id'] for r in export_csv(start=datetime.date(2018, 1, 2),
+                                        end=datetime.date(2018, 1, 2))] == \
+        ['2']
+    assert [r['id'] for r in export_csv(barman='barman1')] == ['1', '3']
+    assert len(export_csv(client='customer')) == 3
+    assert len(export_csv(client='nobody')) == 0
+    assert [r['id'] for r in export_csv(item='beer')] == ['2', '3']
+    assert [r['id'] for r in export_csv(kind='pay')] == ['2']
+    with pytest.raises(ValueError):
+        export_query(kind='steal')
+
+
+def test_export_ndjson(history):
+    """NDJSON exports contain one JSON object per line."""
+    data = ''.join(stream_export(export_query(kind='top_up'), 'ndjson'))
+    lines = data.splitlines()
+    assert len(lines) == 1
+    assert json.loads(lines[0])['balance_change'] == 10
+
+
+@pytest.mark.usefixtures('client', 'db', 'auth')
+def test_export_transactions_route(client, db, user, auth, history):
+    """Admins download the log, other users are redirected."""
+    db.session.add(user(username='bartender', account_type='bartender'))
+    db.session.add(user(username='admin', account_type='admin'))
+    db.session.commit()
+
+    auth('bartender', 'bartender')
+    rv = client.get(url_for('main.export_transactions'))
+    assert rv.status_code == 302
+    client.get(url_for('auth.logout'))
+
+    auth('admin', 'admin')
+    rv = client.get(url_for('main.export_transactions', barman='barman2'))
+    assert rv.status_code == 200
+    assert rv.mimetype == 'text/csv'
+    assert len(list(csv.DictReader(io.StringIO(rv.data.decode())))) == 1
+
+    rv = client.get(url_for('main.export_transactions', start='yesterday'))
+    assert rv.status_code == 302
+
+
+def test_filter_transactions(history):
+    """Pages can be filtered on the reverted state."""
+    query = filter_transactions(Transaction.query, reverted=False)
+    assert query.count() == 3
+    query = filter_transactions(Transaction.query, reverted=True)
+    assert query.count() == 0
+    query = filter_transactions(Transaction.query, item='wine')
+    assert query.count() == 0
+
+
+@pytest.mark.parametrize('filters,index', [
+    ({'barman': 'barman1'}, 'ix_transaction_barman_id'),
+    ({'client': 'customer'}, 'ix_transaction_client_id_id'),
+    ({'item': 'beer'}, 'ix_transaction_item_id_id'),
+])
+def test_filter_transactions_indexes(db, history, filters, index):
+    """Filtered pages are read from a composite index, without sorting."""
+    query = filter_transactions(Transaction.query, **filters).\
+        order_by(Transaction.id.desc()).limit(10)
+    statement = query.statement.compile(db.engine,
+                                        compile_kwargs={'literal_binds':
+                                                        True})
+    plan = ' '.join(str(row) for row in
+                    db.engine.execute('EXPLAIN QUERY PLAN ' + str(statement)))
+    assert index in plan
+    assert 'TEMP B-TREE' not in plan
+
+
+@pytest.mark.usefixtures('client', 'db', 'auth')
+def test_transactions_filter_form(client, db, user, auth, history):
+    """The transactions page keeps its filters in the page links."""
+    db.session.add(user(username='bartender', account_type='bartender'))
+    db.session.commit()
+    auth('bartender', 'bartender')
+
+    rv = client.get(url_for('main.transactions', kind='pay',
+                            start='2018-01-02', end='2018-01-02'))
+    assert b'Transactions <span class="badge badge-light">1</span>' in \
+        rv.data
+    assert url_for('main.transactions', sort='asc', kind='pay',
+                   start='2018-01-02', end='2018-01-02').encode() in rv.data
+
+    rv = client.get(url_for('main.transactions', client='customer',
+                            start='yesterday'))
+    assert b'Transactions <span class="badge badge-light">3</span>' in \
+        rv.data
+    assert b'is-invalid' in rv.data
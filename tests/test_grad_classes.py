@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""Test the grad class totals."""
+import datetime
+import pytest
+from flask import url_for
+from app.grad_classes import _totals, discard_totals, grad_class_totals, \
+    transaction_totals
+from app.models import ArchivedTransaction, Transaction
+
+DAY = datetime.date(2019, 3, 1)
+
+
+@pytest.fixture
+def clients(db, item, user):
+    """Add clients of two grad classes and their transactions."""
+    beer = item(name='beer')
+    alice = user(username='alice')
+    alice.grad_class = 135
+    alice.balance = 8
+    bob = user(username='bob')
+    bob.grad_class = 136
+    bob.balance = 1.5
+    carol = user(username='carol')
+    carol.grad_class = 136
+    carol.balance = 3
+    db.session.add_all([beer, alice, bob, carol])
+    db.session.commit()
+
+    date = datetime.datetime.combine(DAY, datetime.time(21))
+    db.session.add_all([
+        Transaction(client_id=alice.id, barman='barman', date=date,
+                    type='Top up', balance_change=10),
+        Transaction(client_id=alice.id, item_id=beer.id, barman='barman',
+                    date=date, type='Pay beer', balance_change=-2),
+        Transaction(client_id=bob.id, item_id=beer.id, barman='barman',
+                    date=date, type='Pay beer', balance_change=-2,
+                    is_reverted=True),
+        Transaction(barman='barman', date=date, type='Revert #3'),
+        ArchivedTransaction(id=100, client_id=bob.id, item_id=beer.id,
+                            barman='barman',
+                            date=date - datetime.timedelta(days=30),
+                            type='Pay beer', balance_change=-1.5)])
+    db.session.commit()
+
+
+@pytest.mark.usefixtures('clients')
+def test_grad_class_totals(db):
+    """Totals join hot and archived transactions to the grad classes."""
+    assert grad_class_totals() == [
+        {'grad_class': 135, 'revenue': 2, 'topped_up': 10,
+         'nb_active_clients': 1, 'nb_users': 1, 'balance': 8},
+        {'grad_class': 136, 'revenue': 1.5, 'topped_up': 0,
+         'nb_active_clients': 1, 'nb_users': 2, 'balance': 4.5}]
+    totals = grad_class_totals(start=DAY, end=DAY)
+    assert [(t['grad_class'], t['revenue'], t['nb_active_clients'])
+            for t in totals] == [(135, 2, 1), (136, 0, 0)]
+
+
+@pytest.mark.usefixtures('clients')
+def test_past_periods_cache(db):
+    """Totals of past periods are cached, current ones aren't."""
+    totals = transaction_totals(DAY, DAY)
+    today = transaction_totals(DAY, datetime.date.today())
+    Transaction.query.delete()
+    db.session.commit()
+    assert transaction_totals(DAY, DAY) is totals
+    assert transaction_totals(DAY, datetime.date.today()) != today
+
+    # Reverting a transaction drops the periods including its day
+    discard_totals(DAY + datetime.timedelta(days=1))
+    assert transaction_totals(DAY, DAY) is totals
+    discard_totals(DAY)
+    assert transaction_totals(DAY, DAY) != totals
+
+
+@pytest.mark.usefixtures('clients')
+def test_totals_cache_size(db):
+    """Only the most recently used periods are kept."""
+    for days in range(3):
+        transaction_totals(end=DAY - datetime.timedelta(days=days),
+                           maxsize=2)
+    assert list(_totals) == [(None, DAY - datetime.timedelta(days=1)),
+                             (None, DAY - datetime.timedelta(days=2))]
+
+    # Expired totals are computed again
+    transaction_totals(DAY, DAY, ttl=0)
+    Transaction.query.delete()
+    db.session.commit()
+    assert transaction_totals(DAY, DAY) == {}
+
+
+@pytest.mark.usefixtures('client', 'db', 'auth', 'clients')
+def test_grad_classes_pages(client, db, user, auth):
+    """Admins get the totals as a page and as JSON."""
+    db.session.add(user(username='admin', account_type='admin'))
+    db.session.add(user(username='bartender', account_type='bartender'))
+    db.session.commit()
+
+    auth('bartender', 'bartender')
+    rv = client.get(url_for('main.grad_classes'), follow_redirects=True)
+    assert b"You don't have the rights to access this page." in rv.data
+    client.get(url_for('auth.logout'))
+
+    auth('admin', 'admin')
+    rv = client.get(url_for('main.grad_classes', start='2019-03-01'))
+    assert rv.status_code == 200
+    assert b'10.00' in rv.data
+    rv = client.get(url_for('main.get_grad_classes', end='2019-02-28'))
+    assert [t['revenue'] for t in rv.get_json()['grad_classes']] == \
+        [0, 0, 1.5]
+    assert client.get(url_for('main.get_grad_classes', end='nope')).\
+        status_code == 400
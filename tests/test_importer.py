@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""Test bulk user import."""
+import io
+import re
+import pytest
+from flask import url_for
+from app.auth.importer import UserImportError, _deferred_indexing, \
+    has_credentials, import_users, pop_credentials, read_users_csv, \
+    start_import, unique_username, wait_imports
+from app.models import User, UserImport
+
+CSV = """last_name,first_name,email,birthdate
+Dupont,Jean,jean.dupont@localhost,2000-01-31
+Dupont,Jeanne,jeanne.dupont@localhost,2001/02/28
+D'Artagnan-Gascon,Charles,Charles@localhost,1999-12-01
+Dupont,Jules,jean.dupont@localhost,2000-01-01
+"""
+
+
+def test_unique_username():
+    """Username collisions are resolved with a numeric suffix."""
+    assert unique_username('jdupont', set()) == 'jdupont'
+    assert unique_username('jdupont', {'jdupont'}) == 'jdupont2'
+    assert unique_username('jdupont', {'jdupont', 'jdupont2'}) == 'jdupont3'
+
+
+def test_read_users_csv_missing_column():
+    """CSV files without the expected columns are rejected."""
+    with pytest.raises(UserImportError):
+        read_users_csv(io.StringIO('last_name,first_name\nDupont,Jean\n'))
+
+
+def test_read_users_csv_invalid_date():
+    """Invalid rows are rejected with their line number."""
+    with pytest.raises(UserImportError, match='Line 2'):
+        read_users_csv(io.StringIO('last_name,first_name,email,birthdate\n'
+                                   'Dupont,Jean,jean@localhost,foo\n'))
+
+
+def test_import_users(db, user):
+    """Users are created with unique usernames and hashed passwords."""
+    existing = user(username='jdupont')
+    db.session.add(existing)
+    db.session.commit()
+
+    rows = read_users_csv(io.StringIO(CSV), grad_class=137)
+    credentials, skipped = import_users(rows, batch_size=2, processes=2)
+
+    assert [c['username'] for c in credentials] == \
+        ['jdupont2', 'jdupont3', 'cdartagn']
+    assert [r['first_name'] for r in skipped] == ['Jules']
+
+    jean = User.query.filter_by(username='jdupont2').first()
+    assert jean.grad_class == 137
+    assert jean.email == 'jean.dupont@localhost'
+    assert jean.is_customer
+    assert jean.check_password(credentials[0]['password'])
+    assert User.query.whooshee_search('jeanne').count() == 1
+
+
+def test_deferred_indexing(db, user):
+    """Only the importing session skips the search index updates."""
+    other = db.create_scoped_session()
+    with _deferred_indexing():
+        other.add(user(username='indexed'))
+        other.commit()
+        db.session.add(user(username='skipped'))
+        db.session.commit()
+    other.remove()
+    assert [u.username for u in User.query.whooshee_search('indexed')] == \
+        ['indexed']
+    assert User.query.whooshee_search('skipped').count() == 0
+
+
+@pytest.mark.usefixtures('client', 'db', 'auth')
+def test_import_users_page(app, client, db, user, auth, tmp_path):
+    """Uploads are imported in the background, credentials kept once."""
+    app.config['USER_IMPORT_FOLDER'] = str(tmp_path)
+    db.session.add(user(username='admin', account_type='admin'))
+    db.session.commit()
+    auth('admin', 'admin')
+
+    rv = client.get(url_for('auth.import_users'))
+    csrf_token = re.search(b'name="csrf_token" type="hidden" '
+                           b'value="([-A-Za-z.0-9_]+)', rv.data).group(1)
+    rv = client.post(url_for('auth.import_users'), data=dict(
+        csv_file=(io.BytesIO(CSV.encode()), 'users.csv'), grad_class=137,
+        account_type='customer', csrf_token=csrf_token.decode()))
+    user_import = UserImport.query.one()
+    assert rv.headers['Location'].endswith(
+        url_for('auth.user_import', import_id=user_import.id))
+
+    # Each request gets a new session, as outside of the tests
+    wait_imports()
+    db.session.remove()
+    rv = client.get(url_for('auth.user_import', import_id=user_import.id))
+    assert b'3 users have been imported, 1 were skipped' in rv.data
+
+    url = url_for('auth.user_import_credentials', import_id=user_import.id)
+    rv = client.get(url)
+    assert rv.mimetype == 'text/csv'
+    assert rv.data.decode().splitlines()[1].startswith('jdupont,')
+    assert client.get(url).status_code == 404
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_credentials_expiry(app, db, tmp_path):
+    """Credentials files are deleted once expired."""
+    app.config['USER_IMPORT_FOLDER'] = str(tmp_path)
+    user_import = start_import(read_users_csv(io.StringIO(CSV)), 'admin')
+    wait_imports()
+    assert has_credentials(user_import)
+    assert oct((tmp_path / '{}.csv'.format(user_import.id)).stat().
+               st_mode & 0o777) == '0o600'
+
+    app.config['USER_IMPORT_CREDENTIALS_TTL'] = -1
+    assert not has_credentials(user_import)
+    assert pop_credentials(user_import) is None
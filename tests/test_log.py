@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""Test the queued application logs."""
+import atexit
+import json
+from logging.handlers import RotatingFileHandler, TimedRotatingFileHandler
+import pytest
+from flask import url_for
+from app.log import LOG_FILE, init_logging, make_file_handler
+
+
+@pytest.fixture
+def log(app, tmp_path):
+    """Yield a function returning the JSON lines logged by the app."""
+    app.config.update(LOG_FOLDER=str(tmp_path), LOG_FORMAT='json')
+    handlers = list(app.logger.handlers)
+    listener = init_logging(app)
+
+    def read():
+        listener.stop()
+        with open(str(tmp_path / LOG_FILE)) as f:
+            return [json.loads(line) for line in f]
+
+    yield read
+
+    atexit.unregister(listener.stop)
+    app.logger.handlers = handlers
+
+
+def test_request_log(app, client, log):
+    """Requests are logged with their id, status and latency."""
+    app.logger.warning('Before any request')
+    rv = client.get(url_for('auth.login'),
+                    headers={'X-Request-Id': 'abc123'})
+    assert rv.headers['X-Request-Id'] == 'abc123'
+    assert client.get(url_for('auth.login')).headers['X-Request-Id'] != \
+        'abc123'
+
+    entries = log()
+    assert entries[0]['message'] == 'Before any request'
+    assert 'request_id' not in entries[0]
+    assert entries[1]['request_id'] == 'abc123'
+    assert (entries[1]['method'], entries[1]['path'],
+            entries[1]['status']) == ('GET', '/auth/login', 200)
+    assert entries[1]['duration_ms'] >= 0
+    assert entries[2]['request_id'] != 'abc123'
+
+
+def test_make_file_handler(tmp_path):
+    """Log files are rotated by size or by time."""
+    path = str(tmp_path / LOG_FILE)
+    handler = make_file_handler({'LOG_MAX_BYTES': 1000}, path)
+    assert isinstance(handler, RotatingFileHandler)
+    assert handler.maxBytes == 1000
+    handler.close()
+
+    handler = make_file_handler({'LOG_ROTATION': 'time', 'LOG_WHEN': 'H',
+                                 'LOG_BACKUP_COUNT': 48}, path)
+    assert isinstance(handler, TimedRotatingFileHandler)
+    assert (handler.when, handler.backupCount) == ('H', 48)
+    handler.close()
+
+    with pytest.raises(ValueError):
+        make_file_handler({'LOG_ROTATION': 'weekly'}, path)
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""Test main routes."""
+import pytest
+from flask import url_for
+
+
+@pytest.mark.usefixtures('client', 'db', 'auth')
+class TestSearch():
+    """Test the search route."""
+
+    def test_search_single_result_redirects(self, client, db, user, auth):
+        """A search matching one user redirects to his profile."""
+        barman = user(username='barman', account_type='bartender')
+        customer = user(username='customer1')
+        db.session.add_all([barman, customer])
+        db.session.commit()
+        auth('barman', 'barman')
+
+        rv = client.get(url_for('main.search', q='customer1'))
+        assert rv.status_code == 302
+        assert rv.location.endswith(url_for('main.user',
+                                            username='customer1'))
+
+    def test_search_several_results(self, client, db, user, auth):
+        """A search matching several users renders a single result page."""
+        barman = user(username='barman', account_type='bartender')
+        db.session.add(barman)
+        for i in range(3):
+            db.session.add(user(username='martin' + str(i)))
+        db.session.commit()
+        auth('barman', 'barman')
+
+        rv = client.get(url_for('main.search', q='martin'))
+        assert rv.status_code == 200
+        assert b'Results <span class="badge badge-light">3</span>' in rv.data
+
+        rv = client.get(url_for('main.search', q='martin', page=2))
+        assert rv.status_code == 404
+
+
+@pytest.mark.usefixtures('client', 'db', 'auth')
+class TestQRCode():
+    """Test the QR code image route."""
+
+    def test_qr(self, client, db, user, auth):
+        """QR codes are rendered on demand with immutable cache headers."""
+        customer = user(username='customer')
+        db.session.add(customer)
+        db.session.commit()
+        auth('customer', 'customer')
+
+        rv = client.get(customer.qr())
+        assert rv.status_code == 200
+        assert rv.mimetype == 'image/png'
+        assert rv.data.startswith(b'\x89PNG')
+        assert 'immutable' in rv.headers['Cache-Control']
+
+        rv = client.get(customer.qr(),
+                        headers={'If-None-Match': rv.headers['ETag']})
+        assert rv.status_code == 304
+
+    def test_qr_forbidden(self, client, db, user, auth):
+        """Customers can't get other users' QR codes."""
+        customer = user(username='customer')
+        other = user(username='other')
+        db.session.add_all([customer, other])
+        db.session.commit()
+        auth('customer', 'customer')
+
+        rv = client.get(other.qr())
+        assert rv.status_code == 403
+
+
+@pytest.mark.usefixtures('client', 'db', 'auth')
+class TestScan():
+    """Test the QR code scan endpoint."""
+
+    def test_get_scanned_user(self, client, db, user, auth):
+        """Scanning a QR code returns the user's summary."""
+        barman = user(username='barman', account_type='bartender')
+        customer = user(username='customer')
+        customer.balance = 10
+        customer.deposit = True
+        db.session.add_all([barman, customer])
+        db.session.commit()
+        auth('barman', 'barman')
+
+        rv = client.get(url_for('main.get_scanned_user',
+                                qrcode_hash=customer.qrcode_hash))
+        assert rv.status_code == 200
+        assert rv.json['id'] == customer.id
+        assert rv.json['balance'] == 10
+        assert rv.json['deposit']
+        assert rv.json['eligibility']['nb_alcoholic_drinks'] == 0
+
+        rv = client.get(url_for('main.get_scanned_user', qrcode_hash='foo'))
+        assert rv.status_code == 404
@@ -3,6 +3,8 @@
 import pytest
 import hashlib
 import datetime
+from app import identities
+from app.identity import Identity, IdentityCache
 from app.models import GlobalSetting, load_user
 
 
@@ -14,7 +16,43 @@ class TestUser():
     def test_get_by_id(self, all_users):
         """Get user by ID."""
         retrieved = load_user(all_users.id)
-        assert retrieved == all_users
+        assert retrieved.id == all_users.id
+        assert retrieved.username == all_users.username
+        assert retrieved.is_admin == all_users.is_admin
+        assert retrieved.is_bartender == all_users.is_bartender
+        assert retrieved.is_observer == all_users.is_observer
+
+    def test_get_by_id_cache(self, db, all_users):
+        """User identities are cached until invalidated."""
+        load_user(all_users.id)
+
+        all_users.is_admin = not all_users.is_admin
+        db.session.commit()
+        assert load_user(all_users.id).is_admin != all_users.is_admin
+
+        identities.invalidate(all_users.id)
+        db.session.commit()
+        assert load_user(all_users.id).is_admin == all_users.is_admin
+
+    def test_get_by_id_other_process(self, db, all_users):
+        """Invalidations reach the identities cached by other processes."""
+        other = IdentityCache()
+        other.check_interval = 0
+        other.set(all_users)
+        identities.invalidate(all_users.id)
+        db.session.commit()
+        assert other.get(all_users.id) is None
+
+    def test_identity_cache_size(self, all_users):
+        """The oldest identities are evicted from a full cache."""
+        cache = IdentityCache()
+        cache.maxsize = 2
+        users = [Identity(all_users) for _ in range(3)]
+        for user_id, user in enumerate(users):
+            user.id = user_id
+            cache.set(user)
+        assert cache.get(0) is None
+        assert cache.get(1).id == 1 and cache.get(2).id == 2
 
     def test_check_password(self, all_users):
         """Check password."""
@@ -23,15 +61,15 @@ class TestUser():
 
     def test_qr(self, all_users):
         """Check qr."""
-        # md5 encode qrcode_hash to get jpg filename
+        # md5 encode qrcode_hash to get the url version
         qrcode_name = hashlib.md5()
         qrcode_name.update(all_users.qrcode_hash.encode('utf-8'))
-        assert all_users.qr() == '/static/img/qr/' + qrcode_name.hexdigest() +\
-            '.jpg'
+        assert all_users.qr() == '/qr/' + all_users.username + '.png?v=' +\
+            qrcode_name.hexdigest()
 
         all_users.qrcode_hash = 'foobar'
         assert not all_users.qr() ==\
-            '/static/img/qr/'+qrcode_name.hexdigest()+'.jpg'
+            '/qr/' + all_users.username + '.png?v=' + qrcode_name.hexdigest()
 
     def test_can_buy_deposit(self, db, all_users, non_alcohol_item):
         """Test can_buy() with and whithout deposit."""
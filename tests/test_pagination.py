@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""Test keyset pagination."""
+import pytest
+from flask import current_app, url_for
+from app import catalog, identities
+from app.models import Transaction
+from app.pagination import KeysetPagination, _counts, cached_count, \
+    clear_counts
+
+
+@pytest.fixture
+def transactions(db):
+    """Return 12 transactions."""
+    transactions = [Transaction(barman='barman', type='Top up',
+                                balance_change=1) for _ in range(12)]
+    db.session.add_all(transactions)
+    db.session.commit()
+    clear_counts()
+    return transactions
+
+
+def ids(page):
+    """Return the transaction ids of a page."""
+    return [t.id for t in page.items]
+
+
+def test_keyset_pages(transactions):
+    """Pages are linked by their first and last ids."""
+    first = KeysetPagination(Transaction.query, Transaction.id, 5)
+    assert ids(first) == [12, 11, 10, 9, 8]
+    assert first.has_next and not first.has_prev
+    assert first.prev_cursor is None
+
+    second = KeysetPagination(Transaction.query, Transaction.id, 5,
+                              after=first.next_cursor)
+    assert ids(second) == [7, 6, 5, 4, 3]
+    assert second.has_next and second.has_prev
+
+    last = KeysetPagination(Transaction.query, Transaction.id, 5,
+                            after=second.next_cursor)
+    assert ids(last) == [2, 1]
+    assert not last.has_next and last.next_cursor is None
+
+    back = KeysetPagination(Transaction.query, Transaction.id, 5,
+                            before=last.prev_cursor)
+    assert ids(back) == ids(second)
+    back = KeysetPagination(Transaction.query, Transaction.id, 5,
+                            before=back.prev_cursor)
+    assert ids(back) == ids(first)
+    assert not back.has_prev
+
+
+def test_keyset_ascending(transactions):
+    """Ascending pages start with the oldest transaction."""
+    first = KeysetPagination(Transaction.query, Transaction.id, 5,
+                             descending=False)
+    assert ids(first) == [1, 2, 3, 4, 5]
+    second = KeysetPagination(Transaction.query, Transaction.id, 5,
+                              after=first.next_cursor, descending=False)
+    assert ids(second) == [6, 7, 8, 9, 10]
+    back = KeysetPagination(Transaction.query, Transaction.id, 5,
+                            before=second.prev_cursor, descending=False)
+    assert ids(back) == ids(first)
+
+
+def test_cached_count(db, transactions):
+    """Totals are cached until they expire."""
+    assert cached_count('transactions', Transaction.query) == 12
+    db.session.add(Transaction(barman='barman', type='Top up'))
+    db.session.commit()
+    assert cached_count('transactions', Transaction.query) == 12
+    clear_counts()
+    assert cached_count('transactions', Transaction.query) == 13
+
+
+def test_cached_count_size(transactions):
+    """The least recently used totals are evicted."""
+    for key in range(3):
+        cached_count(key, Transaction.query, maxsize=2)
+    cached_count(1, Transaction.query, maxsize=2)
+    cached_count(3, Transaction.query, maxsize=2)
+    assert list(_counts) == [1, 3]
+
+
+@pytest.mark.usefixtures('client', 'db', 'auth')
+def test_transactions_page(client, db, user, auth, transactions):
+    """The transactions page links to the next page by cursor."""
+    db.session.add(user(username='barman', account_type='bartender'))
+    db.session.commit()
+    auth('barman', 'barman')
+
+    cursor = 13 - current_app.config['ITEMS_PER_PAGE']
+    rv = client.get(url_for('main.transactions'))
+    assert rv.status_code == 200
+    assert url_for('main.transactions', sort='desc',
+                   after=cursor).encode() in rv.data
+    assert b'Transactions <span class="badge badge-light">12</span>' in \
+        rv.data
+
+    rv = client.get(url_for('main.transactions', sort='desc', after=cursor))
+    assert rv.status_code == 200
+    assert url_for('main.transactions', sort='desc',
+                   before=cursor - 1).encode() in rv.data
+
+
+def get_page(client, url):
+    """Render a page."""
+    assert client.get(url).status_code == 200
+
+
+@pytest.mark.usefixtures('client', 'db', 'auth')
+def test_transactions_page_statements(client, db, user, auth, monkeypatch,
+                                      count_statements):
+    """The transactions page doesn't load each client separately."""
+    monkeypatch.setattr(identities, 'check_interval', 60)
+    db.session.add(user(username='barman', account_type='bartender'))
+    db.session.commit()
+    auth('barman', 'barman')
+
+    def add_transactions(count):
+        for i in range(count):
+            client_user = user(username='client{}'.format(
+                Transaction.query.count()))
+            db.session.add(client_user)
+            db.session.add(Transaction(barman='barman', type='Top up',
+                                       client=client_user, balance_change=1))
+        db.session.commit()
+        clear_counts()
+
+    add_transactions(2)
+    url = url_for('main.transactions')
+    few = count_statements(lambda: get_page(client, url))
+    add_transactions(current_app.config['ITEMS_PER_PAGE'])
+    assert count_statements(lambda: get_page(client, url)) == few
+
+
+@pytest.mark.usefixtures('client', 'db', 'auth')
+def test_user_page_statements(client, db, user, auth, monkeypatch,
+                              count_statements):
+    """The user history costs the same number of statements per page."""
+    monkeypatch.setattr(catalog, 'check_interval', 0)
+    monkeypatch.setattr(identities, 'check_interval', 60)
+    db.session.add(user(username='barman', account_type='bartender'))
+    customer = user(username='customer')
+    db.session.add(customer)
+    db.session.commit()
+    auth('barman', 'barman')
+
+    def add_transactions(count):
+        db.session.add_all([Transaction(barman='barman', type='Top up',
+                                        client=customer, balance_change=1)
+                            for _ in range(count)])
+        db.session.commit()
+        clear_counts()
+
+    def page_statements():
+        # The first request fills the cached total and catalog
+        url = url_for('main.user', username='customer')
+        client.get(url)
+        return count_statements(lambda: get_page(client, url))
+
+    add_transactions(1)
+    few = page_statements()
+    add_transactions(10)
+    assert page_statements() == few
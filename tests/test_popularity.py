@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""Test the item popularity."""
+import datetime
+import pytest
+from flask import url_for
+from app import catalog, popularity
+from app.models import ItemSales, Transaction
+from app.popularity import bar_day, rebuild_sales, record_sale
+
+
+@pytest.fixture
+def drinks(db, item):
+    """Return three items."""
+    items = [item(name='beer', quantity=10), item(name='cider', quantity=10),
+             item(name='wine', quantity=10)]
+    db.session.add_all(items)
+    db.session.commit()
+    return items
+
+
+def sell(db, item, days_ago, times=1):
+    """Record the sales of an item, days_ago bar days ago."""
+    date = datetime.datetime.utcnow() - datetime.timedelta(days=days_ago)
+    for _ in range(times):
+        record_sale(item.id, date)
+    db.session.commit()
+
+
+def test_bar_day():
+    """Bar days start at 6 am."""
+    assert bar_day(datetime.datetime(2019, 3, 2, 5, 59)) == \
+        datetime.date(2019, 3, 1)
+    assert bar_day(datetime.datetime(2019, 3, 2, 6)) == \
+        datetime.date(2019, 3, 2)
+
+
+def test_record_sale(db, drinks):
+    """Counters are upserted, and reverts never create one."""
+    beer = drinks[0]
+    date = datetime.datetime.utcnow()
+    record_sale(beer.id, date, -1)
+    db.session.commit()
+    assert ItemSales.query.count() == 0
+
+    # A counter created by another worker since the last read
+    db.session.add(ItemSales(item_id=beer.id, day=bar_day(date), nb_sales=1))
+    db.session.commit()
+    sell(db, beer, 0, times=2)
+    record_sale(beer.id, date, -1)
+    db.session.commit()
+    assert ItemSales.query.one().nb_sales == 2
+
+
+def test_rank(db, drinks):
+    """Items are ranked by the sales of a window, then the wider ones."""
+    beer, cider, wine = drinks
+    sell(db, beer, 0)
+    sell(db, cider, 3, times=2)
+    sell(db, wine, 2, times=3)
+    popularity.clear()
+
+    assert popularity.count(cider.id, 'week') == 2
+    assert popularity.count(cider.id, 'tonight') == 0
+    assert [i.name for i in popularity.rank(drinks, 'tonight')] == \
+        ['beer', 'wine', 'cider']
+    assert [i.name for i in popularity.rank(drinks, 'week')] == \
+        ['wine', 'cider', 'beer']
+    assert [i.name for i in popularity.rank(drinks, 'name')] == \
+        ['beer', 'cider', 'wine']
+
+
+@pytest.mark.usefixtures('drinks')
+def test_counts_cache(db, count_statements):
+    """Counts are read from the sales counters once per TTL."""
+    items = catalog.get().items
+    statements = []
+
+    def rank_twice():
+        ranking = popularity.rank(items, 'week', key='drinks')
+        assert popularity.rank(items, 'week', key='drinks') is ranking
+
+    popularity.clear()
+    assert count_statements(rank_twice, statements) == 1
+    assert 'item_sales' in statements[0]
+    assert 'FROM "transaction"' not in statements[0]
+
+
+def test_rebuild_sales(db, drinks):
+    """Counters can be rebuilt from the transactions."""
+    beer, cider, wine = drinks
+    now = datetime.datetime.utcnow()
+    db.session.add_all([
+        Transaction(item_id=beer.id, barman='barman', date=now,
+                    type='Pay beer', balance_change=-1),
+        Transaction(item_id=beer.id, barman='barman', date=now,
+                    type='Pay beer', balance_change=-1),
+        Transaction(item_id=cider.id, barman='barman', date=now,
+                    type='Pay cider', balance_change=-1, is_reverted=True),
+        Transaction(item_id=wine.id, barman='barman',
+                    date=now - datetime.timedelta(days=1),
+                    type='Pay wine', balance_change=-1)])
+    sell(db, cider, 0, times=3)
+
+    assert rebuild_sales(bar_day(now) - datetime.timedelta(days=1)) == 2
+    assert sorted((s.item.name, s.day, s.nb_sales)
+                  for s in ItemSales.query) == \
+        [('beer', bar_day(now), 2),
+         ('wine', bar_day(now - datetime.timedelta(days=1)), 1)]
+
+
+@pytest.mark.usefixtures('client', 'db', 'auth')
+def test_products_order(client, db, user, auth, drinks, monkeypatch):
+    """Sales and reverts update the counters used to order the products."""
+    beer, cider, wine = drinks
+    db.session.add(user(username='bartender', account_type='bartender'))
+    customer = user(username='customer')
+    customer.deposit = True
+    customer.balance = 10
+    db.session.add(customer)
+    db.session.commit()
+    auth('bartender', 'bartender')
+
+    headers = {'Referer': url_for('main.dashboard')}
+    for drink in (wine, wine, cider):
+        client.get(url_for('main.pay', username='customer',
+                           item_id=drink.id), headers=headers)
+    assert ItemSales.query.filter_by(item_id=wine.id).one().nb_sales == 2
+
+    sale = Transaction.query.filter_by(item_id=cider.id).one()
+    client.get(url_for('main.revert_transaction', transaction_id=sale.id),
+               headers=headers)
+    assert ItemSales.query.filter_by(item_id=cider.id).one().nb_sales == 0
+
+    # Products are ordered by name unless PRODUCTS_ORDER is set
+    popularity.clear()
+    url = url_for('main.get_user_products', username='customer')
+    html = client.get(url).get_json()['html']
+    assert html.index('beer') < html.index('cider') < html.index('wine')
+
+    monkeypatch.setattr(popularity, 'order', 'week')
+    html = client.get(url).get_json()['html']
+    assert html.index('wine') < html.index('beer') < html.index('cider')
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""Test QR codes."""
+import io
+import zipfile
+import pytest
+from app.qrcodes import grad_class_badges, stream_badges_pdf, \
+    stream_badges_zip
+
+
+@pytest.fixture
+def grad_class(db, user):
+    """Return a grad class with a few members."""
+    for i in range(5):
+        u = user(username='student' + str(i))
+        u.grad_class = 137
+        db.session.add(u)
+    db.session.commit()
+
+    return 137
+
+
+def test_badges_zip(grad_class):
+    """Badges are streamed as a ZIP archive of PNG files."""
+    badges = grad_class_badges(grad_class)
+    assert len(badges) == 5
+
+    data = b''.join(stream_badges_zip(badges, processes=2))
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        names = archive.namelist()
+        assert sorted(names) == ['student' + str(i) + '.png' for i in range(5)]
+        assert archive.read(names[0]).startswith(b'\x89PNG')
+
+
+def test_badges_pdf(grad_class):
+    """Badges are streamed as a printable PDF."""
+    badges = grad_class_badges(grad_class)
+
+    data = b''.join(stream_badges_pdf(badges, processes=2))
+    assert data.startswith(b'%PDF')
+
+
+def test_badges_command(app, grad_class, tmpdir):
+    """The badges command regenerates QR codes and writes the archive."""
+    output = str(tmpdir.join('badges.zip'))
+    old_badges = grad_class_badges(grad_class)
+
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=['qrcodes', 'badges', str(grad_class),
+                                 output, '--regenerate'])
+    assert 'Regenerated 5 QR codes.' in result.output
+    assert 'Generated 5 badges.' in result.output
+    assert zipfile.is_zipfile(output)
+
+    new_badges = grad_class_badges(grad_class)
+    assert all(old[1] != new[1] for old, new in zip(old_badges, new_badges))
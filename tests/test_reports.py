@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""Test the end-of-night reports."""
+import datetime
+import pytest
+from flask import url_for
+from app.models import ArchivedTransaction, NightReport, Transaction
+from app.reports import alcohol_volume, backfill_night_reports, \
+    compute_night_report, get_night_report, night_bounds
+
+DAY = datetime.date(2019, 3, 1)
+
+
+@pytest.fixture
+def night(db, item, user):
+    """Return the transactions of a night, and one of the next morning."""
+    beer = item(name='beer', is_alcohol=True)
+    beer.volume = 0.5
+    soda = item(name='soda')
+    soda.volume = 0.33
+    customer = user(username='customer')
+    other = user(username='other')
+    db.session.add_all([beer, soda, customer, other])
+    db.session.commit()
+
+    start, end = night_bounds(DAY)
+    evening = start + datetime.timedelta(hours=15)
+    db.session.add_all([
+        Transaction(client_id=customer.id, barman='alice', date=evening,
+                    type='Top up', balance_change=10),
+        Transaction(client_id=customer.id, item_id=beer.id, barman='alice',
+                    date=evening, type='Pay beer', balance_change=-2),
+        Transaction(client_id=other.id, item_id=soda.id, barman='bob',
+                    date=end - datetime.timedelta(minutes=1),
+                    type='Pay soda', balance_change=-1, is_reverted=True),
+        Transaction(barman='bob', date=end - datetime.timedelta(minutes=1),
+                    type='Revert #3', balance_change=None),
+        Transaction(client_id=other.id, item_id=soda.id, barman='bob',
+                    date=end, type='Pay soda', balance_change=-1),
+        ArchivedTransaction(id=1000, client_id=other.id, item_id=beer.id,
+                            barman='bob', date=start, type='Pay beer',
+                            balance_change=-2)])
+    db.session.commit()
+
+
+@pytest.mark.usefixtures('night')
+def test_compute_night_report(db):
+    """Reports total the hot and archived transactions of a night."""
+    report = compute_night_report(DAY)
+    assert (report['revenue'], report['nb_sales']) == (4, 2)
+    assert (report['topped_up'], report['nb_top_ups']) == (10, 1)
+    assert (report['nb_reverts'], report['reverted']) == (1, 1)
+    assert report['alcohol_qty'] == 1
+    assert report['nb_clients'] == 2
+    assert report['barmen'] == {
+        'alice': {'revenue': 2, 'topped_up': 10, 'nb_sales': 1,
+                  'nb_reverts': 0},
+        'bob': {'revenue': 2, 'topped_up': 0, 'nb_sales': 1,
+                'nb_reverts': 1}}
+    assert report['items'] == {'beer': {'revenue': 4, 'nb_sales': 2}}
+    assert report['hours']['21'] == {'revenue': 2, 'topped_up': 10,
+                                     'nb_sales': 1}
+
+
+@pytest.mark.usefixtures('night')
+def test_alcohol_volume(db):
+    """Alcohol volume sums the volume of the alcoholic drinks sold."""
+    start, end = night_bounds(DAY)
+    assert alcohol_volume(start, end) == 0.5
+    assert alcohol_volume(end) == 0
+
+
+@pytest.mark.usefixtures('night')
+def test_night_report_snapshot(db):
+    """Closed nights are stored once and served from their snapshot."""
+    end = night_bounds(DAY)[1]
+    report, closed = get_night_report(DAY, now=end - datetime.timedelta(
+        minutes=1))
+    assert not closed
+    assert NightReport.query.count() == 0
+
+    report, closed = get_night_report(DAY, now=end)
+    assert closed and report['revenue'] == 4
+    assert NightReport.query.one().nb_clients == 2
+
+    # Later changes to the transactions don't alter the report
+    Transaction.query.filter_by(type='Pay beer').delete()
+    db.session.commit()
+    assert get_night_report(DAY)[0]['revenue'] == 4
+
+
+@pytest.mark.usefixtures('night')
+def test_backfill_night_reports(db):
+    """Backfills skip stored nights and nights without transactions."""
+    get_night_report(DAY)
+    assert backfill_night_reports(DAY - datetime.timedelta(days=3),
+                                  DAY + datetime.timedelta(days=3)) == 1
+    assert [r.day for r in NightReport.query.order_by(NightReport.day)] == \
+        [DAY, DAY + datetime.timedelta(days=1)]
+
+
+@pytest.mark.usefixtures('client', 'db', 'auth', 'night')
+def test_night_report_page(client, db, user, auth):
+    """Observers can read the night reports."""
+    db.session.add(user(username='observer', account_type='observer'))
+    db.session.commit()
+    auth('observer', 'observer')
+
+    rv = client.get(url_for('main.night_report', day=DAY.isoformat()))
+    assert rv.status_code == 200
+    assert b'Night of 01/03/2019' in rv.data
+    assert b'4.00' in rv.data
+    assert client.get(url_for('main.night_report', day='nope')).\
+        status_code == 404
+
+
+@pytest.mark.usefixtures('client', 'db', 'auth', 'night')
+def test_revert_discards_night_report(client, db, user, auth):
+    """Reverting a transaction of a closed night updates its report."""
+    db.session.add(user(username='admin', account_type='admin'))
+    db.session.commit()
+    auth('admin', 'admin')
+    assert get_night_report(DAY)[0]['revenue'] == 4
+
+    sale = Transaction.query.filter_by(type='Pay beer').one()
+    client.get(url_for('main.revert_transaction', transaction_id=sale.id),
+               headers={'Referer': url_for('main.dashboard')})
+    assert NightReport.query.count() == 0
+    assert get_night_report(DAY)[0]['revenue'] == 2
+
+
+def test_default_volume(db, item):
+    """Alcoholic items without a serving volume count as 0.25 L."""
+    wine = item(name='wine', is_alcohol=True)
+    db.session.add(wine)
+    db.session.commit()
+    date = night_bounds(DAY)[0]
+    db.session.add(Transaction(item_id=wine.id, barman='alice', date=date,
+                               type='Pay wine', balance_change=-1))
+    db.session.commit()
+
+    assert alcohol_volume(date - datetime.timedelta(minutes=1)) == 0.25
+    assert compute_night_report(DAY)['alcohol_qty'] == 0.25
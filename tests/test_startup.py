@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""Test the application startup time."""
+import os
+import subprocess
+import sys
+
+# Cumulative import time budget of the app package, in microseconds
+IMPORT_BUDGET = 1500000
+
+# Dependencies only loaded when first used
+LAZY_MODULES = ('numpy', 'PIL', 'qrcode', 'unidecode', 'multiprocessing')
+
+STARTUP = 'from app import create_app; from config import TestingConfig; ' \
+    'create_app(TestingConfig)'
+
+
+def import_times():
+    """Return the cumulative import time of each module at startup."""
+    output = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', STARTUP],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        stderr=subprocess.PIPE, universal_newlines=True, check=True).stderr
+    times = {}
+    for line in output.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            _, cumulative, name = line.split('|')
+            if cumulative.strip().isdigit():
+                times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_startup():
+    """Heavy dependencies are not imported at startup."""
+    times = import_times()
+    assert not [module for module in LAZY_MODULES if module in times]
+    assert times['app'] < IMPORT_BUDGET
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""Test stock movements."""
+import re
+import pytest
+from flask import url_for
+from app.models import Item, StockMovement
+from app.stock import move_stock, restock
+
+
+@pytest.fixture
+def beers(db, item):
+    """Return two quantifiable items and an unquantifiable one."""
+    items = [item(name='beer', quantity=10), item(name='cider', quantity=2),
+             Item(name='water', price=0, is_quantifiable=False)]
+    items[0].low_stock_threshold = 5
+    db.session.add_all(items)
+    db.session.commit()
+    return items
+
+
+def test_move_stock(db, beers):
+    """Movements increment the quantity and are recorded."""
+    beer = beers[0]
+    assert move_stock(beer, -4, 'sale', 'barman') is False
+    assert beer.quantity == 6
+    assert move_stock(beer, -1, 'sale', 'barman') is True
+    assert move_stock(beer, -1, 'sale', 'barman') is False
+    db.session.commit()
+
+    assert beer.is_low_stock
+    assert [(m.kind, m.delta, m.quantity) for m in
+            beer.stock_movements.order_by(StockMovement.id)] == \
+        [('sale', -4, 6), ('sale', -1, 5), ('sale', -1, 4)]
+
+    assert move_stock(beer, 20, 'restock', 'barman') is False
+    assert not beer.is_low_stock
+    with pytest.raises(ValueError):
+        move_stock(beer, 1, 'theft', 'barman')
+
+
+def test_restock(db, beers):
+    """Restocks are applied in a single transaction."""
+    beer, cider, water = beers
+    assert restock({beer.id: -6, cider.id: 10}, 'barman') == [beer]
+    assert (beer.quantity, cider.quantity) == (4, 12)
+    assert StockMovement.query.filter_by(kind='restock').count() == 2
+
+    with pytest.raises(ValueError):
+        restock({beer.id: 10, water.id: 10}, 'barman')
+    with pytest.raises(ValueError):
+        restock({beer.id: 10, 1000: 10}, 'barman')
+    db.session.expire_all()
+    assert Item.query.get(beer.id).quantity == 4
+    assert StockMovement.query.count() == 2
+
+
+@pytest.mark.usefixtures('client', 'db', 'auth')
+def test_restock_route(client, db, user, auth, beers):
+    """The restock page applies every quantity change at once."""
+    beer, cider, water = beers
+    db.session.add(user(username='bartender', account_type='bartender'))
+    db.session.commit()
+    auth('bartender', 'bartender')
+
+    rv = client.get(url_for('main.restock_items'))
+    assert rv.status_code == 200
+    assert b'water' not in rv.data
+    csrf_token = re.search(b'name="csrf_token" type="hidden" '
+                           b'value="([^"]+)"', rv.data).group(1).decode()
+
+    rv = client.post(url_for('main.restock_items'), data={
+        'csrf_token': csrf_token,
+        'entries-0-item_id': beer.id, 'entries-0-delta': 24,
+        'entries-1-item_id': cider.id, 'entries-1-delta': ''
+    }, follow_redirects=True)
+    assert b'Stock successfully updated.' in rv.data
+    db.session.expire_all()
+    assert Item.query.get(beer.id).quantity == 34
+    assert Item.query.get(cider.id).quantity == 2
+    assert StockMovement.query.count() == 1
+
+
+@pytest.mark.usefixtures('client', 'db', 'auth')
+def test_pay_and_revert_movements(client, db, user, auth, beers):
+    """Sales and reverts are recorded with their transaction."""
+    beer = beers[0]
+    db.session.add(user(username='bartender', account_type='bartender'))
+    customer = user(username='customer')
+    customer.deposit = True
+    customer.balance = 10
+    db.session.add(customer)
+    db.session.commit()
+    auth('bartender', 'bartender')
+
+    headers = {'Referer': url_for('main.dashboard')}
+    client.get(url_for('main.pay', username='customer', item_id=beer.id),
+               headers=headers)
+    sale = StockMovement.query.filter_by(kind='sale').one()
+    assert (sale.delta, sale.quantity) == (-1, 9)
+    assert sale.transaction.client_id == customer.id
+
+    client.get(url_for('main.revert_transaction',
+                       transaction_id=sale.transaction_id), headers=headers)
+    revert = StockMovement.query.filter_by(kind='revert').one()
+    assert (revert.delta, revert.quantity) == (1, 10)
+    db.session.expire_all()
+    assert Item.query.get(beer.id).quantity == 10
+
+
+@pytest.mark.usefixtures('client', 'db', 'auth')
+def test_delete_restocked_item(client, db, user, auth, beers):
+    """Deleting an item deletes its stock movements."""
+    beer = beers[0]
+    restock({beer.id: 6}, 'barman')
+    db.session.add(user(username='bartender', account_type='bartender'))
+    db.session.commit()
+    auth('bartender', 'bartender')
+
+    rv = client.get(url_for('main.delete_item', item_name='beer'),
+                    headers={'Referer': url_for('main.inventory')})
+    assert rv.status_code == 302
+    assert Item.query.filter_by(name='beer').first() is None
+    assert StockMovement.query.count() == 0